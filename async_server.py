@@ -0,0 +1,364 @@
+"""
+asyncio serving engine for Claude Code WebUI (server.py --engine asyncio).
+
+Connections are served by asyncio streams on one event loop:
+
+- /api/events streams and ?wait= long-polls are handled on the loop itself,
+  so an idle client costs a coroutine instead of a thread.
+- Every other request is read in full and handed to the regular WebUIHandler
+  on a thread pool (the fast/slow split of the threaded server), so routes
+  behave exactly as there, while blocking file I/O, tmux calls and remote
+  proxying stay off the loop.  The handler's writes go straight to the
+  stream, so chunked responses are streamed here too.
+- Zombie session cleanup checks every terminal concurrently with asyncio
+  subprocesses.
+
+Standard library only.  The server module is passed in (it runs as
+__main__), so this module never imports it.
+"""
+
+import asyncio
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from platform_utils import is_terminal_alive_async
+
+MAX_HEAD_BYTES = 64 * 1024  # request line + headers
+
+_BUSY_RESPONSE = (b"HTTP/1.1 503 Service Unavailable\r\n"
+                  b"Content-Type: text/plain\r\n"
+                  b"Content-Length: 12\r\n"
+                  b"Retry-After: 1\r\n"
+                  b"Connection: close\r\n\r\n"
+                  b"Server busy\n")
+
+_ERROR_RESPONSE = (b"HTTP/1.1 500 Internal Server Error\r\n"
+                   b"Content-Length: 0\r\n"
+                   b"Connection: close\r\n\r\n")
+
+_EVENTS_HEAD = (b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/event-stream\r\n"
+                b"Cache-Control: no-cache\r\n"
+                b"X-Accel-Buffering: no\r\n"
+                b"Connection: close\r\n\r\n"
+                b"retry: 3000\n\n")
+
+
+class _LoopWriter:
+    """File-like wfile for a handler thread that writes to an asyncio stream.
+
+    Each write is handed to the loop and waits for the stream to drain, so a
+    streamed response is sent as it is produced, at the client's pace.
+    """
+
+    def __init__(self, loop, writer, timeout):
+        self._loop = loop
+        self._writer = writer
+        self._timeout = timeout
+        self.written = 0
+
+    def write(self, data):
+        asyncio.run_coroutine_threadsafe(self._write(bytes(data)), self._loop).result(self._timeout)
+        self.written += len(data)
+        return len(data)
+
+    async def _write(self, data):
+        self._writer.write(data)
+        await self._writer.drain()
+
+    def flush(self):
+        pass
+
+
+def _buffered_handler_class(handler_class):
+    class BufferedHandler(handler_class):
+        """Runs one request already read into memory, writing the response through a _LoopWriter."""
+
+        def setup(self):
+            raw, self.wfile = self.request
+            self.rfile = io.BytesIO(raw)
+
+        def handle(self):
+            self.close_connection = True
+            self.handle_one_request()
+
+        def finish(self):
+            pass
+
+    return BufferedHandler
+
+
+def _parse_head(head):
+    """(method, target, headers) of a request head; headers keys are lower-case."""
+    lines = head.decode("latin-1").split("\r\n")
+    parts = lines[0].split()
+    method, target = (parts[0], parts[1]) if len(parts) >= 2 else ("", "")
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return method, target, headers
+
+
+class AsyncWebUIServer:
+    """Serves the WebUI routes of the server module `app` on an asyncio loop.
+
+    pools maps "fast"/"slow" to (workers, queue size) for the handler
+    threads; requests beyond workers + queue size get 503.
+    """
+
+    def __init__(self, app, pools, idle_timeout=30.0):
+        self.app = app
+        self.idle_timeout = idle_timeout
+        self._handler_class = _buffered_handler_class(app.WebUIHandler)
+        self._limits = {name: workers + queue_size for name, (workers, queue_size) in pools.items()
+                        if name in ("fast", "slow")}
+        self._executors = {name: ThreadPoolExecutor(max_workers=pools[name][0], thread_name_prefix=f"http-{name}")
+                           for name in self._limits}
+        self._in_flight = dict.fromkeys(self._limits, 0)
+        self._rejected = dict.fromkeys(self._limits, 0)
+        self._event_queues = set()
+        self._long_polls = 0
+        self._connections = 0
+        self._loop = None
+        self._server = None
+        self._version_changed = None
+        self._tasks = []
+        self._connection_tasks = set()
+
+    @property
+    def server_address(self):
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def start(self, host, port):
+        self._loop = asyncio.get_running_loop()
+        self._version_changed = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_HEAD_BYTES)
+        self.app.add_event_listener(self._on_event)
+        self.app.add_version_listener(self._on_version)
+        self._tasks.append(asyncio.create_task(self._zombie_cleanup()))
+
+    async def close(self):
+        self.app.remove_event_listener(self._on_event)
+        self.app.remove_version_listener(self._on_version)
+        self._server.close()
+        tasks = self._tasks + list(self._connection_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    def stats(self):
+        return {
+            "engine": "asyncio",
+            "connections": self._connections,
+            "event_streams": len(self._event_queues),
+            "long_polls": self._long_polls,
+            "pools": {name: {"workers": self._executors[name]._max_workers,
+                             "in_flight": self._in_flight[name],
+                             "limit": self._limits[name],
+                             "rejected": self._rejected[name]} for name in self._limits},
+        }
+
+    # ── Connections ──
+
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._connection_tasks.add(task)
+        self._connections += 1
+        peer = writer.get_extra_info("peername")
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.idle_timeout)
+                    method, target, headers = _parse_head(head)
+                    length = int(headers.get("content-length") or 0)
+                    body = await asyncio.wait_for(reader.readexactly(length), self.idle_timeout) if length else b""
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        ValueError, ConnectionError):
+                    return
+                if not await self._dispatch(method, target, head, body, writer, peer):
+                    return
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self._connections -= 1
+            self._connection_tasks.discard(task)
+            writer.close()
+
+    async def _dispatch(self, method, target, head, body, writer, peer):
+        """Answer one request; returns whether the connection stays open."""
+        app = self.app
+        parsed = urlparse(target)
+        qs = parse_qs(parsed.query)
+        if method == "GET" and parsed.path == "/api/events" and app._transcript_watcher_running():
+            await self._serve_events(writer)
+            return False
+        if method == "GET" and parsed.path in ("/api/sessions", "/api/pending") and qs.get("wait"):
+            if await self._long_poll(parsed.path, qs):
+                # Answer as a plain request now that the version moved (or time is up)
+                query = urlencode([(k, v) for k, vs in qs.items() if k not in ("wait", "timeout") for v in vs])
+                target = parsed.path + ("?" + query if query else "")
+                request_line, rest = head.split(b"\r\n", 1)
+                version = request_line.split()[-1]
+                head = b"%s %s %s\r\n%s" % (method.encode(), target.encode("latin-1"), version, rest)
+        pool = app.route_pool(method, target)
+        return await self._run_handler("slow" if pool == "slow" else "fast", head + body, writer, peer)
+
+    async def _run_handler(self, pool, raw, writer, peer):
+        """Run WebUIHandler for one request in a pool thread; returns whether to keep the connection."""
+        if self._in_flight[pool] >= self._limits[pool]:
+            self._rejected[pool] += 1
+            writer.write(_BUSY_RESPONSE)
+            await writer.drain()
+            return False
+        self._in_flight[pool] += 1
+        wfile = _LoopWriter(self._loop, writer, self.idle_timeout)
+        try:
+            handler = await self._loop.run_in_executor(self._executors[pool], self._handler_class,
+                                                       (raw, wfile), peer, self)
+        except Exception as e:
+            if not isinstance(e, (ConnectionError, TimeoutError)):
+                print(f"[!] Request handler error: {e}")
+            if not wfile.written:
+                writer.write(_ERROR_RESPONSE)
+                await writer.drain()
+            return False
+        finally:
+            self._in_flight[pool] -= 1
+        return not handler.close_connection
+
+    # ── Long-polls ──
+
+    def _on_version(self):
+        # Called from whichever thread bumped a version
+        try:
+            self._loop.call_soon_threadsafe(self._wake_long_polls)
+        except RuntimeError:
+            pass  # loop already closed
+
+    def _wake_long_polls(self):
+        self._version_changed.set()
+        self._version_changed = asyncio.Event()
+
+    async def _long_poll(self, path, qs):
+        """Wait like server.wait_for_version() without holding a thread.
+
+        Returns False for invalid parameters (the handler then answers 400).
+        """
+        app = self.app
+        try:
+            after = int(qs["wait"][0])
+            timeout = float(qs.get("timeout", [app.LONG_POLL_DEFAULT])[0])
+        except ValueError:
+            return False
+        timeout = max(0.0, min(timeout, app.LONG_POLL_MAX))
+        kind = "state" if path == "/api/sessions" else "pending"
+        refresh = None
+        if not app._transcript_watcher_running():
+            refresh = app.refresh_all_sessions if kind == "state" else app.poll_pending_version
+        self._long_polls += 1
+        try:
+            if kind == "state" and refresh:
+                await self._loop.run_in_executor(self._executors["fast"], refresh)
+            deadline = self._loop.time() + timeout
+            while True:
+                current = app.state_version if kind == "state" else app.pending_version
+                remaining = deadline - self._loop.time()
+                if current != after or remaining <= 0:
+                    return True
+                try:
+                    await asyncio.wait_for(self._version_changed.wait(),
+                                           min(remaining, 1.0) if refresh else remaining)
+                except asyncio.TimeoutError:
+                    if refresh:
+                        await self._loop.run_in_executor(self._executors["fast"], refresh)
+        finally:
+            self._long_polls -= 1
+
+    # ── Event stream ──
+
+    def _on_event(self, kind, data):
+        # Called from whichever thread published; serialise once for all streams
+        message = f"event: {kind}\ndata: {json.dumps(data)}\n\n".encode()
+        try:
+            self._loop.call_soon_threadsafe(self._fan_out_event, message)
+        except RuntimeError:
+            pass
+
+    def _fan_out_event(self, message):
+        for q in self._event_queues:
+            try:
+                q.put_nowait(message)
+            except asyncio.QueueFull:
+                # Client isn't keeping up — drop its backlog and tell it to refetch everything
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait(b"event: resync\ndata: {}\n\n")
+
+    async def _serve_events(self, writer):
+        q = asyncio.Queue(maxsize=self.app.EVENT_QUEUE_SIZE)
+        self._event_queues.add(q)
+        try:
+            writer.write(_EVENTS_HEAD)
+            await writer.drain()
+            while True:
+                try:
+                    message = await asyncio.wait_for(q.get(), self.app.EVENT_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    message = b": keepalive\n\n"
+                writer.write(message)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self._event_queues.discard(q)
+
+    # ── Zombie cleanup ──
+
+    async def _zombie_cleanup(self):
+        app = self.app
+        while True:
+            await asyncio.sleep(app.ZOMBIE_CHECK_INTERVAL)
+            try:
+                await self.check_sessions()
+                await self._loop.run_in_executor(self._executors["fast"], app.discover_sessions)
+            except Exception as e:
+                print(f"[!] Zombie cleanup error: {e}")
+
+    async def check_sessions(self):
+        """Remove dead sessions; terminals are checked concurrently by asyncio subprocesses."""
+        app = self.app
+
+        def snapshot():
+            with app.sessions_lock:
+                return list(app.sessions.items())
+
+        candidates = await self._loop.run_in_executor(self._executors["fast"], snapshot)
+        alive = await asyncio.gather(*(is_terminal_alive_async(s.get("terminal_id", ""), s.get("tmux_socket", ""))
+                                       for _, s in candidates))
+        dead = [(sid, s) for (sid, s), terminal_alive in zip(candidates, alive)
+                if not app._is_session_alive(sid, s, terminal_alive=terminal_alive)]
+        if dead:
+            await self._loop.run_in_executor(self._executors["fast"], app.remove_zombie_sessions, dead)
+
+
+def run(app, host, port, pools, idle_timeout=30.0):
+    """Serve until interrupted (blocks)."""
+    async def main():
+        engine = AsyncWebUIServer(app, pools, idle_timeout=idle_timeout)
+        await engine.start(host, port)
+        try:
+            await engine.serve_forever()
+        finally:
+            await engine.close()
+
+    asyncio.run(main())
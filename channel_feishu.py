@@ -18,9 +18,12 @@ import os
 import re
 import threading
 import time
+import urllib.error
 import urllib.request
 import uuid
 
+from transcript import clean_user_prompt, extract_user_text
+
 QUEUE_DIR = "/tmp/claude-webui"
 _SERVER_BASE = "http://127.0.0.1:19836"
 _SAFE_ID_RE = re.compile(r'^[a-zA-Z0-9_-]+$')
@@ -54,12 +57,35 @@ def _server_post(path, body):
         return False
 
 
+_etag_cache = {}  # path -> (etag, body bytes) for conditional GETs
+_ETAG_CACHE_SIZE = 64
+
+
 def _server_get(path):
-    """GET JSON from the local WebUI server. Returns parsed dict or None."""
+    """GET JSON from the local WebUI server. Returns parsed dict or None.
+
+    Responses with an ETag are remembered and revalidated with If-None-Match,
+    so an unchanged resource costs the server a 304 instead of a full body.
+    """
+    cached = _etag_cache.get(path)
     try:
         req = urllib.request.Request(f"{_SERVER_BASE}{path}")
+        if cached:
+            req.add_header("If-None-Match", cached[0])
         with urllib.request.urlopen(req, timeout=5) as resp:
-            return json.loads(resp.read())
+            body = resp.read()
+            etag = resp.headers.get("ETag")
+        _etag_cache.pop(path, None)
+        if etag:
+            if len(_etag_cache) >= _ETAG_CACHE_SIZE:
+                _etag_cache.pop(next(iter(_etag_cache)), None)
+            _etag_cache[path] = (etag, body)
+        return json.loads(body)
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and cached:
+            return json.loads(cached[1])
+        print(f"[feishu] Server API GET {path} failed: {e}")
+        return None
     except Exception as e:
         print(f"[feishu] Server API GET {path} failed: {e}")
         return None
@@ -86,7 +112,8 @@ _topic_chat_id = None   # Topic group chat_id
 
 # session_id -> {
 #   "root_message_id": str,     # topic root message ID
-#   "sent_index": int,          # number of transcript entries already sent
+#   "sent_seq": int | None,     # _seq of the last transcript entry sent (None = none yet)
+#   "cursor": int | None,       # transcript seq cursor from the server (None = not synced yet)
 #   "last_state": str,          # last known state (to detect changes)
 #   "pending_request_ids": set, # permission request IDs in this topic
 # }
@@ -96,6 +123,9 @@ _notified_requests = set()  # permission request IDs already sent
 _request_card_ids = {}      # request_id -> feishu message_id (for card updates)
 _pending_prompts = {}       # prompt_id -> prompt text (for session picker cards)
 _lock = threading.Lock()
+_scan_wakeup = threading.Event()  # set by _event_stream_loop when the server reports a change
+_events_connected = False
+_sessions_version = None  # server state version seen by the last scan (long-poll fallback)
 
 
 def _load_threads():
@@ -111,6 +141,9 @@ def _load_threads():
         for sid, t in threads.items():
             t["pending_request_ids"] = set(t.get("pending_request_ids", []))
             t.setdefault("topic_named", False)
+            if "sent_seq" not in t:
+                # Saved with an entry count: everything before the cursor was sent
+                t["sent_seq"] = t["cursor"] - 1 if t.get("cursor") is not None else None
         _session_threads = threads
         # Restore notification state (survives server restarts)
         if isinstance(data.get("__meta__"), dict):
@@ -130,7 +163,8 @@ def _save_threads():
         for sid, t in _session_threads.items():
             threads[sid] = {
                 "root_message_id": t["root_message_id"],
-                "sent_index": t["sent_index"],
+                "sent_seq": t.get("sent_seq"),
+                "cursor": t.get("cursor"),
                 "last_state": t["last_state"],
                 "pending_request_ids": list(t.get("pending_request_ids", set())),
                 "topic_named": t.get("topic_named", False),
@@ -554,27 +588,7 @@ def _format_transcript_entry(entry):
         return results
 
     if etype == "user":
-        # Extract user text
-        text = ""
-        if isinstance(content, str):
-            text = content
-        elif isinstance(content, list):
-            parts = []
-            for c in content:
-                if isinstance(c, dict):
-                    if c.get("type") == "text":
-                        parts.append(c.get("text", ""))
-                elif isinstance(c, str):
-                    parts.append(c)
-            text = " ".join(parts)
-
-        # Strip system tags
-        if text:
-            text = re.sub(r"<system-reminder>.*?</system-reminder>", "", text, flags=re.DOTALL)
-            text = re.sub(r"<[^>]+>", "", text)
-            text = re.sub(r"[^\S\n]+", " ", text)
-            text = text.strip()
-
+        text = clean_user_prompt(entry)
         if text:
             results.append(("[You] " + _truncate(text), None))
 
@@ -849,8 +863,8 @@ def _send_text_to_user(open_id, text):
 
 # ── Settings helper (for "Always Allow") ──
 
-def _add_to_settings(settings_file, pattern):
-    """Add an allow pattern to settings.local.json."""
+def _add_to_settings(settings_file, patterns):
+    """Add allow patterns to settings.local.json, rewriting it at most once."""
     try:
         if os.path.exists(settings_file):
             with open(settings_file) as f:
@@ -863,12 +877,15 @@ def _add_to_settings(settings_file, pattern):
         if "allow" not in settings["permissions"]:
             settings["permissions"]["allow"] = []
 
-        if pattern not in settings["permissions"]["allow"]:
-            settings["permissions"]["allow"].append(pattern)
+        allow = settings["permissions"]["allow"]
+        added = [p for p in dict.fromkeys(patterns) if p not in allow]
+        if added:
+            allow.extend(added)
             with open(settings_file, "w") as f:
                 json.dump(settings, f, indent=2)
                 f.write("\n")
-            print(f"[feishu] Added to allowlist: {pattern}")
+            for pattern in added:
+                print(f"[feishu] Added to allowlist: {pattern}")
     except (json.JSONDecodeError, IOError) as e:
         print(f"[feishu] Failed to update settings: {e}")
 
@@ -878,26 +895,10 @@ def _extract_first_user_prompt(entries):
     for entry in entries:
         if entry.get("type") != "user":
             continue
-        content = entry.get("message", {}).get("content", "")
-        text = ""
-        if isinstance(content, str):
-            text = content
-        elif isinstance(content, list):
-            parts = []
-            for c in content:
-                if isinstance(c, dict) and c.get("type") == "text":
-                    parts.append(c.get("text", ""))
-                elif isinstance(c, str):
-                    parts.append(c)
-            text = " ".join(parts)
-        # Skip local command messages (e.g. /clear) and meta entries
-        if entry.get("isMeta") or "<command-name>" in text or "<local-command-caveat>" in text:
+        # Skip meta entries; local command messages (e.g. /clear) come out empty
+        if entry.get("isMeta"):
             continue
-        # Strip system tags
-        if text:
-            text = re.sub(r"<system-reminder>.*?</system-reminder>", "", text, flags=re.DOTALL)
-            text = re.sub(r"<[^>]+>", "", text)
-            text = re.sub(r"\s+", " ", text).strip()
+        text = extract_user_text(entry)
         if text:
             return text
     return None
@@ -926,20 +927,34 @@ def _create_session_topic(session):
 def _sync_transcript(sid, thread):
     """Fetch transcript and send new entries to the topic. Returns count sent."""
     root_mid = thread["root_message_id"]
-    sent_index = thread["sent_index"]
+    sent_seq = thread.get("sent_seq")
+    cursor = thread.get("cursor")
 
-    data = _server_get(f"/api/session/{sid}/transcript?limit=500")
+    path = f"/api/session/{sid}/transcript?limit=500"
+    if cursor is not None:
+        path += f"&after={cursor}"
+    data = _server_get(path)
     if not data:
         return 0
 
     entries = data.get("entries", [])
-
-    # Handle /clear — if server has fewer entries than we've sent, reset
-    if len(entries) < sent_index:
-        thread["sent_index"] = 0
-        sent_index = 0
-
-    new_entries = entries[sent_index:]
+    if "cursor" in data:
+        thread["cursor"] = data["cursor"]
+
+    if cursor is None or data.get("reset"):
+        # Full tail (first sync, too many new entries, rewritten transcript or
+        # server restart): skip what was already sent, by seq
+        legacy_count = thread.pop("sent_index", 0)
+        if sent_seq is None and legacy_count:
+            # Thread saved before seqs were tracked — it counted entries sent
+            new_entries = entries[legacy_count:] if len(entries) >= legacy_count else entries
+        elif sent_seq is not None and data.get("cursor", 0) <= sent_seq:
+            # The seqs went backwards (transcript truncated, or cleared and rewritten)
+            new_entries = entries
+        else:
+            new_entries = [e for e in entries if sent_seq is None or e.get("_seq", -1) > sent_seq]
+    else:
+        new_entries = entries
     if not new_entries:
         return 0
 
@@ -957,7 +972,7 @@ def _sync_transcript(sid, thread):
                     _reply_post(root_mid, text)
                 count += 1
 
-        thread["sent_index"] += 1
+        thread["sent_seq"] = entry.get("_seq", thread.get("sent_seq"))
 
     return count
 
@@ -1042,7 +1057,7 @@ def _handle_message(data):
 
 def _show_session_picker(message_id, prompt_text):
     """Show an interactive card letting the user pick which session to send the prompt to."""
-    sessions_data = _server_get("/api/sessions?local_only=1")
+    sessions_data = _server_get("/api/sessions?local_only=1&view=compact")
     sessions = (sessions_data or {}).get("sessions", [])
 
     if not sessions:
@@ -1208,8 +1223,7 @@ def _handle_permission_action(request_id, decision, value):
                 allow_pattern = req_data.get("allow_pattern", "")
                 if allow_pattern:
                     allow_patterns = [allow_pattern]
-            for pattern in allow_patterns:
-                _add_to_settings(settings_file, pattern)
+            _add_to_settings(settings_file, allow_patterns)
 
     # Update the permission card to show resolved state (no buttons)
     with _lock:
@@ -1268,18 +1282,62 @@ def _handle_question_action(request_id, value):
 
 # ── Notification loop ──
 
+def _event_stream_loop():
+    """Background thread: follow the server's /api/events stream and wake the notification loop."""
+    global _events_connected
+    while True:
+        try:
+            req = urllib.request.Request(f"{_SERVER_BASE}/api/events")
+            with urllib.request.urlopen(req, timeout=60) as resp:
+                _events_connected = True
+                for line in resp:
+                    if line.startswith(b"event:"):
+                        _scan_wakeup.set()
+        except Exception:
+            pass  # server restarting, or no event stream — the loop falls back to polling
+        _events_connected = False
+        time.sleep(5)
+
+
+def _wait_for_sessions_change():
+    """Long-poll /api/sessions until the server's state version moves past the last scan's.
+
+    Falls back to a one-second pause if the server doesn't report a version.
+    """
+    if _sessions_version is None:
+        _scan_wakeup.wait(1)
+        return
+    try:
+        req = urllib.request.Request(
+            f"{_SERVER_BASE}/api/sessions?local_only=1&view=compact&wait={_sessions_version}&timeout=25")
+        with urllib.request.urlopen(req, timeout=35) as resp:
+            resp.read()
+    except Exception:
+        _scan_wakeup.wait(1)
+
+
 def _notification_loop():
-    """Background thread: poll /api/sessions and manage Feishu topics."""
+    """Background thread: scan /api/sessions and manage Feishu topics.
+
+    While the event stream is connected a scan runs as soon as the server
+    reports a change (plus a slow safety-net tick); otherwise the next scan
+    waits on a long-poll of /api/sessions (works through buffering proxies).
+    """
     while True:
         try:
             _scan_once()
         except Exception as e:
             print(f"[feishu] Notification loop error: {e}")
-        time.sleep(1)
+        if _events_connected:
+            _scan_wakeup.wait(10)
+        else:
+            _wait_for_sessions_change()
+        _scan_wakeup.clear()
 
 
 def _scan_once():
     """Single scan iteration — poll sessions, sync transcripts, handle permissions."""
+    global _sessions_version
     if _target_open_id is None:
         return
 
@@ -1288,7 +1346,9 @@ def _scan_once():
 
     sessions_data = _server_get("/api/sessions?local_only=1")
     if not sessions_data:
+        _sessions_version = None
         return
+    _sessions_version = sessions_data.get("version")
 
     sessions = sessions_data.get("sessions", [])
     current_sids = {s["session_id"] for s in sessions}
@@ -1308,7 +1368,7 @@ def _scan_once():
                 continue
             thread = {
                 "root_message_id": root_mid,
-                "sent_index": 0,
+                "sent_seq": None,
                 "last_state": None,
                 "pending_request_ids": set(),
                 "topic_named": False,
@@ -1319,14 +1379,14 @@ def _scan_once():
                 _save_threads()
 
         # Sync transcript entries
-        sent_before = thread["sent_index"]
+        sent_before = (thread.get("sent_seq"), thread.get("cursor"))
         _sync_transcript(sid, thread)
-        if thread["sent_index"] != sent_before:
+        if (thread.get("sent_seq"), thread.get("cursor")) != sent_before:
             with _lock:
                 _save_threads()
 
         # Update subject field in root card with first user prompt (once)
-        if not thread.get("topic_named") and thread["sent_index"] > 0:
+        if not thread.get("topic_named") and thread.get("sent_seq") is not None:
             t_data = _server_get(f"/api/session/{sid}/transcript?limit=50")
             if t_data:
                 prompt = _extract_first_user_prompt(t_data.get("entries", []))
@@ -1558,6 +1618,7 @@ def start_feishu_channel():
 
     notify_thread = threading.Thread(target=_notification_loop, daemon=True)
     notify_thread.start()
+    threading.Thread(target=_event_stream_loop, daemon=True).start()
 
     print("[feishu] WebSocket client started (topic group mode)")
     if _target_open_id is None:
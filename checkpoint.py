@@ -0,0 +1,117 @@
+"""
+Transcript checkpoints for Claude Code WebUI.
+
+Persists how far each transcript has been parsed (offset, incremental state,
+offset index, slug, custom title) in a SQLite database in the queue dir, so
+a restarted server resumes from the stored offset and only parses the bytes
+appended since.  A checkpoint is only used if the file is still the one it was
+taken from: same inode, at least as large as the stored offset, and the same
+leading bytes.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+HEAD_BYTES = 4096  # leading bytes fingerprinted to recognise a rewritten file
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    path TEXT PRIMARY KEY,
+    inode INTEGER NOT NULL,
+    head_len INTEGER NOT NULL,
+    head_hash TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    seq_base INTEGER NOT NULL,
+    backfill INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    idx BLOB NOT NULL,
+    slug TEXT NOT NULL,
+    custom_title TEXT NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+def _head_hash(f, length):
+    f.seek(0)
+    return hashlib.sha1(f.read(length)).hexdigest()
+
+
+class CheckpointStore:
+    """SQLite-backed transcript checkpoints, safe to use from several threads."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+    def load(self, path, f):
+        """Return the checkpoint dict for path if it matches the open binary file f, else None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT inode, head_len, head_hash, offset, seq_base, backfill, state, idx, slug, custom_title"
+                " FROM transcripts WHERE path = ?", (path,)).fetchone()
+        if not row:
+            return None
+        inode, head_len, head_hash, offset, seq_base, backfill, state, idx, slug, custom_title = row
+        st = os.fstat(f.fileno())
+        if st.st_ino != inode or st.st_size < offset or _head_hash(f, head_len) != head_hash:
+            return None
+        try:
+            state = json.loads(state)
+        except ValueError:
+            return None
+        return {
+            "offset": offset,
+            "seq_base": seq_base,
+            "backfill": backfill,
+            "state": state,
+            "index": idx,
+            "slug": slug,
+            "custom_title": custom_title,
+        }
+
+    def save(self, path, offset, seq_base, backfill, state, index, slug, custom_title):
+        """Store a checkpoint for path. state is a JSON-serialisable dict, index raw bytes.
+
+        Returns False if the file can't be fingerprinted (e.g. it is gone).
+        """
+        try:
+            with open(path, "rb") as f:
+                inode = os.fstat(f.fileno()).st_ino
+                head_len = min(offset, HEAD_BYTES)
+                head_hash = _head_hash(f, head_len)
+        except OSError:
+            return False
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, inode, head_len, head_hash, offset, seq_base, backfill,
+                 json.dumps(state), sqlite3.Binary(index), slug or "", custom_title or "", time.time()))
+            self._conn.commit()
+        return True
+
+    def delete(self, path):
+        with self._lock:
+            self._conn.execute("DELETE FROM transcripts WHERE path = ?", (path,))
+            self._conn.commit()
+
+    def prune(self, keep_paths):
+        """Drop checkpoints of transcripts that no longer exist and aren't in keep_paths."""
+        with self._lock:
+            paths = [r[0] for r in self._conn.execute("SELECT path FROM transcripts")]
+        for path in paths:
+            if path not in keep_paths and not os.path.isfile(path):
+                self.delete(path)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,232 @@
+"""
+Permission decisions over a Unix domain socket.
+
+The server listens on QUEUE_DIR/decisions.sock.  The permission hook sends
+its request as one JSON line and blocks on the same connection:
+
+    hook   → {"request": {...}}                 the request the hook would write to .request.json
+    server → {"decision": "allow"}              answered at once (e.g. a session rule), or
+    server → {"queued": "<request id>"}         registered (possibly joined to an identical pending request)
+    server → {"decision": ..., "message": ...}  once the user decides
+
+The .request.json/.response.json files stay the record of every request,
+so old hooks, other response writers (the Feishu channel) and server
+restarts work as before: if the connection breaks, the hook waits for the
+queued request's .response.json instead.
+
+Unix only (no AF_UNIX on Windows) — there the hook always uses the files.
+"""
+
+import json
+import os
+import socket
+import threading
+
+SOCKET_NAME = "decisions.sock"
+MAX_REQUEST_BYTES = 4 << 20
+
+
+def socket_path(queue_dir):
+    return os.path.join(queue_dir, SOCKET_NAME)
+
+
+def supported():
+    return hasattr(socket, "AF_UNIX") and os.name == "posix"
+
+
+def _send(conn, message):
+    conn.sendall(json.dumps(message).encode() + b"\n")
+
+
+class DecisionServer:
+    """Accepts hook connections and answers each with its request's decision.
+
+    submit(request) registers a request and returns (request_id, decision):
+    a decision dict answers the hook at once, else the connection waits for
+    resolve(request_id, decision); a ValueError rejects the request.  Every recheck seconds a waiting
+    connection also asks check(request_id) for a decision that arrived some
+    other way, and notices a hook that went away, reporting it with
+    abandon(request_id) once no connection waits for that request anymore.
+    """
+
+    def __init__(self, path, submit, check, abandon, recheck=5.0):
+        self.path = path
+        self._submit = submit
+        self._check = check
+        self._abandon = abandon
+        self.recheck = recheck
+        self._lock = threading.Lock()
+        self._waiters = {}  # request id -> {threading.Event}
+        self._decisions = {}  # request id -> decision, while waiters remain
+        self._sock = None
+
+    def start(self):
+        """Bind and start accepting; raises OSError if another server owns the socket."""
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except OSError:
+                os.unlink(self.path)  # stale socket of a server that is gone
+            else:
+                raise OSError(f"{self.path} is served by another process")
+            finally:
+                probe.close()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        os.chmod(self.path, 0o600)
+        sock.listen(64)
+        self._sock = sock
+        threading.Thread(target=self._accept_loop, name="decision-socket", daemon=True).start()
+
+    def stop(self):
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def waiting(self):
+        """Request ids that hooks are waiting on."""
+        with self._lock:
+            return list(self._waiters)
+
+    def resolve(self, request_id, decision):
+        """Deliver a decision to every connection waiting on request_id."""
+        with self._lock:
+            events = self._waiters.get(request_id)
+            if not events:
+                return False
+            self._decisions[request_id] = decision
+        for event in events:
+            event.set()
+        return True
+
+    def _accept_loop(self):
+        sock = self._sock
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except OSError:
+                return  # closed by stop()
+            threading.Thread(target=self._serve, args=(conn,), name="decision-wait", daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            with conn, conn.makefile("rb") as rfile:
+                line = rfile.readline(MAX_REQUEST_BYTES)
+                try:
+                    request = json.loads(line)["request"]
+                except (ValueError, KeyError, TypeError):
+                    _send(conn, {"error": "bad request"})
+                    return
+                try:
+                    request_id, decision = self._submit(request)
+                except ValueError as e:
+                    _send(conn, {"error": str(e)})
+                    return
+                if decision is not None:
+                    _send(conn, decision)
+                    return
+                event = threading.Event()
+                with self._lock:
+                    self._waiters.setdefault(request_id, set()).add(event)
+                try:
+                    _send(conn, {"queued": request_id})
+                    decision = self._wait(conn, request_id, event)
+                finally:
+                    last = self._remove_waiter(request_id, event)
+                if decision is not None:
+                    _send(conn, decision)
+                elif last:
+                    self._abandon(request_id)
+        except OSError:
+            pass
+        except Exception as e:
+            print(f"[!] Decision socket error: {e}")
+
+    def _wait(self, conn, request_id, event):
+        """The decision for request_id, or None if the hook hung up first."""
+        while True:
+            if event.wait(self.recheck):
+                with self._lock:
+                    return self._decisions.get(request_id)
+            decision = self._check(request_id)
+            if decision is not None:
+                return decision
+            if _hung_up(conn):
+                return None
+
+    def _remove_waiter(self, request_id, event):
+        """Forget a waiting connection; True if it was the last one for the request."""
+        with self._lock:
+            events = self._waiters.get(request_id, set())
+            events.discard(event)
+            if events:
+                return False
+            self._waiters.pop(request_id, None)
+            self._decisions.pop(request_id, None)
+            return True
+
+
+def _hung_up(conn):
+    """True if the peer closed the connection (the hook exited or was killed)."""
+    try:
+        conn.setblocking(False)
+        try:
+            return conn.recv(1, socket.MSG_PEEK) == b""
+        finally:
+            conn.setblocking(True)
+    except BlockingIOError:
+        return False
+    except OSError:
+        return True
+
+
+# ── Hook side ──
+
+
+class Connection:
+    """A hook's connection to the decision socket.
+
+    submit() sends the request and returns the server's first answer; if
+    that is {"queued": id}, wait() blocks for the decision.  Both raise
+    OSError if the server can't be reached or the connection breaks.
+    """
+
+    def __init__(self, path, connect_timeout=2.0):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(connect_timeout)
+        try:
+            self._sock.connect(path)
+        except OSError:
+            self._sock.close()
+            raise
+        self._rfile = self._sock.makefile("rb")
+
+    def submit(self, request):
+        self._sock.sendall(json.dumps({"request": request}).encode() + b"\n")
+        return self._read()
+
+    def wait(self, timeout):
+        """The decision, or None if none arrived within timeout seconds."""
+        self._sock.settimeout(timeout)
+        try:
+            return self._read()
+        except socket.timeout:
+            return None
+
+    def _read(self):
+        line = self._rfile.readline(MAX_REQUEST_BYTES)
+        if not line:
+            raise ConnectionError("decision socket closed")
+        try:
+            return json.loads(line)
+        except ValueError as e:
+            raise ConnectionError(f"bad answer from decision socket: {e}")
+
+    def close(self):
+        self._rfile.close()
+        self._sock.close()
@@ -0,0 +1,246 @@
+"""
+File change notification for Claude Code WebUI.
+
+On Linux, uses inotify through ctypes (no third-party dependencies).  On
+other platforms, or if inotify can't be initialised, FileWatcher falls back
+to stat-polling the tracked files.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# inotify event masks (from <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+DIR_EVENTS = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class Inotify:
+    """Minimal ctypes wrapper around the Linux inotify API."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def fileno(self):
+        return self.fd
+
+    def add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout=None):
+        """Wait up to timeout seconds and return a list of (wd, mask, name) events."""
+        try:
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+        except InterruptedError:
+            return []
+        if not ready:
+            return []
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        pos = 0
+        while pos + _EVENT_HEADER.size <= len(buf):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buf, pos)
+            pos += _EVENT_HEADER.size
+            name = buf[pos:pos + length].rstrip(b"\0")
+            pos += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def inotify_supported():
+    return sys.platform.startswith("linux")
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class FileWatcher:
+    """Background thread calling on_change(path) when a tracked file changes.
+
+    The set of tracked files is re-read from paths_fn() on every cycle, so
+    callers never have to register/unregister paths explicitly; a newly
+    tracked path is reported once immediately.  Whole directories can be
+    tracked with watch_dirs (every entry change is reported).
+
+    on_change(None) means "anything may have changed" — it is sent after an
+    inotify queue overflow and every reconcile_interval seconds, so missed
+    events (or signals that aren't file changes at all) are picked up.
+    """
+
+    def __init__(self, paths_fn, on_change, watch_dirs=(), poll_interval=1.0,
+                 reconcile_interval=5.0, use_inotify=None):
+        self._paths_fn = paths_fn
+        self._on_change = on_change
+        self._watch_dirs = [os.path.abspath(d) for d in watch_dirs]
+        self.poll_interval = poll_interval
+        self.reconcile_interval = reconcile_interval
+        if use_inotify is None:
+            use_inotify = inotify_supported()
+        self._use_inotify = use_inotify
+        self._inotify = None
+        self._wd_dirs = {}       # wd -> directory
+        self._dir_wds = {}       # directory -> wd
+        self._tracked = set()    # tracked file paths
+        self._stat_cache = {}    # path -> stat key (polling mode)
+        self._stop = threading.Event()
+        self._thread = None
+        self.running = False
+
+    @property
+    def mode(self):
+        return "inotify" if self._inotify else "polling"
+
+    def start(self):
+        if self._use_inotify:
+            try:
+                self._inotify = Inotify()
+            except (OSError, AttributeError) as e:
+                print(f"[!] inotify unavailable ({e}), falling back to polling")
+                self._inotify = None
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        self.running = False
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+    def _run(self):
+        last_reconcile = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self._refresh_tracked()
+                if self._inotify:
+                    self._wait_inotify()
+                else:
+                    self._stop.wait(self.poll_interval)
+                    self._poll_once()
+                now = time.monotonic()
+                if now - last_reconcile >= self.reconcile_interval:
+                    last_reconcile = now
+                    self._on_change(None)
+            except Exception as e:
+                print(f"[!] File watcher error: {e}")
+                self._stop.wait(self.poll_interval)
+
+    def _refresh_tracked(self):
+        tracked = {os.path.abspath(p) for p in self._paths_fn() if p}
+        added = tracked - self._tracked
+        self._tracked = tracked
+        for path in list(self._stat_cache):
+            if path not in tracked and os.path.dirname(path) not in self._watch_dirs:
+                del self._stat_cache[path]
+        if self._inotify:
+            wanted = {os.path.dirname(p) for p in tracked} | set(self._watch_dirs)
+            for d in wanted - set(self._dir_wds):
+                try:
+                    wd = self._inotify.add_watch(d, DIR_EVENTS | IN_ONLYDIR)
+                except OSError as e:
+                    if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+                        print(f"[!] Cannot watch {d}: {e}")
+                    continue
+                self._dir_wds[d] = wd
+                self._wd_dirs[wd] = d
+            for d in set(self._dir_wds) - wanted:
+                wd = self._dir_wds.pop(d)
+                self._wd_dirs.pop(wd, None)
+                self._inotify.rm_watch(wd)
+        else:
+            for path in added:
+                self._stat_cache[path] = _stat_key(path)
+        for path in added:
+            self._on_change(path)
+
+    def _wait_inotify(self):
+        events = self._inotify.read(timeout=self.poll_interval)
+        changed = []
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                self._on_change(None)
+                return
+            if mask & IN_IGNORED:
+                # Directory was removed — forget the watch so it is re-added if it reappears
+                d = self._wd_dirs.pop(wd, None)
+                if d:
+                    self._dir_wds.pop(d, None)
+                continue
+            d = self._wd_dirs.get(wd)
+            if not d or not name:
+                continue
+            path = os.path.join(d, name)
+            if (path in self._tracked or d in self._watch_dirs) and path not in changed:
+                changed.append(path)
+        for path in changed:
+            self._on_change(path)
+
+    def _poll_once(self):
+        paths = set(self._tracked)
+        for d in self._watch_dirs:
+            try:
+                paths.update(os.path.join(d, name) for name in os.listdir(d))
+            except OSError:
+                pass
+            # Deleted entries of watched dirs are changes too
+            paths.update(p for p in self._stat_cache if os.path.dirname(p) == d)
+        for path in paths:
+            key = _stat_key(path)
+            if path in self._stat_cache:
+                if self._stat_cache[path] == key:
+                    continue
+            elif key is None:
+                continue
+            if key is None and path not in self._tracked:
+                del self._stat_cache[path]
+            else:
+                self._stat_cache[path] = key
+            self._on_change(path)
@@ -817,11 +817,15 @@ let currentSessionId = null;
 let serverName = 'local';
 let federationRemoteNames = [];
 let respondedIds = new Set();
+let requestPatterns = {};  // request id -> allow_patterns of the rendered permission card
 let imagePaths = [];
 let pollTimer = null;
 let lastDashboardHash = '';
 let lastPermCardId = '';
 let lastTranscriptHash = '';
+let transcriptEntries = [];
+let transcriptCursor = null;
+const TRANSCRIPT_LIMIT = 500;
 
 // Question state
 const questionSelections = {};
@@ -996,10 +1000,31 @@ function stateLabel(s) {
 
 // ── Dashboard ──
 
+// GET JSON with ETag revalidation. A 304 answer reuses the body remembered
+// for the URL; `changed` tells the caller whether anything is new.
+const etagCache = {};
+async function fetchJSONCached(url) {
+  const cached = etagCache[url];
+  const headers = cached ? {'If-None-Match': cached.etag} : {};
+  const res = await fetch(url, {headers: headers, cache: 'no-store'});
+  if (res.status === 304 && cached) return {ok: true, data: cached.data, changed: false};
+  if (!res.ok) return {ok: false, data: null, changed: false};
+  const data = await res.json();
+  const etag = res.headers.get('ETag');
+  delete etagCache[url];
+  if (etag) {
+    const keys = Object.keys(etagCache);
+    if (keys.length >= 50) delete etagCache[keys[0]];  // delta URLs change with every cursor
+    etagCache[url] = {etag: etag, data: data};
+  }
+  return {ok: true, data: data, changed: true};
+}
+
 async function fetchSessions() {
   try {
-    const res = await fetch('/api/sessions');
-    const data = await res.json();
+    // Cards only show previews — full requests are fetched when expanded
+    const data = (await fetchJSONCached('/api/sessions?view=compact')).data;
+    if (!data) return;
     serverName = data.name || 'local';
     federationRemoteNames = data.remote_names || [];
     var ss = data.sessions || [];
@@ -1034,7 +1059,7 @@ function buildCardHTML(s) {
     const pr = s.pending_request;
     html += '<div class="sc-actions" onclick="event.stopPropagation()">';
     html += '<span style="color:#ef4444;font-size:12px;font-weight:700">' + esc(pr.tool_name) + '</span>';
-    html += ' <span style="color:#888;font-size:12px">' + esc((pr.detail || '').substring(0, 80)) + '</span>';
+    html += ' <span style="color:#888;font-size:12px;cursor:pointer" title="Show full request" onclick="expandRequestDetail(\\'' + esc(s.session_id) + '\\',this)">' + esc(pr.detail || '') + '</span>';
     html += ' <button class="btn-allow" style="padding:5px 14px;font-size:12px" onclick="respond(\\'' + esc(pr.id) + '\\',\\'allow\\',this)">Allow</button>';
     html += ' <button class="btn-deny-sm" onclick="respond(\\'' + esc(pr.id) + '\\',\\'deny\\',this)">Deny</button>';
     html += '</div>';
@@ -1059,6 +1084,17 @@ function buildCardHTML(s) {
   return html;
 }
 
+function expandRequestDetail(sid, el) {
+  fetch('/api/session/' + sid + '/request').then(r => r.ok ? r.json() : null).then(function(data) {
+    const pr = data && data.request;
+    if (!pr) return;
+    el.onclick = null;
+    el.style.cursor = '';
+    el.style.whiteSpace = 'pre-wrap';
+    el.textContent = pr.detail || JSON.stringify(pr.tool_input || {}, null, 2);
+  }).catch(function() {});
+}
+
 function cardHash(s) {
   return (s.state||'') + ':' + (s.last_summary||'') + ':' + (s.last_user_prompt||'') + ':' + (s.last_activity||'') + ':' + (s.pending_request ? s.pending_request.id : '') + ':' + (s.custom_title||'');
 }
@@ -1263,6 +1299,8 @@ function openSession(sid) {
   document.getElementById('permCards').innerHTML = '';
   lastPermCardId = '';
   lastTranscriptHash = '';
+  transcriptEntries = [];
+  transcriptCursor = null;
   scrollToBottomOnNextRender = true;
   fetchSessionDetail();
   startDetailPolling();
@@ -1289,7 +1327,7 @@ let detailPollTimer = null;
 let scrollToBottomOnNextRender = false;
 async function detailPollLoop() {
   await fetchSessionDetail();
-  detailPollTimer = setTimeout(detailPollLoop, 1000);
+  detailPollTimer = setTimeout(detailPollLoop, liveUpdates() ? 15000 : 1000);
 }
 function startDetailPolling() {
   stopDetailPolling();
@@ -1302,10 +1340,13 @@ function stopDetailPolling() {
 async function fetchSessionDetail() {
   if (!currentSessionId) return;
   try {
-    const res = await fetch('/api/sessions');
-    const data = await res.json();
-    const session = (data.sessions || []).find(s => s.session_id === currentSessionId);
-    if (!session) return;
+    const detailSid = currentSessionId;
+    const detail = await fetchJSONCached('/api/session/' + detailSid);
+    if (!detail.ok) return;
+    if (detailSid !== currentSessionId) return;
+    // Unchanged session version: state, permission card and transcript are all as rendered
+    if (!detail.changed && transcriptCursor !== null) return;
+    const session = detail.data;
 
     // Update title with state indicator
     const state = session.state || 'busy';
@@ -1357,10 +1398,23 @@ async function fetchSessionDetail() {
     // Render permission card if applicable
     renderPermCards(session);
 
-    // Fetch transcript
-    const tRes = await fetch('/api/session/' + currentSessionId + '/transcript?limit=500');
-    const tData = await tRes.json();
-    renderTranscript(tData.entries || []);
+    // Fetch transcript — only entries past our cursor, unless the server says to start over.
+    // Skipped entirely when the session's cursor shows nothing was appended.
+    if (transcriptCursor !== null && session.transcript_cursor === transcriptCursor) return;
+    const sid = currentSessionId;
+    let tUrl = '/api/session/' + sid + '/transcript?limit=' + TRANSCRIPT_LIMIT;
+    if (transcriptCursor !== null) tUrl += '&after=' + transcriptCursor;
+    const tResult = await fetchJSONCached(tUrl);
+    if (sid !== currentSessionId || !tResult.changed) return;
+    const tData = tResult.data;
+    const newEntries = tData.entries || [];
+    if (tData.reset || transcriptCursor === null) {
+      transcriptEntries = newEntries;
+    } else if (newEntries.length) {
+      transcriptEntries = transcriptEntries.concat(newEntries).slice(-TRANSCRIPT_LIMIT);
+    }
+    if (tData.cursor !== undefined) transcriptCursor = tData.cursor;
+    renderTranscript(transcriptEntries);
   } catch (e) {
     console.error('fetchSessionDetail error:', e);
   }
@@ -1380,6 +1434,8 @@ function renderPermCards(session) {
   // Skip re-render if same permission request is already shown
   if (pr.id === lastPermCardId) return;
   lastPermCardId = pr.id;
+  requestPatterns = {};
+  requestPatterns[pr.id] = pr.allow_patterns || [];
 
   const cat = toolCat(pr.tool_name);
   const isBenign = ['plan','question','web'].includes(cat) || pr.tool_name === 'Read';
@@ -1922,16 +1978,14 @@ async function respondAlwaysAll(reqId, btn) {
   const card = btn.closest('.perm-card');
   if (card) card.querySelectorAll('button').forEach(b => b.disabled = true);
   btn.textContent = '...';
-  // Get patterns from the session data
   try {
-    const res = await fetch('/api/pending');
-    const data = await res.json();
-    const req = (data.requests || []).find(r => r.id === reqId);
-    const patterns = (req && req.allow_patterns) || [];
-    await fetch('/api/respond', {
+    // Every pattern is added in one call (settings written once)
+    const item = {id: reqId, decision: 'always', allow_patterns: requestPatterns[reqId] || []};
+    if (currentSessionId) item.session_id = currentSessionId;
+    await fetch('/api/respond-batch', {
       method: 'POST',
       headers: {'Content-Type': 'application/json'},
-      body: JSON.stringify({id: reqId, decision: 'always', allow_patterns: patterns})
+      body: JSON.stringify({items: [item]})
     });
     respondedIds.add(reqId);
     if (currentView === 'dashboard') fetchSessions();
@@ -2078,11 +2132,7 @@ async function sendPrompt() {
       showToast('Failed to send prompt: ' + msg, true);
     } else {
       scrollToBottomOnNextRender = true;
-      fetchSessionDetail();
-      setTimeout(fetchSessionDetail, 200);
-      setTimeout(fetchSessionDetail, 500);
-      setTimeout(fetchSessionDetail, 1000);
-      setTimeout(fetchSessionDetail, 2000);
+      refreshBurst(fetchSessionDetail, [200, 500, 1000, 2000]);
     }
   } catch (e) {
     showToast('Failed to send prompt: network error', true);
@@ -2102,9 +2152,7 @@ async function sendInterrupt(sessionId) {
       showToast('Failed to interrupt: ' + msg, true);
     } else {
       showToast('Interrupt sent');
-      fetchSessionDetail();
-      setTimeout(fetchSessionDetail, 500);
-      setTimeout(fetchSessionDetail, 1000);
+      refreshBurst(fetchSessionDetail, [500, 1000]);
     }
   } catch (e) {
     showToast('Failed to interrupt: network error', true);
@@ -2129,11 +2177,7 @@ async function quickPrompt(prompt) {
       showToast('Failed to send prompt: ' + msg, true);
     } else {
       scrollToBottomOnNextRender = true;
-      fetchSessionDetail();
-      setTimeout(fetchSessionDetail, 200);
-      setTimeout(fetchSessionDetail, 500);
-      setTimeout(fetchSessionDetail, 1000);
-      setTimeout(fetchSessionDetail, 2000);
+      refreshBurst(fetchSessionDetail, [200, 500, 1000, 2000]);
     }
   } catch (e) {
     showToast('Failed to send prompt: network error', true);
@@ -2168,11 +2212,7 @@ async function sendDashboardPrompt(sessionId) {
       const msg = await res.text().catch(() => 'Unknown error');
       showToast('Failed to send prompt: ' + msg, true);
     } else {
-      fetchSessions();
-      setTimeout(fetchSessions, 200);
-      setTimeout(fetchSessions, 500);
-      setTimeout(fetchSessions, 1000);
-      setTimeout(fetchSessions, 2000);
+      refreshBurst(fetchSessions, [200, 500, 1000, 2000]);
     }
   } catch (e) {
     showToast('Failed to send prompt: network error', true);
@@ -2326,12 +2366,80 @@ document.addEventListener('keydown', function(e) {
   }
 });
 
+// ── Live updates ──
+// /api/events pushes session changes as they happen; polling is the fallback
+// (no EventSource, server without a transcript watcher, or federation, whose
+// remote sessions aren't part of the local event stream).
+let eventSource = null;
+let eventsConnected = false;
+let dashboardRefreshPending = false;
+let detailRefreshPending = false;
+
+function liveUpdates() {
+  return eventsConnected && federationRemoteNames.length === 0;
+}
+
+// Refresh now, then a few more times while the session reacts — unless events will tell us
+function refreshBurst(fn, delays) {
+  fn();
+  if (liveUpdates()) return;
+  delays.forEach(function(d) { setTimeout(fn, d); });
+}
+
+function scheduleDashboardRefresh() {
+  if (dashboardRefreshPending) return;
+  dashboardRefreshPending = true;
+  setTimeout(function() { dashboardRefreshPending = false; if (currentView === 'dashboard') fetchSessions(); }, 50);
+}
+
+function scheduleDetailRefresh() {
+  if (detailRefreshPending) return;
+  detailRefreshPending = true;
+  setTimeout(function() { detailRefreshPending = false; if (currentView === 'detail') fetchSessionDetail(); }, 50);
+}
+
+function onSessionEvent(e) {
+  let data = {};
+  try { data = JSON.parse(e.data); } catch (err) {}
+  if (currentView === 'dashboard') scheduleDashboardRefresh();
+  else if (currentView === 'detail' && (!data.session_id || data.session_id === currentSessionId)) scheduleDetailRefresh();
+}
+
+function connectEvents() {
+  if (!window.EventSource || eventSource) return;
+  eventSource = new EventSource('/api/events');
+  eventSource.onopen = function() {
+    eventsConnected = true;
+    // Catch up on anything that happened while disconnected
+    if (currentView === 'dashboard') scheduleDashboardRefresh(); else scheduleDetailRefresh();
+  };
+  eventSource.onerror = function() {
+    const wasLive = liveUpdates();
+    eventsConnected = false;
+    if (wasLive) {
+      // Pollers are sleeping on the slow interval — bring them back to 1s now
+      clearTimeout(pollTimer);
+      pollLoop();
+      if (currentView === 'detail') startDetailPolling();
+    }
+    if (eventSource.readyState === EventSource.CLOSED) {
+      // Server refused the stream (e.g. no watcher) — stay on polling, try again later
+      eventSource = null;
+      setTimeout(connectEvents, 30000);
+    }
+  };
+  ['session_added', 'session_removed', 'state_changed', 'pending_request', 'transcript_appended', 'resync'].forEach(function(kind) {
+    eventSource.addEventListener(kind, onSessionEvent);
+  });
+}
+
 // ── Polling ──
 async function pollLoop() {
   if (currentView === 'dashboard') await fetchSessions();
-  pollTimer = setTimeout(pollLoop, 1000);
+  pollTimer = setTimeout(pollLoop, liveUpdates() ? 15000 : 1000);
 }
 pollLoop();
+connectEvents();
 </script>
 </body>
 </html>"""
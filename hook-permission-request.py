@@ -2,8 +2,9 @@
 """
 PermissionRequest hook for Claude Code WebUI.
 
-Called before Claude executes a tool that requires permission.
-All auto-allow logic is centralized here; the server only stores session state.
+Called before Claude executes a tool that requires permission.  The auto-allow
+logic lives in permission_rules.py and the server runs it for the hook, with
+the settings files cached, so a tool call costs the hook one round trip.
 
 Auto-allow tiers (checked in order, first match wins):
   1. Persistent rules   — glob patterns in .claude/settings.local.json (survive restarts)
@@ -11,35 +12,45 @@ Auto-allow tiers (checked in order, first match wins):
   3. Tmux allowlist      — tmux commands used by WebUI prompt delivery
   4. Session rules       — per-session per-tool rules stored in server memory
                            (set by user clicking "Allow for session" in the UI,
-                           cleared on session end/clear; queried via server API
-                           because the hook is a short-lived process with no memory)
+                           cleared on session end/clear)
   5. Server offline      — if the server is unreachable, auto-allow everything
                            so Claude Code keeps working without the WebUI
 
-If none of the above match, the hook writes a .request.json and polls for a
-.response.json written by the server when the user decides in the Web UI.
+If none of the above match, the user decides in the Web UI.  The hook submits
+the tool call on the server's decision socket (QUEUE_DIR/decisions.sock); the
+server evaluates tiers 1–4, queues the request and sends the decision back on
+the same connection.  Without the socket (Windows, an older server) the hook
+asks POST /api/evaluate, writes the .request.json itself and waits for the
+.response.json (woken by inotify on Linux, polling elsewhere) — as it also
+does when the server goes away after queuing the request.
 
 Input:  JSON on stdin with { tool_name, tool_input }
 Output: JSON on stdout with { hookSpecificOutput: { decision: { behavior: "allow"|"deny" } } }
 """
 
 import atexit
-import fnmatch
 import glob
 import json
 import os
-import re
 import sys
 import time
-import urllib.parse
+import urllib.error
 import urllib.request
 import uuid
 
 from platform_utils import get_queue_dir, find_claude_pid
+from permission_rules import REQUEST_FIELDS, evaluate
+
+try:
+    import decision_socket
+except ImportError:  # installed without it (e.g. a copied hook) — use the file queue
+    decision_socket = None
 
 QUEUE_DIR = get_queue_dir()
 SERVER = "http://127.0.0.1:19836"
 TIMEOUT = 86400  # 24 hours
+POLL_INTERVAL = 0.5  # seconds between response file checks without inotify
+WATCH_RECHECK = 5    # with inotify, re-check this often anyway in case an event is missed
 
 
 def allow_response():
@@ -64,275 +75,107 @@ def deny_response(message="User denied via web UI"):
     sys.exit(0)
 
 
-def build_detail(tool_name, tool_input):
-    """Build detail text, detail_sub, allow_pattern, and allow_patterns per tool type."""
-    detail = ""
-    detail_sub = ""
-    allow_pattern = tool_name
-    allow_patterns = []
-
-    if tool_name in ("Bash", "mcp__acp__Bash"):
-        command = tool_input.get("command", "")
-        detail = command
-        detail_sub = ""
-        # Parse compound commands into individual allow patterns
-        # Split on | and && to get individual commands
-        parts = re.split(r'\||\&\&', command)
-        patterns = []
-        for part in parts:
-            part = part.strip()
-            if not part:
-                continue
-            first_line = part.split("\n")[0].strip()
-            tokens = first_line.split()
-            if not tokens:
-                continue
-            base = os.path.basename(tokens[0])
-            if not base:
-                continue
-            # Find first non-flag argument as subcommand
-            sub = ""
-            for t in tokens[1:]:
-                if not t.startswith(("-", "/", ".")):
-                    sub = t
-                    break
-            if sub:
-                pat = f"Bash({base} {sub}:*)"
-            else:
-                pat = f"Bash({base}:*)"
-            if pat not in patterns:
-                patterns.append(pat)
-        allow_patterns = patterns
-        allow_pattern = patterns[0] if patterns else f"Bash({command})"
-
-    elif tool_name in ("Write", "mcp__acp__Write"):
-        file_path = tool_input.get("file_path", "")
-        detail = file_path
-        allow_pattern = f"Write({file_path})"
-
-    elif tool_name in ("Edit", "mcp__acp__Edit"):
-        file_path = tool_input.get("file_path", "")
-        old_string = tool_input.get("old_string", "")
-        detail = file_path
-        detail_sub = "\n".join(old_string.split("\n")[:5]) if old_string else ""
-        allow_pattern = f"Edit({file_path})"
-
-    elif tool_name == "ExitPlanMode":
-        plan = tool_input.get("plan", "")
-        detail = plan if plan else "Exit plan mode"
-        # allowedPrompts as subtitle
-        allowed = tool_input.get("allowedPrompts", [])
-        if allowed:
-            parts = [f"{p.get('tool', '?')}: {p.get('prompt', '?')}" for p in allowed]
-            detail_sub = "Requested permissions: " + ", ".join(parts)
-        allow_pattern = "ExitPlanMode"
-
-    elif tool_name == "AskUserQuestion":
-        questions = tool_input.get("questions", [])
-        if questions:
-            lines = []
-            for q in questions:
-                lines.append(f"Q: {q.get('question', '')}")
-                for opt in q.get("options", []):
-                    lines.append(f"  - {opt.get('label', '')} — {opt.get('description', '')}")
-            detail = "\n".join(lines)
-        else:
-            # Fallback
-            detail = json.dumps(tool_input, indent=2)[:500]
-        allow_pattern = "AskUserQuestion"
-
-    elif tool_name == "WebFetch":
-        detail = tool_input.get("url", "")
-        detail_sub = tool_input.get("prompt", "")
-        allow_pattern = "WebFetch"
-
-    elif tool_name == "WebSearch":
-        detail = tool_input.get("query", "")
-        allow_pattern = "WebSearch"
-
-    else:
-        # Generic: dump tool_input
-        items = [f"{k}: {v}" for k, v in list(tool_input.items())[:10]]
-        detail = "\n".join(items)
-        allow_pattern = tool_name
-
-    return detail, detail_sub, allow_pattern, allow_patterns
-
-
-def _match_allow_pattern(tool_name, detail, pattern):
-    """Check if a single detail string matches an allow pattern."""
-    if not pattern:
-        return False
-    # Exact tool name match (e.g., "Read", "WebSearch", "Bash")
-    if pattern == tool_name:
-        return True
-    # Check ToolName(glob) pattern
-    prefix = f"{tool_name}("
-    if pattern.startswith(prefix) and pattern.endswith(")"):
-        inner = pattern[len(prefix):-1]
-        # Convert ":*" suffix to just "*" for fnmatch
-        glob_inner = inner.replace(":*", "*")
-        if fnmatch.fnmatch(detail, glob_inner):
-            return True
-    return False
-
-
-def _check_single_command(tool_name, command_str, allow_list):
-    """Check if a single (non-compound) command matches any allow pattern."""
-    command_str = command_str.strip()
-    if not command_str:
-        return True
-    # Build detail for this single command (first_line as detail)
-    first_line = command_str.split("\n")[0].strip()
-    for pattern in allow_list:
-        if _match_allow_pattern(tool_name, first_line, pattern):
-            return True
-        # Also try matching with just the base command + subcommand
-        tokens = first_line.split()
-        if tokens:
-            base = os.path.basename(tokens[0])
-            if base:
-                sub = ""
-                for t in tokens[1:]:
-                    if not t.startswith(("-", "/", ".")):
-                        sub = t
-                        break
-                # Try "base sub ..." and "base ..."
-                detail_with_sub = f"{base} {sub}" if sub else base
-                if _match_allow_pattern(tool_name, detail_with_sub, pattern):
-                    return True
-                if _match_allow_pattern(tool_name, base, pattern):
-                    return True
-    return False
-
-
-def check_auto_allow(tool_name, detail, settings_file):
-    """Check if this tool call matches any pre-approved pattern in settings.local.json."""
-    if not os.path.isfile(settings_file):
-        return False
+def _open_queue_watch():
+    """inotify watch on QUEUE_DIR for files being written or moved in, or None."""
+    try:
+        from file_watcher import IN_CLOSE_WRITE, IN_MOVED_TO, IN_ONLYDIR, Inotify, inotify_supported
+        if not inotify_supported():
+            return None
+        watch = Inotify()
+    except (ImportError, OSError, AttributeError):
+        return None
+    try:
+        watch.add_watch(QUEUE_DIR, IN_CLOSE_WRITE | IN_MOVED_TO | IN_ONLYDIR)
+    except OSError:
+        watch.close()
+        return None
+    return watch
+
+
+def _read_response(response_file):
+    """The response file's data, or None if it isn't there (or not completely written) yet."""
+    if not os.path.isfile(response_file):
+        return None
     try:
-        with open(settings_file) as f:
-            settings = json.load(f)
+        with open(response_file) as f:
+            return json.load(f)
     except (json.JSONDecodeError, IOError):
-        return False
-
-    allow_list = settings.get("permissions", {}).get("allow", [])
-    if not allow_list:
-        return False
-
-    # For Bash commands, split compound commands and check each part
-    if tool_name in ("Bash", "mcp__acp__Bash"):
-        parts = re.split(r'\||\&\&|;', detail)
-        non_empty = [p for p in parts if p.strip()]
-        if non_empty and all(
-            _check_single_command(tool_name, p, allow_list)
-            for p in non_empty
-        ):
-            return True
-        return False
-
-    # Non-Bash tools: direct match
-    for pattern in allow_list:
-        if _match_allow_pattern(tool_name, detail, pattern):
-            return True
-    return False
-
-
-# ── Smart auto-approve ──
-
-READONLY_COMMANDS = {
-    # File viewing
-    "cat", "head", "tail", "less", "more", "wc", "file", "stat", "du", "df",
-    # Directory listing
-    "ls", "tree", "find", "realpath", "dirname", "basename",
-    # Search
-    "grep", "rg", "ag", "fgrep", "egrep",
-    # Version/info
-    "echo", "printf", "date", "whoami", "hostname", "uname", "env", "printenv",
-    "which", "type", "command", "true", "false", "test",
-    # Package info (read-only)
-    "npm", "pip", "pip3", "cargo", "go", "python", "python3", "node", "ruby", "java", "javac",
-}
-
-READONLY_GIT_SUBCOMMANDS = {
-    "log", "diff", "status", "show", "branch", "tag", "remote", "stash",
-    "blame", "shortlog", "describe", "rev-parse", "rev-list", "ls-files",
-    "ls-tree", "cat-file", "config",
-}
-
-DANGEROUS_COMMANDS = {
-    "rm", "rmdir", "mv", "chmod", "chown", "chgrp", "mkfs", "dd",
-    "shutdown", "reboot", "kill", "killall", "pkill",
-    "curl", "wget",  # network access
-    "ssh", "scp", "rsync",  # remote access
-    "sudo", "su", "doas",  # privilege escalation
-}
-
-READONLY_TOOLS = {"Read", "Glob", "Grep", "mcp__acp__Read", "mcp__acp__Glob", "mcp__acp__Grep"}
-
-
-def _is_readonly_bash(command):
-    """Check if a Bash command (possibly compound) is read-only."""
-    parts = re.split(r'\||&&|\|\||;', command)
-    for part in parts:
-        part = part.strip()
-        if not part:
-            continue
-        first_line = part.split("\n")[0].strip()
-        tokens = first_line.split()
-        if not tokens:
-            continue
-        base = os.path.basename(tokens[0])
-        if not base:
-            continue
-        if base in DANGEROUS_COMMANDS:
-            return False
-        if base == "sed":
-            if "-i" in tokens or any(t.startswith("-i") for t in tokens[1:]):
-                return False
-            continue
-        if base in ("awk", "gawk", "mawk", "nawk"):
-            continue
-        if base == "git":
-            sub = ""
-            for t in tokens[1:]:
-                if not t.startswith("-"):
-                    sub = t
-                    break
-            if sub not in READONLY_GIT_SUBCOMMANDS:
-                return False
-            continue
-        if base in READONLY_COMMANDS:
-            continue
-        return False
-    return True
+        return None
+
+
+def wait_for_response(response_file, timeout=TIMEOUT):
+    """Block until the server writes response_file; returns its data, or None after timeout seconds.
+
+    The response is picked up as soon as it is written when inotify is
+    available, else within POLL_INTERVAL.
+    """
+    deadline = time.monotonic() + timeout
+    watch = _open_queue_watch()
+    try:
+        while True:
+            resp = _read_response(response_file)
+            if resp is not None:
+                return resp
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            if watch:
+                watch.read(timeout=min(remaining, WATCH_RECHECK))
+            else:
+                time.sleep(min(remaining, POLL_INTERVAL))
+    finally:
+        if watch:
+            watch.close()
+
 
+def submit_to_server(request_data, respond):
+    """Submit the request on the server's decision socket and wait there for the decision.
 
-def _is_project_file(file_path, project_dir):
-    """Check if a file path is within the project directory."""
-    if not file_path or not project_dir:
-        return False
+    Calls respond() with the decision (or None on timeout), which exits.
+    Returns the id of the request the server queued if the connection broke
+    while waiting, or None if the socket can't be used at all.
+    """
+    if decision_socket is None or not decision_socket.supported():
+        return None
     try:
-        real_file = os.path.realpath(file_path)
-        real_cwd = os.path.realpath(project_dir)
-        return real_file.startswith(real_cwd + os.sep) or real_file == real_cwd
-    except (ValueError, OSError):
-        return False
-
-
-def check_smart_auto_approve(tool_name, tool_input, project_dir):
-    """Check if a tool call should be auto-approved by smart rules."""
-    if tool_name in READONLY_TOOLS:
-        return True
-    if tool_name in ("Bash", "mcp__acp__Bash"):
-        command = tool_input.get("command", "") if isinstance(tool_input, dict) else ""
-        if command and _is_readonly_bash(command):
-            return True
-    if tool_name in ("Write", "Edit", "mcp__acp__Write", "mcp__acp__Edit"):
-        file_path = tool_input.get("file_path", "") if isinstance(tool_input, dict) else ""
-        if _is_project_file(file_path, project_dir):
-            return True
-    return False
+        conn = decision_socket.Connection(decision_socket.socket_path(QUEUE_DIR))
+    except OSError:
+        return None
+    queued_id = None
+    try:
+        answer = conn.submit(request_data)
+        queued_id = answer.get("queued")
+        if queued_id:
+            answer = conn.wait(TIMEOUT)
+        if answer is None or "decision" in answer:
+            respond(answer, "User denied via web UI" if queued_id in (None, request_data["id"]) else "User denied")
+    except OSError:
+        pass
+    finally:
+        conn.close()
+    return queued_id
+
+
+def evaluate_on_server(tool_name, tool_input, project_dir, session_id):
+    """The server's verdict on tiers 1–4 (see permission_rules.evaluate), or None if it is offline.
+
+    A server without /api/evaluate (404) can't check session rules; tiers 1–3
+    are evaluated here then.  Any other error status counts as offline —
+    evaluating locally would skip the session rules it does have.
+    """
+    body = json.dumps({"tool_name": tool_name, "tool_input": tool_input,
+                       "cwd": project_dir, "session_id": session_id}).encode()
+    req = urllib.request.Request(f"{SERVER}/api/evaluate", data=body, method="POST",
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=2) as resp:
+            return json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            return evaluate(tool_name, tool_input, project_dir)
+        return None
+    except Exception:
+        return None
 
 
 def main():
@@ -363,43 +206,70 @@ def main():
             tool_input = {}
 
     project_dir = os.getcwd()
-    settings_file = os.path.join(project_dir, ".claude", "settings.local.json")
     session_id = input_data.get("session_id", "") or str(find_claude_pid())
 
-    # Build detail and patterns
-    detail, detail_sub, allow_pattern, allow_patterns = build_detail(tool_name, tool_input)
-
-    # ── Auto-allow tiers (first match wins) ──
+    # Generate request ID
+    try:
+        request_id = str(uuid.uuid4())
+    except Exception:
+        request_id = str(int(time.time() * 1e9))
 
-    # Tier 1: Persistent rules (settings.local.json glob patterns)
-    if check_auto_allow(tool_name, detail, settings_file):
-        allow_response()
+    request_file = os.path.join(QUEUE_DIR, f"{request_id}.request.json")
+    response_file = os.path.join(QUEUE_DIR, f"{request_id}.response.json")
 
-    # Tier 2: Smart rules (read-only tools, read-only bash, project-internal edits)
-    if check_smart_auto_approve(tool_name, tool_input, project_dir):
-        allow_response()
+    # Clean up request file on exit
+    def cleanup():
+        try:
+            os.remove(request_file)
+        except OSError:
+            pass
+    atexit.register(cleanup)
 
-    # Tier 3: Tmux allowlist (WebUI uses tmux for prompt delivery)
-    if tool_name in ("Bash", "mcp__acp__Bash"):
-        command = tool_input.get("command", "").strip()
-        first_token = command.split()[0] if command.split() else ""
-        if os.path.basename(first_token) == "tmux":
-            allow_response()
+    request_data = {
+        "id": request_id,
+        "tool_name": tool_name,
+        "tool_input": tool_input,
+        "timestamp": int(time.time()),
+        "pid": os.getpid(),
+        "session_id": session_id,
+        "project_dir": project_dir,
+    }
 
-    # Tier 4: Session rules (per-session per-tool, stored in server memory)
-    # Queried via API because this hook is a short-lived process with no memory.
-    # This call also doubles as the server-online check (tier 5).
-    try:
-        req = urllib.request.Request(
-            f"{SERVER}/api/check-auto-allow?session_id={urllib.parse.quote(str(session_id))}"
-            f"&tool_name={urllib.parse.quote(tool_name)}")
-        resp = urllib.request.urlopen(req, timeout=2)
-        data = json.loads(resp.read())
-        if data.get("auto_allow"):
+    def respond(resp, denied_message="User denied via web UI"):
+        for path in (request_file, response_file):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        # Unregister atexit since we cleaned up manually
+        atexit.unregister(cleanup)
+        if resp is None:
+            deny_response("Approval timed out")
+        if resp.get("decision", "deny") in ("allow", "always"):
             allow_response()
-    except Exception:
+        deny_response(resp.get("message", denied_message))
+
+    # Tiers 1–4 and the wait, over the server's decision socket: the server
+    # evaluates the auto-allow tiers, queues the request (or joins it to an
+    # identical pending one) and answers on the same connection once the user decides.
+    deadline = time.monotonic() + TIMEOUT
+    queued_id = submit_to_server(request_data, respond)
+    if queued_id:
+        # The server queued the request and then went away — the queue files
+        # outlive it, wait for the response file instead.
+        denied_message = "User denied via web UI" if queued_id == request_id else "User denied"
+        respond(wait_for_response(os.path.join(QUEUE_DIR, f"{queued_id}.response.json"),
+                                  max(deadline - time.monotonic(), 0)), denied_message)
+
+    # No decision socket (Windows, an older server): tiers 1–4 via /api/evaluate,
+    # then the file queue.
+    verdict = evaluate_on_server(tool_name, tool_input, project_dir, session_id)
+    if verdict is None:
         # Tier 5: Server offline — allow everything so Claude keeps working
         allow_response()
+    if verdict["decision"] == "allow":
+        allow_response()
+    request_data.update((field, verdict[field]) for field in REQUEST_FIELDS)
 
     # Dedup: if this session already has a pending request for the same tool+input,
     # piggyback on it instead of creating a duplicate.
@@ -421,57 +291,9 @@ def main():
             continue
 
     if existing_rid:
-        # Piggyback: poll the existing request's response file
-        response_file = os.path.join(QUEUE_DIR, f"{existing_rid}.response.json")
-        elapsed = 0
-        while elapsed < TIMEOUT:
-            if os.path.isfile(response_file):
-                try:
-                    with open(response_file) as f:
-                        resp = json.load(f)
-                    decision = resp.get("decision", "deny")
-                    if decision in ("allow", "always"):
-                        allow_response()
-                    else:
-                        deny_response(resp.get("message", "User denied"))
-                except (json.JSONDecodeError, IOError):
-                    pass
-            time.sleep(0.5)
-            elapsed += 1
-        deny_response("Approval timed out")
-
-    # Generate request ID
-    try:
-        request_id = str(uuid.uuid4())
-    except Exception:
-        request_id = str(int(time.time() * 1e9))
-
-    request_file = os.path.join(QUEUE_DIR, f"{request_id}.request.json")
-    response_file = os.path.join(QUEUE_DIR, f"{request_id}.response.json")
-
-    # Clean up request file on exit
-    def cleanup():
-        try:
-            os.remove(request_file)
-        except OSError:
-            pass
-    atexit.register(cleanup)
+        # Piggyback: wait for the existing request's response file
+        respond(wait_for_response(os.path.join(QUEUE_DIR, f"{existing_rid}.response.json")), "User denied")
 
-    # Write request
-    request_data = {
-        "id": request_id,
-        "tool_name": tool_name,
-        "tool_input": tool_input,
-        "detail": detail,
-        "detail_sub": detail_sub,
-        "allow_pattern": allow_pattern,
-        "allow_patterns": allow_patterns if allow_patterns else [],
-        "settings_file": settings_file,
-        "timestamp": int(time.time()),
-        "pid": os.getpid(),
-        "session_id": session_id,
-        "project_dir": project_dir,
-    }
     # Write atomically via temp file + os.replace to prevent the server
     # from reading a half-written file.  os.replace works on both POSIX
     # and Windows (unlike os.rename which fails on Windows if dest exists).
@@ -480,48 +302,8 @@ def main():
         json.dump(request_data, f)
     os.replace(tmp_file, request_file)
 
-    # Poll for response
-    elapsed = 0
-    while elapsed < TIMEOUT:
-        if os.path.isfile(response_file):
-            try:
-                with open(response_file) as f:
-                    resp = json.load(f)
-            except (json.JSONDecodeError, IOError):
-                time.sleep(0.5)
-                elapsed += 1
-                continue
-
-            decision = resp.get("decision", "deny")
-            message = resp.get("message", "User denied via web UI")
-
-            # Cleanup
-            try:
-                os.remove(request_file)
-            except OSError:
-                pass
-            try:
-                os.remove(response_file)
-            except OSError:
-                pass
-            # Unregister atexit since we cleaned up manually
-            atexit.unregister(cleanup)
-
-            if decision in ("allow", "always"):
-                allow_response()
-            else:
-                deny_response(message)
-
-        time.sleep(0.5)
-        elapsed += 1
-
-    # Timeout
-    try:
-        os.remove(request_file)
-    except OSError:
-        pass
-    atexit.unregister(cleanup)
-    deny_response("Approval timed out")
+    # Wait for the response
+    respond(wait_for_response(response_file))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,318 @@
+"""
+Worker-pool HTTP serving for Claude Code WebUI.
+
+PooledHTTPServer serves requests from fixed-size thread pools with bounded
+queues instead of starting a thread per connection.  Each request runs in
+the pool its handler picks (PooledRequestHandler.request_pool), so slow
+routes — remote proxies, federation, long-polls, event streams — queue up
+in their own pools and can't starve the fast local ones.  Idle keep-alive
+connections don't hold a worker either: between requests they are parked
+on a selector and queued again when the next request arrives.
+
+A full queue is answered with 503 and Retry-After instead of piling up.
+"""
+
+import queue
+import selectors
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+_BUSY_RESPONSE = (b"HTTP/1.1 503 Service Unavailable\r\n"
+                  b"Content-Type: text/plain\r\n"
+                  b"Content-Length: 12\r\n"
+                  b"Retry-After: 1\r\n"
+                  b"Connection: close\r\n\r\n"
+                  b"Server busy\n")
+
+
+class WorkerPool:
+    """Fixed number of threads running callables from a bounded queue."""
+
+    def __init__(self, name, workers, queue_size):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queue = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self._threads = []
+        self.busy = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"http-{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        self._threads = []
+
+    def submit(self, job):
+        """Queue job(); returns False (and counts a rejection) if the queue is full."""
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        depth = self._queue.qsize()
+        with self._lock:
+            if depth > self.max_queued:
+                self.max_queued = depth
+        return True
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                self.busy += 1
+            try:
+                job()
+            except Exception as e:
+                print(f"[!] HTTP worker ({self.name}) error: {e}")
+            finally:
+                with self._lock:
+                    self.busy -= 1
+                    self.completed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "busy": self.busy,
+                "queued": self._queue.qsize(),
+                "queue_size": self.queue_size,
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+class PooledRequestHandler(BaseHTTPRequestHandler):
+    """Request handler that can run under PooledHTTPServer or any socketserver.
+
+    Override request_pool() to route a request (its command, path and
+    headers are parsed by then, its body is not read yet) to another pool.
+    Under a plain server the pool choice is ignored and the handler behaves
+    like BaseHTTPRequestHandler.
+    """
+
+    def __init__(self, request, client_address, server):
+        if not isinstance(server, PooledHTTPServer):
+            super().__init__(request, client_address, server)
+            return
+        # The server drives the request loop — only set up the connection here
+        self.request = request
+        self.client_address = client_address
+        self.server = server
+        self.pool = PooledHTTPServer.DEFAULT_POOL
+        self.transfer_to = None
+        self.close_connection = False
+        self.setup()
+
+    def request_pool(self):
+        return PooledHTTPServer.DEFAULT_POOL
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        if isinstance(self.server, PooledHTTPServer):
+            pool = self.request_pool()
+            if pool != self.pool:
+                # handle_one_request stops here; the server finishes it in that pool
+                self.transfer_to = pool
+                return False
+        return True
+
+    def dispatch_request(self):
+        """Run the parsed request's do_* method (the tail of handle_one_request)."""
+        self.transfer_to = None
+        try:
+            method = getattr(self, "do_" + self.command, None)
+            if method is None:
+                self.send_error(501, f"Unsupported method ({self.command!r})")
+                return
+            method()
+            self.wfile.flush()
+        except TimeoutError as e:
+            self.log_error("Request timed out: %r", e)
+            self.close_connection = True
+
+    def has_buffered_input(self):
+        """True if bytes of a next request are already readable without blocking."""
+        try:
+            self.connection.settimeout(0)
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            try:
+                self.connection.settimeout(self.timeout)
+            except OSError:
+                pass
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer running requests on named WorkerPools.
+
+    pools maps a pool name to (workers, queue_size) and must include
+    DEFAULT_POOL, where every request starts.  stats() reports each pool's
+    size, busy workers, queue depth (current and peak), completed requests
+    and rejections, plus the number of parked idle connections.
+    """
+
+    DEFAULT_POOL = "fast"
+
+    def __init__(self, server_address, handler_class, pools, idle_timeout=30.0):
+        self.pools = {name: WorkerPool(name, workers, queue_size)
+                      for name, (workers, queue_size) in pools.items()}
+        self.idle_timeout = idle_timeout
+        self._selector = selectors.DefaultSelector()
+        self._parked = {}  # handler -> idle deadline
+        self._park_lock = threading.Lock()
+        self._to_park = []
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._stopping = False
+        super().__init__(server_address, handler_class)
+        for pool in self.pools.values():
+            pool.start()
+        threading.Thread(target=self._idle_loop, name="http-idle", daemon=True).start()
+
+    # socketserver hooks
+
+    def process_request(self, request, client_address):
+        try:
+            handler = self.RequestHandlerClass(request, client_address, self)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+        # New connections wait for their first request like idle ones
+        self._park(handler)
+
+    def server_close(self):
+        super().server_close()
+        self._stopping = True
+        self._wake()
+        for pool in self.pools.values():
+            pool.stop()
+
+    def stats(self):
+        with self._park_lock:
+            idle = len(self._parked) + len(self._to_park)
+        return {"pools": {name: pool.stats() for name, pool in self.pools.items()},
+                "idle_connections": idle}
+
+    # connection lifecycle
+
+    def _serve(self, handler, dispatch=False):
+        """Serve one connection until it idles, closes or moves to another pool.
+
+        Runs in a worker once the connection is readable, or with dispatch
+        set to finish a request handed over from another pool.
+        """
+        try:
+            if dispatch:
+                handler.dispatch_request()
+            else:
+                handler.handle_one_request()
+            while True:
+                if handler.transfer_to:
+                    pool = handler.pool = handler.transfer_to
+                    if self.pools[pool].submit(lambda: self._serve(handler, dispatch=True)):
+                        return
+                    handler.transfer_to = None
+                    handler.send_error(503, "Server busy")  # closes the connection
+                if handler.close_connection:
+                    break
+                if not handler.has_buffered_input():
+                    self._park(handler)
+                    return
+                if handler.pool != self.DEFAULT_POOL:
+                    # A pipelined request after a slow one starts over in the default pool
+                    handler.pool = self.DEFAULT_POOL
+                    if self.pools[self.DEFAULT_POOL].submit(lambda: self._serve(handler)):
+                        return
+                    handler.send_error(503, "Server busy")
+                    break
+                handler.handle_one_request()
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+        self._close(handler)
+
+    def _close(self, handler):
+        try:
+            handler.finish()
+        except Exception:
+            pass
+        self.shutdown_request(handler.request)
+
+    def _park(self, handler):
+        handler.pool = self.DEFAULT_POOL
+        with self._park_lock:
+            self._to_park.append(handler)
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            pass
+
+    def _idle_loop(self):
+        while not self._stopping:
+            with self._park_lock:
+                to_park, self._to_park = self._to_park, []
+            now = time.monotonic()
+            for handler in to_park:
+                try:
+                    self._selector.register(handler.connection, selectors.EVENT_READ, handler)
+                except (ValueError, OSError):
+                    self._close(handler)
+                    continue
+                self._parked[handler] = now + self.idle_timeout
+            timeout = min(self._parked.values(), default=now + 1.0) - now
+            for key, _ in self._selector.select(max(0.0, min(timeout, 1.0))):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                handler = key.data
+                self._unpark(handler)
+                if not self.pools[self.DEFAULT_POOL].submit(lambda h=handler: self._serve(h)):
+                    self._reject(handler)
+            now = time.monotonic()
+            for handler, deadline in list(self._parked.items()):
+                if deadline <= now:
+                    self._unpark(handler)
+                    self._close(handler)
+        for handler in list(self._parked):
+            self._unpark(handler)
+            self._close(handler)
+
+    def _unpark(self, handler):
+        self._parked.pop(handler, None)
+        try:
+            self._selector.unregister(handler.connection)
+        except (KeyError, ValueError):
+            pass
+
+    def _reject(self, handler):
+        try:
+            handler.connection.sendall(_BUSY_RESPONSE)
+        except OSError:
+            pass
+        self._close(handler)
@@ -113,7 +113,7 @@ function Install-HookFiles {
     }
 
     # Copy hook scripts (copy instead of symlink — Windows symlinks require admin/developer mode)
-    $scripts = @("hook-permission-request.py", "hook-session-start.py", "hook-session-end.py", "platform_utils.py")
+    $scripts = @("hook-permission-request.py", "hook-session-start.py", "hook-session-end.py", "platform_utils.py", "permission_rules.py")
     foreach ($script in $scripts) {
         $src = Join-Path $ScriptDir $script
         $dst = Join-Path $HooksDir $script
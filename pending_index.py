@@ -0,0 +1,190 @@
+"""
+In-memory index of the permission requests in the queue dir.
+
+Every hook waiting for a decision leaves <id>.request.json in the queue dir
+and the answer is <id>.response.json.  PendingRequestIndex keeps the parsed
+requests keyed by request id and by session id, so finding a session's
+pending request is a dict lookup instead of a glob + parse of every file.
+
+It is fed per file (update(), from the file watcher's queue dir events and
+from the server's own writes) and by reconcile(), a full rescan that only
+re-parses files whose stat changed.
+"""
+
+import json
+import os
+import threading
+
+from platform_utils import is_process_alive
+
+REQUEST_SUFFIX = ".request.json"
+RESPONSE_SUFFIX = ".response.json"
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class PendingRequestIndex:
+    """Requests of one queue dir, by request id and by session id.
+
+    A request is pending while it has no response file and the hook process
+    that wrote it is alive; requests whose hook died (SIGKILL, OOM — its
+    atexit cleanup never ran) are removed when a lookup comes across them.
+    """
+
+    def __init__(self, queue_dir):
+        self.queue_dir = queue_dir
+        self._lock = threading.Lock()
+        self._requests = {}    # request id -> request data
+        self._stamps = {}      # request id -> stat key of the parsed (or unparsable) file
+        self._by_session = {}  # session id -> {request id}
+        self._answered = set()  # request ids with a response file
+
+    # ── Feeding ──
+
+    def update(self, path):
+        """Refresh the index for one changed (created, rewritten or deleted) queue dir file."""
+        name = os.path.basename(path)
+        if name.endswith(REQUEST_SUFFIX):
+            self._load(name[:-len(REQUEST_SUFFIX)])
+        elif name.endswith(RESPONSE_SUFFIX):
+            request_id = name[:-len(RESPONSE_SUFFIX)]
+            answered = os.path.exists(path)
+            with self._lock:
+                if answered:
+                    self._answered.add(request_id)
+                else:
+                    self._answered.discard(request_id)
+
+    def reconcile(self):
+        """Rescan the queue dir; only new or changed request files are parsed.
+
+        Also removes requests whose hook died.  Returns whether anything
+        changed: a request or response file appeared, changed or went away,
+        or an orphaned request was removed.
+        """
+        request_ids = set()
+        answered = set()
+        try:
+            with os.scandir(self.queue_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(REQUEST_SUFFIX):
+                        request_ids.add(entry.name[:-len(REQUEST_SUFFIX)])
+                    elif entry.name.endswith(RESPONSE_SUFFIX):
+                        answered.add(entry.name[:-len(RESPONSE_SUFFIX)])
+        except OSError:
+            return False
+        with self._lock:
+            gone = set(self._stamps) - request_ids
+            for request_id in gone:
+                self._drop_locked(request_id)
+            changed = bool(gone) or answered != self._answered
+            self._answered = answered
+        for request_id in request_ids:
+            changed = self._load(request_id) or changed
+        with self._lock:
+            unanswered = [(rid, data) for rid, data in self._requests.items() if rid not in self._answered]
+        for request_id, data in unanswered:
+            changed = not self._hook_alive(request_id, data) or changed
+        return changed
+
+    def _load(self, request_id):
+        """(Re)parse a request file if its stat changed; returns whether it did."""
+        path = os.path.join(self.queue_dir, request_id + REQUEST_SUFFIX)
+        key = _stat_key(path)
+        with self._lock:
+            if key is not None and self._stamps.get(request_id) == key:
+                return False
+            if key is None and request_id not in self._stamps:
+                return False
+        data = None
+        if key is not None:
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, UnicodeDecodeError, OSError):
+                data = None
+        with self._lock:
+            self._drop_locked(request_id)
+            if key is None:
+                return True
+            # Unparsable files keep their stamp, so they are only retried once rewritten
+            self._stamps[request_id] = key
+            if isinstance(data, dict):
+                self._requests[request_id] = data
+                sid = str(data.get("session_id", ""))
+                self._by_session.setdefault(sid, set()).add(request_id)
+        return True
+
+    def _drop_locked(self, request_id):
+        self._stamps.pop(request_id, None)
+        data = self._requests.pop(request_id, None)
+        if data is not None:
+            sid = str(data.get("session_id", ""))
+            ids = self._by_session.get(sid)
+            if ids:
+                ids.discard(request_id)
+                if not ids:
+                    del self._by_session[sid]
+
+    # ── Lookups ──
+
+    def get(self, request_id):
+        with self._lock:
+            return self._requests.get(request_id)
+
+    def pending_for_session(self, sid):
+        """The session's oldest pending request, or None."""
+        with self._lock:
+            candidates = sorted((self._stamps[rid][0], rid, self._requests[rid])
+                                for rid in self._by_session.get(str(sid), ())
+                                if rid not in self._answered)
+        for _, request_id, data in candidates:
+            if self._hook_alive(request_id, data):
+                return data
+        return None
+
+    def pending(self):
+        """All pending requests, ordered by request id."""
+        with self._lock:
+            candidates = sorted((rid, data) for rid, data in self._requests.items()
+                                if rid not in self._answered)
+        return [data for request_id, data in candidates if self._hook_alive(request_id, data)]
+
+    def session_request_ids(self, sid):
+        """Ids of all the session's requests, answered or not."""
+        with self._lock:
+            return sorted(self._by_session.get(str(sid), ()))
+
+    def _hook_alive(self, request_id, data):
+        """Check the request's hook process; an orphaned request is removed."""
+        pid = data.get("pid")
+        if not pid:
+            return True
+        try:
+            if is_process_alive(int(pid)):
+                return True
+        except (ValueError, TypeError):
+            pass
+        self.remove(request_id, response=False)
+        return False
+
+    # ── Removal ──
+
+    def remove(self, request_id, response=True):
+        """Delete a request's file (and its response file) and forget it."""
+        suffixes = (REQUEST_SUFFIX, RESPONSE_SUFFIX) if response else (REQUEST_SUFFIX,)
+        for suffix in suffixes:
+            try:
+                os.remove(os.path.join(self.queue_dir, request_id + suffix))
+            except OSError:
+                pass
+        with self._lock:
+            self._drop_locked(request_id)
+            if response:
+                self._answered.discard(request_id)
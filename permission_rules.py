@@ -0,0 +1,426 @@
+"""
+Auto-allow rules for permission requests, shared by the hook and the server.
+
+Tiers 1–3 of hook-permission-request.py (checked in order, first match wins):
+  1. Persistent rules   — glob patterns in .claude/settings.local.json
+  2. Smart rules         — read-only tools, read-only Bash, project-internal file edits
+  3. Tmux allowlist      — tmux commands used by WebUI prompt delivery
+
+The server runs them for the hook (evaluate(), plus tier 4, its in-memory
+session rules), so a settings file's allow list is parsed and compiled
+(AllowRules) once per change instead of once per tool call.
+"""
+
+import fnmatch
+import json
+import os
+import re
+
+# Request fields evaluate() derives from the tool call; the UI shows them
+REQUEST_FIELDS = ("detail", "detail_sub", "allow_pattern", "allow_patterns", "settings_file")
+
+
+def build_detail(tool_name, tool_input):
+    """Build detail text, detail_sub, allow_pattern, and allow_patterns per tool type."""
+    detail = ""
+    detail_sub = ""
+    allow_pattern = tool_name
+    allow_patterns = []
+
+    if tool_name in ("Bash", "mcp__acp__Bash"):
+        command = tool_input.get("command", "")
+        detail = command
+        detail_sub = ""
+        # Parse compound commands into individual allow patterns
+        # Split on | and && to get individual commands
+        parts = re.split(r'\||\&\&', command)
+        patterns = []
+        for part in parts:
+            part = part.strip()
+            if not part:
+                continue
+            first_line = part.split("\n")[0].strip()
+            tokens = first_line.split()
+            if not tokens:
+                continue
+            base = os.path.basename(tokens[0])
+            if not base:
+                continue
+            # Find first non-flag argument as subcommand
+            sub = ""
+            for t in tokens[1:]:
+                if not t.startswith(("-", "/", ".")):
+                    sub = t
+                    break
+            if sub:
+                pat = f"Bash({base} {sub}:*)"
+            else:
+                pat = f"Bash({base}:*)"
+            if pat not in patterns:
+                patterns.append(pat)
+        allow_patterns = patterns
+        allow_pattern = patterns[0] if patterns else f"Bash({command})"
+
+    elif tool_name in ("Write", "mcp__acp__Write"):
+        file_path = tool_input.get("file_path", "")
+        detail = file_path
+        allow_pattern = f"Write({file_path})"
+
+    elif tool_name in ("Edit", "mcp__acp__Edit"):
+        file_path = tool_input.get("file_path", "")
+        old_string = tool_input.get("old_string", "")
+        detail = file_path
+        detail_sub = "\n".join(old_string.split("\n")[:5]) if old_string else ""
+        allow_pattern = f"Edit({file_path})"
+
+    elif tool_name == "ExitPlanMode":
+        plan = tool_input.get("plan", "")
+        detail = plan if plan else "Exit plan mode"
+        # allowedPrompts as subtitle
+        allowed = tool_input.get("allowedPrompts", [])
+        if allowed:
+            parts = [f"{p.get('tool', '?')}: {p.get('prompt', '?')}" for p in allowed]
+            detail_sub = "Requested permissions: " + ", ".join(parts)
+        allow_pattern = "ExitPlanMode"
+
+    elif tool_name == "AskUserQuestion":
+        questions = tool_input.get("questions", [])
+        if questions:
+            lines = []
+            for q in questions:
+                lines.append(f"Q: {q.get('question', '')}")
+                for opt in q.get("options", []):
+                    lines.append(f"  - {opt.get('label', '')} — {opt.get('description', '')}")
+            detail = "\n".join(lines)
+        else:
+            # Fallback
+            detail = json.dumps(tool_input, indent=2)[:500]
+        allow_pattern = "AskUserQuestion"
+
+    elif tool_name == "WebFetch":
+        detail = tool_input.get("url", "")
+        detail_sub = tool_input.get("prompt", "")
+        allow_pattern = "WebFetch"
+
+    elif tool_name == "WebSearch":
+        detail = tool_input.get("query", "")
+        allow_pattern = "WebSearch"
+
+    else:
+        # Generic: dump tool_input
+        items = [f"{k}: {v}" for k, v in list(tool_input.items())[:10]]
+        detail = "\n".join(items)
+        allow_pattern = tool_name
+
+    return detail, detail_sub, allow_pattern, allow_patterns
+
+
+_GLOB_MAGIC = re.compile(r"[*?[]")
+
+
+class _PrefixTrie:
+    """Literal prefixes; matches() is one walk over the string, however many prefixes there are."""
+
+    _END = ""  # key marking a node where a prefix ends (never a character)
+
+    def __init__(self):
+        self._root = {}
+
+    def add(self, prefix):
+        node = self._root
+        for ch in prefix:
+            node = node.setdefault(ch, {})
+        node[self._END] = True
+
+    def matches(self, s):
+        """True if some prefix is a prefix of s."""
+        node = self._root
+        if not node:
+            return False
+        for ch in s:
+            if self._END in node:
+                return True
+            node = node.get(ch)
+            if node is None:
+                return False
+        return self._END in node
+
+
+class _ToolRules:
+    """The ToolName(glob) patterns of one tool, by glob shape."""
+
+    def __init__(self):
+        self.exact = set()             # globs without wildcards
+        self.prefixes = _PrefixTrie()  # "literal*" globs (":*" patterns)
+        self.globs = []                # everything else, combined into one regex
+        self.regex = None
+
+    def add(self, glob):
+        glob = os.path.normcase(glob)  # as fnmatch.fnmatch does
+        head, star = glob[:-1], glob[-1:]
+        if not _GLOB_MAGIC.search(glob):
+            self.exact.add(glob)
+        elif star == "*" and not _GLOB_MAGIC.search(head):
+            self.prefixes.add(head)
+        else:
+            self.globs.append(glob)
+
+    def compile(self):
+        if self.globs:
+            self.regex = re.compile("|".join(fnmatch.translate(g) for g in self.globs))
+
+    def matches(self, detail):
+        detail = os.path.normcase(detail)
+        return (detail in self.exact or self.prefixes.matches(detail)
+                or (self.regex is not None and self.regex.match(detail) is not None))
+
+
+class AllowRules:
+    """A permissions.allow list compiled for matching.
+
+    A pattern allows a call if it is the bare tool name, or is
+    ToolName(glob) and fnmatch matches the detail against glob (with ":*"
+    read as "*").  Patterns are grouped by tool name: bare tool names are a set,
+    and per tool the wildcard-free globs are a set, "prefix*" globs (the
+    ":*" patterns "Always Allow" adds) a prefix trie and the remaining globs
+    one combined regex — a lookup costs about the same for five patterns or
+    five hundred.
+    """
+
+    def __init__(self, allow_list):
+        self._tools = set()  # bare tool names: allow every call
+        self._rules = {}     # tool name -> _ToolRules of its ToolName(glob) patterns
+        for pattern in allow_list:
+            if not isinstance(pattern, str) or not pattern:
+                continue
+            name, paren, inner = pattern.partition("(")
+            if paren and inner.endswith(")"):
+                # Convert ":*" suffix to just "*" for fnmatch
+                self._rules.setdefault(name, _ToolRules()).add(inner[:-1].replace(":*", "*"))
+            else:
+                self._tools.add(pattern)
+        for rules in self._rules.values():
+            rules.compile()
+
+    def __bool__(self):
+        return bool(self._tools or self._rules)
+
+    def matches(self, tool_name, detail):
+        """True if any pattern allows detail for tool_name."""
+        if tool_name in self._tools:
+            return True
+        rules = self._rules.get(tool_name)
+        return rules is not None and rules.matches(detail)
+
+
+def _check_single_command(tool_name, command_str, rules):
+    """Check if a single (non-compound) command matches any allow pattern."""
+    command_str = command_str.strip()
+    if not command_str:
+        return True
+    # Build detail for this single command (first_line as detail)
+    first_line = command_str.split("\n")[0].strip()
+    if rules.matches(tool_name, first_line):
+        return True
+    # Also try matching with just the base command + subcommand
+    tokens = first_line.split()
+    if tokens:
+        base = os.path.basename(tokens[0])
+        if base:
+            sub = ""
+            for t in tokens[1:]:
+                if not t.startswith(("-", "/", ".")):
+                    sub = t
+                    break
+            # Try "base sub ..." and "base ..."
+            detail_with_sub = f"{base} {sub}" if sub else base
+            if rules.matches(tool_name, detail_with_sub) or rules.matches(tool_name, base):
+                return True
+    return False
+
+
+def settings_file_for(project_dir):
+    """The project's settings.local.json, where "Always Allow" adds patterns."""
+    if not project_dir:
+        return ""
+    return os.path.join(project_dir, ".claude", "settings.local.json")
+
+
+_EMPTY_RULES = AllowRules([])
+_compiled_rules = {}  # settings file -> (stat key, AllowRules)
+
+
+def load_rules(settings_file):
+    """The settings file's permissions.allow as AllowRules, compiled again only when the file changed."""
+    try:
+        st = os.stat(settings_file)
+    except (OSError, ValueError):
+        return _EMPTY_RULES
+    key = (st.st_mtime_ns, st.st_size, st.st_ino)
+    cached = _compiled_rules.get(settings_file)
+    if cached and cached[0] == key:
+        return cached[1]
+    try:
+        with open(settings_file) as f:
+            allow_list = json.load(f).get("permissions", {}).get("allow", [])
+    except (json.JSONDecodeError, IOError, AttributeError):
+        allow_list = []
+    rules = AllowRules(allow_list if isinstance(allow_list, list) else [])
+    _compiled_rules[settings_file] = (key, rules)
+    return rules
+
+
+def check_auto_allow(tool_name, detail, settings_file):
+    """Check if this tool call matches any pre-approved pattern in settings.local.json."""
+    rules = load_rules(settings_file)
+    if not rules:
+        return False
+
+    # For Bash commands, split compound commands and check each part
+    if tool_name in ("Bash", "mcp__acp__Bash"):
+        parts = re.split(r'\||\&\&|;', detail)
+        non_empty = [p for p in parts if p.strip()]
+        if non_empty and all(
+            _check_single_command(tool_name, p, rules)
+            for p in non_empty
+        ):
+            return True
+        return False
+
+    # Non-Bash tools: direct match
+    return rules.matches(tool_name, detail)
+
+
+# ── Smart auto-approve ──
+
+READONLY_COMMANDS = {
+    # File viewing
+    "cat", "head", "tail", "less", "more", "wc", "file", "stat", "du", "df",
+    # Directory listing
+    "ls", "tree", "find", "realpath", "dirname", "basename",
+    # Search
+    "grep", "rg", "ag", "fgrep", "egrep",
+    # Version/info
+    "echo", "printf", "date", "whoami", "hostname", "uname", "env", "printenv",
+    "which", "type", "command", "true", "false", "test",
+    # Package info (read-only)
+    "npm", "pip", "pip3", "cargo", "go", "python", "python3", "node", "ruby", "java", "javac",
+}
+
+READONLY_GIT_SUBCOMMANDS = {
+    "log", "diff", "status", "show", "branch", "tag", "remote", "stash",
+    "blame", "shortlog", "describe", "rev-parse", "rev-list", "ls-files",
+    "ls-tree", "cat-file", "config",
+}
+
+DANGEROUS_COMMANDS = {
+    "rm", "rmdir", "mv", "chmod", "chown", "chgrp", "mkfs", "dd",
+    "shutdown", "reboot", "kill", "killall", "pkill",
+    "curl", "wget",  # network access
+    "ssh", "scp", "rsync",  # remote access
+    "sudo", "su", "doas",  # privilege escalation
+}
+
+READONLY_TOOLS = {"Read", "Glob", "Grep", "mcp__acp__Read", "mcp__acp__Glob", "mcp__acp__Grep"}
+
+
+def _is_readonly_bash(command):
+    """Check if a Bash command (possibly compound) is read-only."""
+    parts = re.split(r'\||&&|\|\||;', command)
+    for part in parts:
+        part = part.strip()
+        if not part:
+            continue
+        first_line = part.split("\n")[0].strip()
+        tokens = first_line.split()
+        if not tokens:
+            continue
+        base = os.path.basename(tokens[0])
+        if not base:
+            continue
+        if base in DANGEROUS_COMMANDS:
+            return False
+        if base == "sed":
+            if "-i" in tokens or any(t.startswith("-i") for t in tokens[1:]):
+                return False
+            continue
+        if base in ("awk", "gawk", "mawk", "nawk"):
+            continue
+        if base == "git":
+            sub = ""
+            for t in tokens[1:]:
+                if not t.startswith("-"):
+                    sub = t
+                    break
+            if sub not in READONLY_GIT_SUBCOMMANDS:
+                return False
+            continue
+        if base in READONLY_COMMANDS:
+            continue
+        return False
+    return True
+
+
+def _is_project_file(file_path, project_dir):
+    """Check if a file path is within the project directory."""
+    if not file_path or not project_dir:
+        return False
+    try:
+        real_file = os.path.realpath(file_path)
+        real_cwd = os.path.realpath(project_dir)
+        return real_file.startswith(real_cwd + os.sep) or real_file == real_cwd
+    except (ValueError, OSError):
+        return False
+
+
+def check_smart_auto_approve(tool_name, tool_input, project_dir):
+    """Check if a tool call should be auto-approved by smart rules."""
+    if tool_name in READONLY_TOOLS:
+        return True
+    if tool_name in ("Bash", "mcp__acp__Bash"):
+        command = tool_input.get("command", "") if isinstance(tool_input, dict) else ""
+        if command and _is_readonly_bash(command):
+            return True
+    if tool_name in ("Write", "Edit", "mcp__acp__Write", "mcp__acp__Edit"):
+        file_path = tool_input.get("file_path", "") if isinstance(tool_input, dict) else ""
+        if _is_project_file(file_path, project_dir):
+            return True
+    return False
+
+
+def is_tmux_command(tool_name, tool_input):
+    """Tmux commands — the WebUI delivers prompts with tmux send-keys."""
+    if tool_name not in ("Bash", "mcp__acp__Bash"):
+        return False
+    tokens = tool_input.get("command", "").split()
+    return bool(tokens) and os.path.basename(tokens[0]) == "tmux"
+
+
+def evaluate(tool_name, tool_input, project_dir):
+    """Run tiers 1–3 for a tool call.
+
+    Returns {"decision": "allow" or "ask", "tier": "settings", "smart",
+    "tmux" or None} plus the REQUEST_FIELDS of the request to queue when
+    the user has to decide.
+    """
+    if not isinstance(tool_input, dict):
+        tool_input = {}
+    settings_file = settings_file_for(project_dir)
+    detail, detail_sub, allow_pattern, allow_patterns = build_detail(tool_name, tool_input)
+    if check_auto_allow(tool_name, detail, settings_file):
+        tier = "settings"
+    elif check_smart_auto_approve(tool_name, tool_input, project_dir):
+        tier = "smart"
+    elif is_tmux_command(tool_name, tool_input):
+        tier = "tmux"
+    else:
+        tier = None
+    return {
+        "decision": "allow" if tier else "ask",
+        "tier": tier,
+        "detail": detail,
+        "detail_sub": detail_sub,
+        "allow_pattern": allow_pattern,
+        "allow_patterns": allow_patterns,
+        "settings_file": settings_file,
+    }
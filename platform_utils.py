@@ -6,6 +6,7 @@ and path encoding. On Linux/macOS, uses /proc and standard POSIX tools.
 On Windows, uses ctypes Win32 API calls (no third-party dependencies).
 """
 
+import asyncio
 import os
 import subprocess
 import sys
@@ -397,23 +398,33 @@ def _is_terminal_alive_windows(terminal_id):
     return False
 
 
+def _tmux_list_panes_cmd(tmux_socket):
+    return ["tmux", "-S", tmux_socket.split(",")[0], "list-panes", "-a", "-F", "#{pane_id} #{pane_pid}"]
+
+
+def _pane_shell_pid(list_panes_output, terminal_id):
+    """Shell PID of a pane in `tmux list-panes -F '#{pane_id} #{pane_pid}'` output, or None."""
+    for line in list_panes_output.strip().splitlines():
+        parts = line.split(" ", 1)
+        if len(parts) == 2 and parts[0] == terminal_id:
+            return parts[1]
+    return None
+
+
+def _is_claude_comm(ps_output):
+    return os.path.basename(ps_output.strip()) in ("claude", "node")
+
+
 def _is_terminal_alive_tmux(terminal_id, tmux_socket):
     """Check if tmux pane exists and has a claude/node child."""
     if not tmux_socket:
         return False
-    socket_path = tmux_socket.split(",")[0]
     try:
         result = subprocess.run(
-            ["tmux", "-S", socket_path, "list-panes", "-a",
-             "-F", "#{pane_id} #{pane_pid}"],
+            _tmux_list_panes_cmd(tmux_socket),
             capture_output=True, text=True, timeout=3
         )
-        shell_pid = None
-        for line in result.stdout.strip().splitlines():
-            parts = line.split(" ", 1)
-            if len(parts) == 2 and parts[0] == terminal_id:
-                shell_pid = parts[1]
-                break
+        shell_pid = _pane_shell_pid(result.stdout, terminal_id)
         if not shell_pid:
             return False
         children = subprocess.run(
@@ -428,14 +439,48 @@ def _is_terminal_alive_tmux(terminal_id, tmux_socket):
                 ["ps", "-p", child_pid, "-o", "comm="],
                 capture_output=True, text=True, timeout=3
             )
-            comm = os.path.basename(ps_result.stdout.strip())
-            if comm in ("claude", "node"):
+            if _is_claude_comm(ps_result.stdout):
                 return True
     except Exception:
         pass
     return False
 
 
+async def _run_async(cmd, timeout=3):
+    """Run a command with asyncio subprocesses and return its stdout as text."""
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise
+    return stdout.decode(errors="replace")
+
+
+async def is_terminal_alive_async(terminal_id, tmux_socket=""):
+    """is_terminal_alive() for asyncio callers: tmux, pgrep and ps run as asyncio
+    subprocesses, the children's ps checks concurrently.  On Windows the check
+    uses no subprocesses and runs in a thread.
+    """
+    if not terminal_id:
+        return False
+    if IS_WINDOWS:
+        return await asyncio.to_thread(_is_terminal_alive_windows, terminal_id)
+    if not tmux_socket:
+        return False
+    try:
+        shell_pid = _pane_shell_pid(await _run_async(_tmux_list_panes_cmd(tmux_socket)), terminal_id)
+        if not shell_pid:
+            return False
+        child_pids = [p.strip() for p in (await _run_async(["pgrep", "-P", shell_pid])).splitlines() if p.strip()]
+        comms = await asyncio.gather(*(_run_async(["ps", "-p", pid, "-o", "comm="]) for pid in child_pids))
+        return any(_is_claude_comm(comm) for comm in comms)
+    except Exception:
+        return False
+
+
 # ── Prompt delivery ──
 
 def send_prompt(session_info, prompt_text):
@@ -10,23 +10,38 @@ Then open http://localhost:19836
 """
 
 import argparse
+import bisect
 import json
 import glob
+import gzip
+import hashlib
+import http.client
+import io
+import itertools
 import os
-import re
+import queue
 import signal
 import subprocess
 import sys
 import time
 import threading
+import urllib.error
 import urllib.request
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from socketserver import ThreadingMixIn
 from urllib.parse import parse_qs, urlparse
 import uuid
+import zlib
 import cgi
-
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from checkpoint import CheckpointStore
+import decision_socket
+from file_watcher import FileWatcher
+from http_pool import PooledHTTPServer, PooledRequestHandler
+from pending_index import PendingRequestIndex
+import permission_rules
 from frontend import HTML_PAGE
+from transcript import TranscriptState, INTERRUPT_PREFIX, find_turn_start, parse_jsonl_chunk, iter_jsonl_at
 from platform_utils import IS_WINDOWS, get_queue_dir, get_image_dir, is_process_alive, is_terminal_alive, find_claude_pid, get_process_children, get_process_name, encode_project_path, send_prompt, send_interrupt
 
 try:
@@ -39,6 +54,14 @@ except ImportError:
 QUEUE_DIR = get_queue_dir()
 IMAGE_DIR = get_image_dir()
 PORT = 19836
+TRANSCRIPT_WINDOW = 2000     # parsed entries kept in memory per session; older ones are paged in from disk
+# HTTP worker pools: name -> (workers, queue size).  "slow" serves requests that
+# may wait on a remote server, "stream" SSE streams and long-polls.
+HTTP_POOLS = {"fast": (8, 128), "slow": (8, 64), "stream": (64, 16)}
+KEEPALIVE_TIMEOUT = 30       # seconds an idle keep-alive connection is held open
+TAIL_LOAD_BYTES = 4 << 20    # transcripts larger than this are loaded tail-first (current turn only)
+STREAM_MIN_ENTRIES = 200     # transcript pages with a larger limit are streamed entry by entry
+STREAM_CHUNK_BYTES = 64 << 10  # chunk size of streamed bodies and relayed remote responses
 server_name = "local"
 # ── Federation ──
 remote_servers = []          # [{"name": str, "url": str}]
@@ -52,12 +75,20 @@ sessions = {}
 #     "cwd": str,
 #     "registered_at": float,
 #     "transcript_offset": int,
-#     "transcript_entries": list,  # parsed entries (kept for rendering)
+#     "transcript_pending": bytes,  # incomplete trailing line read past transcript_offset
+#     "transcript_seq_base": int,  # sequence number of byte 0 of the current transcript generation
+#     "transcript_entries": list,  # last TRANSCRIPT_WINDOW parsed entries, each tagged with "_seq"
+#     "transcript_index": array,   # file positions of all user/assistant lines (for paging older entries)
+#     "transcript_backfill": int,  # after a tail-first load: bytes before this position are not indexed yet
+#     "transcript_state": TranscriptState,  # incremental summary of the entries, fed by the parser
 #     "derived_state": str,        # idle|busy|permission_prompt|elicitation|plan_review
+#     "pending_request": dict,     # request data while in permission_prompt, else None
 #     "last_activity": float,
 #     "last_summary": str,         # brief summary of last assistant message
 #     "slug": str,                 # session slug from transcript (auto-generated name)
 #     "custom_title": str,         # user-set name via /rename in Claude Code (from transcript custom-title entry)
+#     "version": int,              # state_version of the session's last change (absent until it first changes)
+#     "snapshot_json": tuple,      # (version, {compact: bytes}): cached /api/sessions entries, see _session_json()
 # }
 
 sessions_lock = threading.Lock()
@@ -72,39 +103,455 @@ def _get_session_update_lock(sid):
             _session_update_locks[sid] = threading.Lock()
         return _session_update_locks[sid]
 
+
+def _new_session(transcript_path, terminal_id, tmux_socket, cwd):
+    """Build a fresh session registry record."""
+    now = time.time()
+    return {
+        "transcript_path": transcript_path,
+        "terminal_id": terminal_id,
+        "tmux_socket": tmux_socket,
+        "cwd": cwd,
+        "registered_at": now,
+        "transcript_offset": 0,
+        "transcript_seq_base": 0,
+        "transcript_pending": b"",
+        "transcript_entries": [],
+        "transcript_index": array("q"),
+        "transcript_backfill": 0,
+        "transcript_state": TranscriptState(),
+        "derived_state": "idle",
+        "pending_request": None,
+        "last_activity": now,
+        "last_summary": "",
+        "last_user_prompt": "",
+        "slug": "",
+        "custom_title": "",
+    }
+
+
+def _reset_transcript_locked(s):
+    """Drop parsed transcript data so it is re-read from offset 0. Caller holds sessions_lock.
+
+    The sequence base moves past the old cursor, so entries of the new
+    generation always sort after everything clients have already seen.
+    """
+    s["transcript_seq_base"] = _transcript_cursor(s) + 1
+    s["transcript_offset"] = 0
+    s["transcript_pending"] = b""
+    s["transcript_entries"] = []
+    s["transcript_index"] = array("q")
+    s["transcript_backfill"] = 0
+    s["transcript_state"] = TranscriptState()
+
+
+def _transcript_cursor(s):
+    """Sequence position just past the last parsed transcript entry.
+
+    Entry sequence numbers are their byte offset in the transcript plus
+    transcript_seq_base, so they are monotonic per session (even across
+    /clear and /compact), stable across re-reads of the same file, and every
+    entry parsed later has a seq >= the cursor.
+    """
+    return s.get("transcript_seq_base", 0) + s["transcript_offset"]
+
+
+def _select_transcript_page(s, after, before, limit):
+    """Pick the user/assistant entries a transcript request wants. Caller holds sessions_lock.
+
+    Returns (cached, missing, cursor, reset, has_more): cached are the wanted
+    entries still in the in-memory window, missing are the file positions of
+    older wanted entries that have to be paged in from disk (they all precede
+    cached), and has_more tells whether even older entries exist.
+
+    With before=<seq>, the `limit` entries preceding that seq are selected
+    (paging back through history).  Otherwise, with after=None, or when the
+    cursor no longer belongs to the current transcript generation (the file
+    was rewritten, or the server restarted), the last `limit` entries are
+    selected with reset=True and clients replace what they have; else only
+    entries with seq >= after are.
+    """
+    index = s.get("transcript_index") or array("q")
+    window = s["transcript_entries"]
+    cursor = _transcript_cursor(s)
+    base = s.get("transcript_seq_base", 0)
+    limit = max(limit, 0)
+    if before is not None:
+        reset = False
+        hi = bisect.bisect_left(index, before - base) if before > base else 0
+        lo = max(hi - limit, 0)
+    else:
+        reset = after is None or after < base or after > cursor
+        hi = len(index)
+        lo = 0 if reset else bisect.bisect_left(index, after - base)
+        if hi - lo > limit:
+            # Too many new entries to send in one page — client starts over from the tail
+            reset = True
+            lo = hi - limit
+    positions = index[lo:hi]
+    has_more = lo > 0 or bool(s.get("transcript_backfill"))
+    if not positions:
+        return [], [], cursor, reset, has_more
+    window_start = window[0]["_seq"] - base if window else s["transcript_offset"]
+    split = bisect.bisect_left(positions, window_start)
+    cached = []
+    if split < len(positions):
+        first, last = positions[split] + base, positions[-1] + base
+        cached = [e for e in window
+                  if e.get("type") in ("user", "assistant") and first <= e["_seq"] <= last]
+    return cached, positions[:split].tolist(), cursor, reset, has_more
+
+
+def _transcript_page(sid, after=None, before=None, limit=50, stream=False):
+    """Build the transcript API response for a session, or None if it is unknown.
+
+    Entries that fell out of the in-memory window are re-read from the JSONL
+    file via the session's offset index, outside of sessions_lock.  If the
+    page reaches back past a tail-first load, the history is indexed first.
+    With stream set, "entries" is an iterator that pages them in as it is
+    consumed instead of a list.
+    """
+    for attempt in range(2):
+        with sessions_lock:
+            s = sessions.get(sid)
+            if not s:
+                return None
+            cached, missing, cursor, reset, has_more = _select_transcript_page(s, after, before, limit)
+            path = s["transcript_path"]
+            base = s.get("transcript_seq_base", 0)
+            wants_history = ((reset or before is not None) and s.get("transcript_backfill")
+                             and len(cached) + len(missing) < limit)
+        if attempt or not wants_history:
+            break
+        _backfill_transcript_index(sid)
+
+    def paged_in():
+        if not missing:
+            return
+        try:
+            for pos, entry in iter_jsonl_at(path, missing):
+                entry["_seq"] = base + pos
+                yield entry
+        except OSError as e:
+            print(f"[!] Failed to page in transcript {path}: {e}")
+
+    entries = itertools.chain(paged_in(), cached) if stream else [*paged_in(), *cached]
+    return {"entries": entries, "cursor": cursor, "reset": reset, "has_more": has_more}
+
+
+_backfill_lock = threading.Lock()
+
+
+def _backfill_transcript_index(sid):
+    """Index the history that a tail-first load skipped (user/assistant positions, slug, title).
+
+    Reads the file up to transcript_backfill outside of sessions_lock, and
+    only merges the result if the transcript wasn't reset in the meantime.
+    """
+    with _backfill_lock:
+        with sessions_lock:
+            s = sessions.get(sid)
+            if not s or not s.get("transcript_backfill"):
+                return
+            path = s["transcript_path"]
+            end = s["transcript_backfill"]
+            base = s.get("transcript_seq_base", 0)
+
+        positions = array("q")
+        slug = custom_title = ""
+        try:
+            with open(path, "rb") as f:
+                pos = 0
+                pending = b""
+                while pos < end:
+                    chunk = f.read(min(1 << 20, end - pos))
+                    if not chunk:
+                        break
+                    pos += len(chunk)
+                    data = pending + chunk
+                    data_start = pos - len(data)
+                    parsed, consumed = parse_jsonl_chunk(data)
+                    for line_start, e in parsed:
+                        if e.get("type") in ("user", "assistant"):
+                            positions.append(data_start + line_start)
+                        if e.get("slug") and not slug:
+                            slug = e["slug"]
+                        if e.get("type") == "custom-title" and e.get("customTitle"):
+                            custom_title = e["customTitle"]
+                    pending = data[consumed:]
+        except OSError as e:
+            print(f"[!] Transcript backfill failed for {sid}: {e}")
+            return
+
+        with sessions_lock:
+            s = sessions.get(sid)
+            if not s or s.get("transcript_seq_base", 0) != base or s.get("transcript_backfill") != end:
+                return
+            positions.extend(s.get("transcript_index", array("q")))
+            s["transcript_index"] = positions
+            s["transcript_backfill"] = 0
+            # The tail's values are newer — history only fills in what it lacks
+            named = (slug and not s.get("slug")) or (custom_title and not s.get("custom_title"))
+            if slug and not s.get("slug"):
+                s["slug"] = slug
+            if custom_title and not s.get("custom_title"):
+                s["custom_title"] = custom_title
+            if named:
+                s["version"] = bump_state_version()
+
+
+def transcript_backfill_loop():
+    """Background thread: index the history of tail-first loaded transcripts."""
+    while True:
+        time.sleep(2)
+        with sessions_lock:
+            sids = [sid for sid, s in sessions.items() if s.get("transcript_backfill")]
+        for sid in sids:
+            try:
+                _backfill_transcript_index(sid)
+            except Exception as e:
+                print(f"[!] Transcript backfill error for {sid}: {e}")
+
+
+# ── Checkpoints ──
+# Parsing progress is persisted so a restarted server only parses what was
+# appended since (see checkpoint.py).
+
+checkpoint_store = None
+_checkpointed = {}  # transcript_path -> signature of the last saved checkpoint
+
+
+def _checkpoint_signature(s):
+    return (s.get("transcript_seq_base", 0), s["transcript_offset"], s.get("transcript_backfill", 0),
+            s.get("slug", ""), s.get("custom_title", ""))
+
+
+def _apply_checkpoint_locked(s, cp, offset, seq_base):
+    """Restore a session's parsing progress from a checkpoint. Caller holds sessions_lock.
+
+    Returns False (and changes nothing) if the session moved on since it was
+    sampled at (offset, seq_base).
+    """
+    if s["transcript_offset"] != offset or s.get("transcript_seq_base", 0) != seq_base:
+        return False
+    index = array("q")
+    index.frombytes(cp["index"])
+    s["transcript_offset"] = cp["offset"]
+    s["transcript_seq_base"] = cp["seq_base"]
+    s["transcript_pending"] = b""
+    s["transcript_backfill"] = cp["backfill"]
+    s["transcript_index"] = index
+    s["transcript_state"] = TranscriptState.from_dict(cp["state"])
+    s["slug"] = s.get("slug") or cp["slug"]
+    s["custom_title"] = s.get("custom_title") or cp["custom_title"]
+    _checkpointed[s["transcript_path"]] = _checkpoint_signature(s)
+    return True
+
+
+def save_checkpoints():
+    """Persist the parsing progress of every session that advanced since the last save."""
+    if not checkpoint_store:
+        return
+    records = []
+    with sessions_lock:
+        for s in sessions.values():
+            path = s.get("transcript_path")
+            if not path or not s["transcript_offset"] or s.get("transcript_state") is None:
+                continue
+            sig = _checkpoint_signature(s)
+            if _checkpointed.get(path) == sig:
+                continue
+            records.append((path, sig, s["transcript_state"].to_dict(),
+                            s.get("transcript_index", array("q")).tobytes()))
+    for path, sig, state, index in records:
+        seq_base, offset, backfill, slug, custom_title = sig
+        try:
+            if checkpoint_store.save(path, offset, seq_base, backfill, state, index, slug, custom_title):
+                _checkpointed[path] = sig
+        except Exception as e:
+            print(f"[!] Checkpoint save failed for {path}: {e}")
+
+
+def checkpoint_loop():
+    """Background thread: save transcript checkpoints every 5s."""
+    while True:
+        time.sleep(5)
+        save_checkpoints()
+
+
+def start_checkpoints():
+    global checkpoint_store
+    checkpoint_store = CheckpointStore(os.path.join(QUEUE_DIR, "checkpoints.sqlite3"))
+    with sessions_lock:
+        keep = {s["transcript_path"] for s in sessions.values() if s.get("transcript_path")}
+    checkpoint_store.prune(keep)
+    threading.Thread(target=checkpoint_loop, daemon=True).start()
+
+
 # Session-level auto-allow rules: { (session_id, tool_name): True }
 # These are volatile (in-memory only, cleared on session end/clear/server restart).
-# The hook queries these via GET /api/check-auto-allow.
-# For persistent rules, see settings.local.json (checked directly by the hook).
+# evaluate_permission() checks these after the rules of permission_rules.py
+# (older hooks query GET /api/check-auto-allow).
+# For persistent rules, see settings.local.json.
 session_auto_allow = {}
 
 
-def proxy_to_remote(remote_url, path, method="GET", body=None, headers=None):
-    """Forward a request to a remote WebUI server."""
+def evaluate_permission(tool_name, tool_input, project_dir, sid):
+    """Auto-allow tiers 1–4 for a tool call: permission_rules.evaluate(), then the session rules."""
+    verdict = permission_rules.evaluate(tool_name, tool_input, project_dir)
+    if verdict["decision"] != "allow" and (str(sid), tool_name) in session_auto_allow:
+        verdict.update(decision="allow", tier="session")
+    return verdict
+
+
+def open_remote(remote_url, path, method="GET", body=None, headers=None):
+    """Send a request to a remote WebUI server and return the open response.
+
+    The caller reads (e.g. relays it in chunks) and closes it.  Non-2xx
+    answers, a 304 included, raise urllib.error.HTTPError.
+    """
     url = remote_url.rstrip("/") + path
     req = urllib.request.Request(url, data=body, method=method)
     req.add_header("Content-Type", "application/json")
     if headers:
         for k, v in headers.items():
             req.add_header(k, v)
-    resp = urllib.request.urlopen(req, timeout=5)
-    return resp.status, resp.read(), resp.headers.get("Content-Type", "application/json")
+    return urllib.request.urlopen(req, timeout=5)
 
 
-def fetch_remote_sessions():
-    """Fetch sessions from all remote servers. Returns list of (remote_config, sessions_or_None)."""
-    results = []
-    for remote in remote_servers:
+def proxy_to_remote(remote_url, path, method="GET", body=None, headers=None, with_etag=False):
+    """Forward a request to a remote WebUI server.
+
+    Returns (status, body, content_type), plus the response ETag if with_etag
+    is set.  A 304 from the remote raises urllib.error.HTTPError like any
+    other non-2xx answer.
+    """
+    with open_remote(remote_url, path, method, body, headers) as resp:
+        result = (resp.status, resp.read(), resp.headers.get("Content-Type", "application/json"))
+        if with_etag:
+            result += (resp.headers.get("ETag"),)
+    return result
+
+
+# (remote_url, path) -> (etag, body) of the last 200 response, revalidated with If-None-Match
+_remote_cache = {}
+
+
+def fetch_remote_json(remote_url, path, timeout=3):
+    """GET JSON from a remote WebUI server, reusing the cached body when it answers 304.
+
+    Returns (data, etag).  A fresh copy is parsed every time, so callers may
+    mutate the result.
+    """
+    key = (remote_url, path)
+    cached = _remote_cache.get(key)
+    req = urllib.request.Request(remote_url.rstrip("/") + path)
+    if cached and cached[0]:
+        req.add_header("If-None-Match", cached[0])
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            etag, body = resp.headers.get("ETag"), resp.read()
+    except urllib.error.HTTPError as e:
+        if e.code != 304 or not cached:
+            raise
+        etag, body = cached
+    else:
+        _remote_cache[key] = (etag, body)
+    return json.loads(body), etag
+
+
+REMOTE_WAIT = 25  # seconds a follower's long-poll blocks on a peer
+
+# remote url -> (sessions response body, etag), kept current by remote_follow_loop
+_remote_sessions = {}
+
+
+def remote_follow_loop(remote):
+    """Background thread: long-poll a peer's /api/sessions and keep its answer in _remote_sessions.
+
+    A change of the peer's sessions bumps state_version, so local long-polls
+    and ETags follow peers without polling them per request.  Peers that
+    don't support ?wait= (no "version" in the answer) are re-polled every second.
+    """
+    url = remote["url"]
+    version = None
+    while True:
+        path = "/api/sessions" if version is None else f"/api/sessions?wait={version}&timeout={REMOTE_WAIT}"
         try:
-            url = remote["url"].rstrip("/") + "/api/sessions"
-            req = urllib.request.Request(url)
-            resp = urllib.request.urlopen(req, timeout=3)
-            data = json.loads(resp.read())
-            results.append((remote, data.get("sessions", [])))
-        except Exception as e:
-            print(f"[!] Federation: {remote['name']} unreachable: {e}")
-            results.append((remote, None))
-    return results
+            with urllib.request.urlopen(url.rstrip("/") + path, timeout=REMOTE_WAIT + 10) as resp:
+                etag, body = resp.headers.get("ETag"), resp.read()
+            data = json.loads(body)
+        except Exception:
+            # fetch_remote_sessions queries the peer directly (and reports it) meanwhile
+            _remote_sessions.pop(url, None)
+            version = None
+            time.sleep(5)
+            continue
+        previous = _remote_sessions.get(url)
+        _remote_sessions[url] = (body, etag)
+        if previous is None or json.loads(previous[0]).get("sessions") != data.get("sessions"):
+            bump_state_version()
+        version = data.get("version")
+        if version is None:
+            time.sleep(1)
+
+
+def start_remote_followers():
+    for remote in remote_servers:
+        threading.Thread(target=remote_follow_loop, args=(remote,), daemon=True).start()
+
+
+# Remotes are queried in parallel, so one unreachable peer costs its timeout once, not per peer
+_remote_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="federation")
+
+
+def _fetch_remote_sessions_one(remote):
+    followed = _remote_sessions.get(remote["url"])
+    if followed:
+        return remote, json.loads(followed[0]).get("sessions", []), followed[1]
+    try:
+        data, etag = fetch_remote_json(remote["url"], "/api/sessions")
+        return remote, data.get("sessions", []), etag
+    except Exception as e:
+        print(f"[!] Federation: {remote['name']} unreachable: {e}")
+        return remote, None, None
+
+
+def fetch_remote_sessions():
+    """Fetch sessions from all remote servers. Returns list of (remote_config, sessions_or_None, etag)."""
+    return list(_remote_executor.map(_fetch_remote_sessions_one, remote_servers))
+
+
+def _fetch_remote_pending_one(remote):
+    try:
+        data, etag = fetch_remote_json(remote["url"], "/api/pending")
+        return remote, data.get("requests", []), etag
+    except Exception:
+        return remote, None, None
+
+
+def fetch_remote_pending():
+    """Fetch pending requests from all remote servers. Returns list of (remote_config, requests_or_None, etag)."""
+    return list(_remote_executor.map(_fetch_remote_pending_one, remote_servers))
+
+
+def forward_respond_batch(remote_url, items):
+    """POST a /api/respond-batch sub-batch to the peer owning its sessions.
+
+    Returns the peer's per-item results, or a failed result per item if the
+    peer can't be reached.
+    """
+    proxy_items = [{k: v for k, v in item.items() if k != "session_id"} for item in items]
+    try:
+        _, resp_body, _ = proxy_to_remote(remote_url, "/api/respond-batch", method="POST",
+                                          body=json.dumps({"items": proxy_items}).encode())
+        results = json.loads(resp_body).get("results", [])
+        if len(results) == len(items):
+            return results
+        error = "Remote answered with the wrong number of results"
+    except Exception as e:
+        error = f"Remote proxy failed: {e}"
+    return [{"id": item.get("id", ""), "ok": False, "error": error} for item in items]
 
 
 def _get_remote_url_for_session(session_id):
@@ -139,13 +586,25 @@ def _update_session_state_locked(sid):
         if not s:
             return
         path = s["transcript_path"]
-        offset = s["transcript_offset"]
+        offset = start_offset = s["transcript_offset"]
+        seq_base = s.get("transcript_seq_base", 0)
+        pending = s.get("transcript_pending", b"")
+        cold = offset == 0 and not pending and not s["transcript_entries"]
 
     if not path or not os.path.isfile(path):
         with sessions_lock:
             s = sessions.get(sid)
-            if s:
-                s["derived_state"] = "idle"
+            if not s:
+                return
+            before = _event_signature(s)
+            s["derived_state"] = "idle"
+            s["pending_request"] = None
+            changed = None
+            if _event_signature(s) != before:
+                s["version"] = bump_state_version()
+                changed = _session_snapshot(sid, s)
+        if changed:
+            publish_event("state_changed", changed)
         return
 
     try:
@@ -155,14 +614,32 @@ def _update_session_state_locked(sid):
             # also reset, but this closes the race window before it arrives).
             f.seek(0, 2)  # seek to end
             file_size = f.tell()
-            if offset > file_size:
+            if offset + len(pending) > file_size:
                 offset = 0
+                pending = b""
                 with sessions_lock:
                     s = sessions.get(sid)
                     if s:
-                        s["transcript_offset"] = 0
-                        s["transcript_entries"] = []
-            f.seek(offset)
+                        _reset_transcript_locked(s)
+                        seq_base = s["transcript_seq_base"]
+                        start_offset = 0
+                        cold = True
+            if cold and checkpoint_store:
+                # Restarted server: resume from where the previous process stopped parsing
+                cp = checkpoint_store.load(path, f)
+                if cp:
+                    with sessions_lock:
+                        s = sessions.get(sid)
+                        if s and _apply_checkpoint_locked(s, cp, start_offset, seq_base):
+                            offset = start_offset = cp["offset"]
+                            seq_base = cp["seq_base"]
+                            cold = False
+            if cold and file_size > TAIL_LOAD_BYTES:
+                # Cold start on a big transcript: only parse the current turn now,
+                # the history before it is indexed later by the backfill thread
+                offset = find_turn_start(f, file_size)
+            # The incomplete line left over from the last read is already in memory
+            f.seek(offset + len(pending))
             new_data = f.read()
     except IOError:
         # On Windows, mandatory file locking can cause IOError when Claude Code
@@ -170,36 +647,40 @@ def _update_session_state_locked(sid):
         # here — it blocks the single-threaded HTTP server.
         new_data = b""
 
+    appended_cursor = None
     if new_data:
-        text = new_data.decode("utf-8", errors="replace")
-        lines = text.split("\n")
+        data = pending + new_data if pending else new_data
+        parsed, bytes_consumed = parse_jsonl_chunk(data)
         new_entries = []
-        bytes_consumed = 0
-
-        for i, line in enumerate(lines):
-            # +1 for the \n delimiter, but the last element from split() has no trailing \n
-            nl = 1 if i < len(lines) - 1 else 0
-            if not line.strip():
-                bytes_consumed += len(line.encode("utf-8")) + nl
-                continue
-            try:
-                entry = json.loads(line)
-                new_entries.append(entry)
-                bytes_consumed += len(line.encode("utf-8")) + nl
-            except (json.JSONDecodeError, ValueError):
-                if i == len(lines) - 1:
-                    # Last line may be incomplete (still being written) — stop here
-                    break
-                # Mid-file bad line — skip it
-                bytes_consumed += len(line.encode("utf-8")) + nl
+        new_positions = array("q")
+        for line_start, entry in parsed:
+            # Sequence number = position of the line in this transcript generation
+            entry["_seq"] = seq_base + offset + line_start
+            new_entries.append(entry)
+            if entry.get("type") in ("user", "assistant"):
+                new_positions.append(offset + line_start)
 
-        if new_entries:
-            with sessions_lock:
-                s = sessions.get(sid)
-                if not s:
-                    return
-                s["transcript_offset"] = offset + bytes_consumed
-                s["transcript_entries"].extend(new_entries)
+        with sessions_lock:
+            s = sessions.get(sid)
+            if not s:
+                return
+            if s["transcript_offset"] != start_offset or s.get("transcript_seq_base", 0) != seq_base:
+                # Transcript was reset (resume/clear) while we were reading — drop this chunk
+                return
+            if offset != start_offset:
+                s["transcript_backfill"] = offset
+            s["transcript_offset"] = offset + bytes_consumed
+            s["transcript_pending"] = data[bytes_consumed:]
+            if new_entries:
+                ts = _get_transcript_state(s)
+                ts.feed_all(new_entries)
+                entries = s["transcript_entries"]
+                entries.extend(new_entries)
+                # Only the tail stays in memory — state derivation never looks further back
+                if len(entries) > TRANSCRIPT_WINDOW:
+                    del entries[:len(entries) - TRANSCRIPT_WINDOW]
+                s.setdefault("transcript_index", array("q")).extend(new_positions)
+                appended_cursor = _transcript_cursor(s)
                 s["last_activity"] = time.time()
                 # Extract slug (first seen) and custom title (latest /rename)
                 for e in new_entries:
@@ -213,152 +694,69 @@ def _update_session_state_locked(sid):
         s = sessions.get(sid)
         if not s:
             return
+        before = _event_signature(s)
         s["derived_state"], s["last_summary"], s["last_user_prompt"] = _derive_state(sid, s)
-
-
-def _extract_user_text(entry):
-    """Extract meaningful user text from a transcript entry, stripping system/command tags.
-
-    Returns empty string for local commands (/context, /help etc.) that don't need a response.
+        s["pending_request"] = _find_pending_request(sid) if s["derived_state"] == "permission_prompt" else None
+        after = _event_signature(s)
+        if after != before or appended_cursor is not None:
+            s["version"] = bump_state_version()
+        changed = _session_snapshot(sid, s) if after != before else None
+        new_request = s["pending_request"] if after[3] and after[3] != before[3] else None
+
+    if appended_cursor is not None:
+        publish_event("transcript_appended", {"session_id": sid, "cursor": appended_cursor})
+    if changed:
+        publish_event("state_changed", changed)
+    if new_request:
+        publish_event("pending_request", {"session_id": sid, "request": new_request})
+
+
+def _get_transcript_state(s):
+    """Return the session's incremental TranscriptState, building it if missing.
+
+    Sessions created by the parser always carry one; this covers records whose
+    transcript_entries were populated some other way.
     """
-    msg = entry.get("message", {})
-    content = msg.get("content", "")
-    if isinstance(content, str):
-        text = content
-    elif isinstance(content, list):
-        parts = []
-        for c in content:
-            if isinstance(c, dict):
-                if c.get("type") == "text":
-                    parts.append(c.get("text", ""))
-                elif c.get("type") == "tool_result":
-                    return ""  # tool_results are not user prompts
-            elif isinstance(c, str):
-                parts.append(c)
-        text = " ".join(parts)
-    else:
-        return ""
-    # Strip known system/command XML tags
-    for tag in ("system-reminder", "local-command-caveat", "local-command-stdout",
-                "task-notification", "command-name", "command-message", "command-args"):
-        text = re.sub(rf"<{tag}>.*?</{tag}>", "", text, flags=re.DOTALL)
-    text = re.sub(r"<[^>]+>", "", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+    ts = s.get("transcript_state")
+    if ts is None:
+        ts = TranscriptState.from_entries(s["transcript_entries"])
+        s["transcript_state"] = ts
+    return ts
 
 
 def _derive_state(sid, s):
-    """Derive session state from transcript entries + pending request files."""
-    entries = s["transcript_entries"]
-    summary = s.get("last_summary", "")
-    user_prompt = s.get("last_user_prompt", "")
-
-    # Find last meaningful entries (skip file-history-snapshot, queue-operation)
-    last_assistant = None
-    last_user = None
-    for entry in reversed(entries):
-        etype = entry.get("type", "")
-        if etype == "assistant" and last_assistant is None:
-            last_assistant = entry
-        elif etype == "user" and last_user is None:
-            last_user = entry
-        if last_assistant and last_user:
-            break
-
-    # Extract last user prompt text (skip tool_results and system-injected messages)
-    for entry in reversed(entries):
-        if entry.get("type") != "user":
-            continue
-        msg = entry.get("message", {})
-        content = msg.get("content", "")
-        text = ""
-        if isinstance(content, str):
-            text = content
-        elif isinstance(content, list):
-            parts = []
-            for c in content:
-                if isinstance(c, dict) and c.get("type") == "text":
-                    parts.append(c.get("text", ""))
-                elif isinstance(c, str):
-                    parts.append(c)
-            text = " ".join(parts)
-        if not text.strip():
-            continue
-        # Strip XML tags and their content for known system tags
-        clean = re.sub(r"<system-reminder>.*?</system-reminder>", "", text, flags=re.DOTALL)
-        clean = re.sub(r"<local-command-caveat>.*?</local-command-caveat>", "", clean, flags=re.DOTALL)
-        clean = re.sub(r"<local-command-stdout>.*?</local-command-stdout>", "", clean, flags=re.DOTALL)
-        clean = re.sub(r"<task-notification>.*?</task-notification>", "", clean, flags=re.DOTALL)
-        clean = re.sub(r"<command-name>.*?</command-name>", "", clean, flags=re.DOTALL)
-        clean = re.sub(r"<command-message>.*?</command-message>", "", clean, flags=re.DOTALL)
-        clean = re.sub(r"<command-args>.*?</command-args>", "", clean, flags=re.DOTALL)
-        # Strip any remaining XML tags
-        clean = re.sub(r"<[^>]+>", "", clean)
-        # Collapse runs of spaces/tabs (preserve newlines)
-        clean = re.sub(r"[^\S\n]+", " ", clean)
-        # Collapse 3+ newlines into 2
-        clean = re.sub(r"\n{3,}", "\n\n", clean)
-        clean = clean.strip()
-        if clean:
-            user_prompt = clean
-            break
+    """Derive session state from the incremental transcript state + pending request files."""
+    ts = _get_transcript_state(s)
+    user_prompt = ts.user_prompt
 
     # Check if the last user message is after the last assistant message.
     # When true, the assistant's summary is stale (from a previous turn).
-    user_after_assistant = False
-    if last_user and last_assistant:
-        for i, entry in enumerate(entries):
-            if entry is last_user:
-                user_idx = i
-            if entry is last_assistant:
-                asst_idx = i
-        if user_idx > asst_idx:
-            # Check if the last user message is a local command (e.g. /context, /help)
-            # that doesn't require a response from Claude.  These contain
-            # <local-command-caveat> or <command-name> tags and have no real user text
-            # after stripping those tags.
-            last_user_text = _extract_user_text(last_user)
-            if last_user_text:
-                # Ctrl-C interrupt produces "[Request interrupted by user]" — treat as idle
-                if last_user_text.strip().startswith('[Request interrupted by user'):
-                    return "idle", "", ""
-                user_after_assistant = True
-
-    # Invariant: summary is only shown when it follows the displayed user_prompt
-    if user_after_assistant:
+    # Local commands (e.g. /context, /help) don't require a response from
+    # Claude: they contain <local-command-caveat> or <command-name> tags and
+    # have no real user text after stripping those tags.
+    if ts.user_after_assistant() and ts.last_user_text:
+        # Ctrl-C interrupt produces "[Request interrupted by user]" — treat as idle
+        if ts.last_user_text.startswith(INTERRUPT_PREFIX):
+            return "idle", "", ""
+        # Invariant: summary is only shown when it follows the displayed user_prompt
         return "busy", "", user_prompt
 
     # Extract info from last assistant message
-    if last_assistant:
-        msg = last_assistant.get("message", {})
-        content = msg.get("content", [])
-        stop_reason = msg.get("stop_reason", "")
-
-        # Get tool_use blocks
-        tool_uses = [c for c in content if isinstance(c, dict) and c.get("type") == "tool_use"]
-
-        # Extract summary from text content
-        for c in content:
-            if isinstance(c, dict) and c.get("type") == "text":
-                text = c.get("text", "")
-                if text:
-                    summary = text
+    if ts.last_assistant_pos is not None:
+        summary = ts.summary
+        tool_uses = ts.last_tool_uses
 
         # Check for pending permission request
         pending_request = _find_pending_request(sid)
         if pending_request:
             # Check if the tool_use has already been resolved in transcript
-            req_tool = pending_request.get("tool_name", "")
-            req_input = pending_request.get("tool_input", {})
-            if _tool_use_resolved_in_transcript(entries, req_tool, req_input):
-                req_id = pending_request.get("id", "")
-                _cleanup_stale_request(req_id)
+            if ts.tool_use_resolved(pending_request.get("tool_name", "")):
+                _cleanup_stale_request(pending_request.get("id", ""))
             else:
                 return "permission_prompt", summary, user_prompt
 
         if tool_uses:
-            last_tool = tool_uses[-1]
-            tool_name = last_tool.get("name", "")
+            tool_id, tool_name = tool_uses[-1]
 
             if tool_name == "AskUserQuestion":
                 return "elicitation", summary, user_prompt
@@ -366,109 +764,62 @@ def _derive_state(sid, s):
                 return "plan_review", summary, user_prompt
 
             # Has unresolved tool_use — check if there's a matching tool_result
-            tool_id = last_tool.get("id", "")
-            if not _has_tool_result(entries, tool_id):
+            if not ts.is_resolved(tool_id):
                 return "busy", summary, user_prompt
             # Last tool_use is resolved — fall through to idle
 
-        if stop_reason == "end_turn" or not tool_uses or _all_tool_uses_resolved(entries, tool_uses):
+        if (ts.last_stop_reason == "end_turn" or not tool_uses
+                or all(ts.is_resolved(tid) for tid, _ in tool_uses)):
             return "idle", summary, user_prompt
 
     # No assistant message yet — idle if no meaningful user input
     # (e.g. session just started, or after /clear which only has system XML)
-    if not last_assistant and not user_prompt:
+    if ts.last_assistant_pos is None and not user_prompt:
         return "idle", "", ""
     return "busy", "", user_prompt
 
 
-def _find_pending_request(sid):
-    """Find a pending .request.json for this session (no .response.json yet)."""
-    for path in glob.glob(os.path.join(QUEUE_DIR, "*.request.json")):
-        resp_path = path.replace(".request.json", ".response.json")
-        if os.path.exists(resp_path):
-            continue
-        try:
-            with open(path) as f:
-                data = json.load(f)
-            if str(data.get("session_id", "")) != str(sid):
-                continue
-            # Check if the hook process that wrote this request is still alive.
-            # If it's dead (SIGKILL, OOM, etc.), atexit cleanup didn't fire and
-            # the file is orphaned — no process is waiting for the response.
-            hook_pid = data.get("pid")
-            if hook_pid:
-                try:
-                    if not is_process_alive(int(hook_pid)):
-                        try:
-                            os.remove(path)
-                        except OSError:
-                            pass
-                        continue
-                except (ValueError, TypeError):
-                    pass
-            return data
-        except (json.JSONDecodeError, IOError):
-            continue
-    return None
-
+_pending_index = None
 
-def _tool_use_resolved_in_transcript(entries, tool_name, tool_input):
-    """Check if the most recent tool_use matching this request has a tool_result."""
-    # Walk backwards — only check the LAST tool_use with this name
-    for i in range(len(entries) - 1, -1, -1):
-        entry = entries[i]
-        if entry.get("type") != "assistant":
-            continue
-        msg = entry.get("message", {})
-        content = msg.get("content", [])
-        for c in content:
-            if not isinstance(c, dict) or c.get("type") != "tool_use":
-                continue
-            if c.get("name") != tool_name:
-                continue
-            tool_id = c.get("id", "")
-            # Only check the most recent matching tool_use — don't continue to older ones
-            return _has_tool_result(entries[i:], tool_id)
-    return False
 
+def pending_index():
+    """The PendingRequestIndex of QUEUE_DIR.
 
-def _has_tool_result(entries, tool_id):
-    """Check if any user entry has a tool_result matching this tool_use_id."""
-    for entry in entries:
-        if entry.get("type") != "user":
-            continue
-        msg = entry.get("message", {})
-        content = msg.get("content", [])
-        for c in content:
-            if isinstance(c, dict) and c.get("type") == "tool_result":
-                if c.get("tool_use_id") == tool_id:
-                    return True
-    return False
+    The transcript watcher keeps it current from queue dir events; without
+    the watcher every lookup reconciles it first (a directory scan, parsing
+    only changed files).
+    """
+    global _pending_index
+    index = _pending_index
+    if index is None or index.queue_dir != QUEUE_DIR:
+        index = _pending_index = PendingRequestIndex(QUEUE_DIR)
+        index.reconcile()
+    elif not _transcript_watcher_running():
+        index.reconcile()
+    return index
 
 
-def _all_tool_uses_resolved(entries, tool_uses):
-    """Check if all tool_use blocks have matching tool_results."""
-    if not tool_uses:
-        return True
-    return all(_has_tool_result(entries, tu.get("id", "")) for tu in tool_uses)
+def _find_pending_request(sid):
+    """Find a pending .request.json for this session (no .response.json yet)."""
+    return pending_index().pending_for_session(sid)
 
 
 def _cleanup_stale_request(request_id):
     """Remove stale request/response files."""
     if not request_id:
         return
-    for suffix in (".request.json", ".response.json"):
-        path = os.path.join(QUEUE_DIR, f"{request_id}{suffix}")
-        try:
-            os.remove(path)
-        except OSError:
-            pass
+    pending_index().remove(request_id)
 
 
 # ── Zombie session cleanup ──
 
-def _is_session_alive(sid, session_data):
-    """Check if a session is still active."""
+def _is_session_alive(sid, session_data, terminal_alive=None):
+    """Check if a session is still active.
+
+    terminal_alive is the result of is_terminal_alive() for the session's
+    terminal, if the caller already has it (the asyncio engine checks it with
+    asyncio subprocesses).
+    """
     # Quick path: if session_id is a numeric PID and it's alive, session is definitely alive
     try:
         if is_process_alive(int(sid)):
@@ -479,7 +830,9 @@ def _is_session_alive(sid, session_data):
     terminal_id = session_data.get("terminal_id", "")
     tmux_socket = session_data.get("tmux_socket", "")
 
-    if is_terminal_alive(terminal_id, tmux_socket):
+    if terminal_alive is None:
+        terminal_alive = is_terminal_alive(terminal_id, tmux_socket)
+    if terminal_alive:
         return True
 
     # Fallback for sessions without terminal_id (auto-discovered on Windows)
@@ -500,40 +853,609 @@ def _is_session_alive(sid, session_data):
     return False
 
 
+ZOMBIE_CHECK_INTERVAL = 30
+
+
+def remove_zombie_sessions(dead):
+    """Drop sessions found dead (unless re-registered meanwhile) and announce it."""
+    removed = []
+    with sessions_lock:
+        for sid, checked in dead:
+            if sessions.get(sid) is not checked:
+                continue
+            del sessions[sid]
+            removed.append(sid)
+            # Clear auto-allow rules
+            keys_to_remove = [k for k in session_auto_allow if k[0] == sid]
+            for k in keys_to_remove:
+                del session_auto_allow[k]
+        if removed:
+            bump_state_version()
+    if removed:
+        print(f"[~] Cleaned up {len(removed)} zombie session(s): {removed}")
+        _publish_sessions_removed(removed)
+
+
+def discover_sessions():
+    # On Windows, periodically scan for new sessions from transcript files.
+    # This is the fallback for when the SessionStart hook fails to register
+    # (e.g., Ctrl-C sends CTRL_C_EVENT to all console processes including
+    # the hook subprocess, killing it before the POST completes).
+    if IS_WINDOWS:
+        try:
+            _restore_sessions_from_terminal_mappings()
+        except Exception:
+            pass
+
+
 def zombie_cleanup_loop():
     """Background thread: remove dead sessions and discover new ones every 30s."""
     while True:
-        time.sleep(30)
-        dead = []
+        time.sleep(ZOMBIE_CHECK_INTERVAL)
+        # Liveness checks run subprocesses — don't hold sessions_lock meanwhile
         with sessions_lock:
-            for sid in list(sessions.keys()):
-                if not _is_session_alive(sid, sessions[sid]):
-                    dead.append(sid)
-            for sid in dead:
-                del sessions[sid]
-                # Clear auto-allow rules
-                keys_to_remove = [k for k in session_auto_allow if k[0] == sid]
-                for k in keys_to_remove:
-                    del session_auto_allow[k]
-        if dead:
-            print(f"[~] Cleaned up {len(dead)} zombie session(s): {dead}")
-
-        # On Windows, periodically scan for new sessions from transcript files.
-        # This is the fallback for when the SessionStart hook fails to register
-        # (e.g., Ctrl-C sends CTRL_C_EVENT to all console processes including
-        # the hook subprocess, killing it before the POST completes).
-        if IS_WINDOWS:
+            candidates = list(sessions.items())
+        remove_zombie_sessions([(sid, s) for sid, s in candidates if not _is_session_alive(sid, s)])
+        discover_sessions()
+
+
+# ── Versions ──
+# state_version grows on every visible session change and each session records
+# the version of its own last change; pending_version grows on every queue dir
+# change.  They back the ETags of the polling endpoints and their ?wait= long-polls.
+
+LONG_POLL_DEFAULT = 30       # seconds a ?wait= request blocks when no timeout is given
+LONG_POLL_MAX = 60
+
+state_version = 0
+pending_version = 0
+_version_lock = threading.Lock()
+_version_cond = threading.Condition(_version_lock)  # notified on every bump (long-poll waiters)
+_BOOT_ID = uuid.uuid4().hex[:8]  # versions restart at 0 — keeps ETags of a previous run from matching
+
+
+_version_listeners = []  # callables run after every bump (e.g. the asyncio engine's long-polls)
+
+
+def add_version_listener(fn):
+    _version_listeners.append(fn)
+
+
+def remove_version_listener(fn):
+    if fn in _version_listeners:
+        _version_listeners.remove(fn)
+
+
+def bump_state_version():
+    global state_version
+    with _version_cond:
+        state_version += 1
+        _version_cond.notify_all()
+        version = state_version
+    for fn in _version_listeners:
+        fn()
+    return version
+
+
+def bump_pending_version():
+    global pending_version
+    with _version_cond:
+        pending_version += 1
+        _version_cond.notify_all()
+        version = pending_version
+    for fn in _version_listeners:
+        fn()
+    return version
+
+
+def wait_for_version(kind, after, timeout, refresh=None):
+    """Block until the "state" or "pending" version differs from after; return it.
+
+    Returns at once if it already differs (including an after from before a
+    restart, which is ahead of it), otherwise when it moves or after timeout
+    seconds.  Without change notifications (no file watcher) pass refresh: it
+    is called every second to detect changes, which then bump the version.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        with _version_cond:
+            while True:
+                current = state_version if kind == "state" else pending_version
+                remaining = deadline - time.monotonic()
+                if current != after or remaining <= 0:
+                    return current
+                if not _version_cond.wait(min(remaining, 1.0) if refresh else remaining) and refresh:
+                    break
+        refresh()
+
+
+_pending_listing = None
+
+
+def poll_pending_version():
+    """Bump pending_version if the queue dir's request/response files changed.
+
+    Stands in for the file watcher's queue dir events when it isn't running.
+    """
+    global _pending_listing
+    listing = []
+    try:
+        with os.scandir(QUEUE_DIR) as it:
+            for entry in it:
+                if entry.name.endswith((".request.json", ".response.json")):
+                    try:
+                        listing.append((entry.name, entry.stat().st_mtime_ns))
+                    except OSError:
+                        continue
+    except OSError:
+        return
+    listing.sort()
+    if _pending_listing is not None and listing != _pending_listing:
+        bump_pending_version()
+    _pending_listing = listing
+
+
+def refresh_all_sessions():
+    """Update every session's state from its transcript (used without the file watcher)."""
+    with sessions_lock:
+        sids = list(sessions.keys())
+    for sid in sids:
+        update_session_state(sid)
+
+
+def _combined_etag(local_tag, remote_etags):
+    """Weak ETag for a response built from local state plus remote responses.
+
+    None (no validator) if any part has none.
+    """
+    if local_tag is None or any(t is None for t in remote_etags):
+        return None
+    if not remote_etags:
+        return f'W/"{local_tag}"'
+    digest = hashlib.sha1("|".join(remote_etags).encode()).hexdigest()[:12]
+    return f'W/"{local_tag}-{digest}"'
+
+
+# ── Event stream ──
+# /api/events clients each get a queue; publish_event() fans events out to all
+# of them.  Kinds: session_added, session_removed, state_changed,
+# pending_request, transcript_appended (and resync when a client fell behind).
+
+EVENT_KEEPALIVE = 15         # seconds between SSE keepalive comments
+EVENT_QUEUE_SIZE = 256
+_event_subscribers = set()
+_event_subscribers_lock = threading.Lock()
+_event_listeners = []  # callables(kind, data) run for every event (e.g. the asyncio engine's bridge)
+
+
+def add_event_listener(fn):
+    _event_listeners.append(fn)
+
+
+def remove_event_listener(fn):
+    if fn in _event_listeners:
+        _event_listeners.remove(fn)
+
+
+def subscribe_events():
+    q = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+    with _event_subscribers_lock:
+        _event_subscribers.add(q)
+    return q
+
+
+def unsubscribe_events(q):
+    with _event_subscribers_lock:
+        _event_subscribers.discard(q)
+
+
+def publish_event(kind, data):
+    with _event_subscribers_lock:
+        subscribers = list(_event_subscribers)
+    for q in subscribers:
+        try:
+            q.put_nowait((kind, data))
+        except queue.Full:
+            # Client isn't keeping up — drop its backlog and tell it to refetch everything
+            with q.mutex:
+                q.queue.clear()
+            q.put_nowait(("resync", {}))
+    for fn in _event_listeners:
+        fn(kind, data)
+
+
+def _publish_sessions_removed(sids):
+    for sid in sids:
+        publish_event("session_removed", {"session_id": sid})
+
+
+def _publish_session_added(sid):
+    with sessions_lock:
+        s = sessions.get(sid)
+        snapshot = _session_snapshot(sid, s) if s else None
+    if snapshot:
+        publish_event("session_added", snapshot)
+
+
+def _event_signature(s):
+    pending = s.get("pending_request")
+    return (s["derived_state"], s["last_summary"], s["last_user_prompt"],
+            pending.get("id") if pending else None, s.get("slug", ""), s.get("custom_title", ""))
+
+
+# ── Transcript watcher ──
+# Ingests transcript appends as they happen so /api/sessions only has to
+# serialize the already-derived state.  Started from main(); when it isn't
+# running (tests, or a failed start) the request path parses synchronously.
+
+transcript_watcher = None
+
+
+def _watched_transcript_paths():
+    with sessions_lock:
+        return [s["transcript_path"] for s in sessions.values() if s.get("transcript_path")]
+
+
+def _on_watched_file_change(path):
+    """FileWatcher callback: refresh the sessions affected by a changed file."""
+    if path and os.path.dirname(path) == os.path.abspath(QUEUE_DIR) \
+            and not path.endswith((".request.json", ".response.json")):
+        return  # other queue dir files (e.g. the checkpoint database) don't affect state
+    if path is None or os.path.dirname(path) == os.path.abspath(QUEUE_DIR):
+        # Request files changed (or may have: reconcile also catches dead hook processes)
+        if path is None:
+            changed = pending_index().reconcile()
+        else:
+            changed = True
+            pending_index().update(path)
+            if decision_server and path.endswith(".response.json"):
+                # Written by someone else (e.g. the Feishu channel) — wake the waiting hook now
+                request_id = os.path.basename(path)[:-len(".response.json")]
+                if request_id in decision_server.waiting():
+                    decision = _read_decision(request_id)
+                    if decision is not None:
+                        decision_server.resolve(request_id, decision)
+        if changed:
+            bump_pending_version()
+    with sessions_lock:
+        if path is None or os.path.dirname(path) == os.path.abspath(QUEUE_DIR):
+            # Reconcile tick, or a .request/.response file changed — re-derive everything
+            sids = list(sessions.keys())
+        else:
+            sids = [sid for sid, s in sessions.items()
+                    if s.get("transcript_path") and os.path.abspath(s["transcript_path"]) == path]
+    for sid in sids:
+        update_session_state(sid)
+
+
+def start_transcript_watcher():
+    global transcript_watcher
+    transcript_watcher = FileWatcher(_watched_transcript_paths, _on_watched_file_change,
+                                     watch_dirs=[QUEUE_DIR])
+    transcript_watcher.start()
+    print(f"[*] Transcript watcher started ({transcript_watcher.mode})")
+
+
+def _transcript_watcher_running():
+    return transcript_watcher is not None and transcript_watcher.running
+
+
+def _session_snapshot(sid, s):
+    """Serializable view of one session for /api/sessions. Caller holds sessions_lock."""
+    entry = {
+        "session_id": sid,
+        "cwd": s["cwd"],
+        "state": s["derived_state"],
+        "last_summary": s["last_summary"],
+        "last_user_prompt": s["last_user_prompt"],
+        "last_activity": s["last_activity"],
+        "registered_at": s["registered_at"],
+        "prompt_capable": bool(s.get("terminal_id")),
+        "slug": s.get("slug", ""),
+        "custom_title": s.get("custom_title", ""),
+    }
+    # Attach pending request if in permission_prompt state
+    if s["derived_state"] == "permission_prompt" and s.get("pending_request"):
+        entry["pending_request"] = s["pending_request"]
+    return entry
+
+
+# view=compact: the dashboard cards only show previews, so the long text is
+# cut and the pending request is reduced to what a card needs.  The full
+# request is at /api/session/<id>/request.
+COMPACT_PROMPT_CHARS = 300
+COMPACT_SUMMARY_CHARS = 600
+COMPACT_DETAIL_CHARS = 80
+
+
+def _preview(text, limit):
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+def _compact_snapshot(entry):
+    """Compact view of a _session_snapshot() entry (local or from a remote peer)."""
+    entry = dict(entry)
+    entry["last_user_prompt"] = _preview(entry.get("last_user_prompt") or "", COMPACT_PROMPT_CHARS)
+    entry["last_summary"] = _preview(entry.get("last_summary") or "", COMPACT_SUMMARY_CHARS)
+    pending = entry.get("pending_request")
+    if pending:
+        entry["pending_request"] = {"id": pending.get("id"), "tool_name": pending.get("tool_name"),
+                                    "detail": _preview(pending.get("detail") or "", COMPACT_DETAIL_CHARS)}
+    return entry
+
+
+def _session_json(sid, s, compact=False):
+    """_session_snapshot() of a local session as JSON bytes, tagged with this machine.
+
+    Cached per view in the record until the session's version changes, so a
+    poll only re-serializes the sessions that changed since the last one.
+    Caller holds sessions_lock.
+    """
+    version = s.get("version", 0)
+    cached = s.get("snapshot_json")
+    if not cached or cached[0] != version:
+        cached = s["snapshot_json"] = (version, {})
+    bodies = cached[1]
+    if compact not in bodies:
+        entry = _session_snapshot(sid, s)
+        entry["machine"] = server_name
+        if compact:
+            entry = _compact_snapshot(entry)
+        bodies[compact] = json.dumps(entry).encode()
+    return bodies[compact]
+
+
+# ── Permission responses ──
+# Answering a request = writing <id>.response.json, which the hook picks up
+# (or is sent on its decision socket connection).  "always" also adds allow
+# patterns to the project's settings.
+
+
+def add_allow_patterns(settings_file, patterns):
+    """Add allow patterns to a settings.local.json, rewriting it at most once."""
+    try:
+        if os.path.exists(settings_file):
+            with open(settings_file) as f:
+                settings = json.load(f)
+        else:
+            settings = {"permissions": {"allow": []}}
+        if "permissions" not in settings:
+            settings["permissions"] = {"allow": []}
+        if "allow" not in settings["permissions"]:
+            settings["permissions"]["allow"] = []
+        allow = settings["permissions"]["allow"]
+        added = [p for p in dict.fromkeys(patterns) if p not in allow]
+        if added:
+            allow.extend(added)
+            with open(settings_file, "w") as f:
+                json.dump(settings, f, indent=2)
+                f.write("\n")
+            for pattern in added:
+                print(f"[+] Added to allowlist: {pattern}")
+    except (json.JSONDecodeError, IOError) as e:
+        print(f"[!] Failed to update settings: {e}")
+
+
+def respond_to_requests(items):
+    """Answer local pending requests; returns one {"id", "ok"[, "error"]} per item.
+
+    Each item is {"id", "decision", "message"?, "allow_patterns"?,
+    "allow_pattern"?}.  Without patterns, "always" uses the request's own
+    allow_pattern.  Patterns are grouped by settings file, so each file is
+    written once however many requests add to it.
+    """
+    results = []
+    answers = []
+    additions = {}  # settings_file -> [pattern]
+    for item in items:
+        request_id = str(item.get("id", ""))
+        request_file = os.path.join(QUEUE_DIR, f"{request_id}.request.json")
+        if not request_id or os.path.basename(request_file) != f"{request_id}.request.json" \
+                or not os.path.exists(request_file):
+            results.append({"id": request_id, "ok": False, "error": "Request not found"})
+            continue
+        decision = item.get("decision", "deny")
+        if decision == "always":
             try:
-                _restore_sessions_from_terminal_mappings()
-            except Exception:
+                with open(request_file) as f:
+                    req_data = json.load(f)
+                settings_file = req_data.get("settings_file", "")
+                allow_patterns = item.get("allow_patterns") or []
+                if not allow_patterns:
+                    allow_pattern = item.get("allow_pattern") or req_data.get("allow_pattern", "")
+                    if allow_pattern:
+                        allow_patterns = [allow_pattern]
+                if settings_file:
+                    additions.setdefault(settings_file, []).extend(allow_patterns)
+            except (json.JSONDecodeError, IOError):
                 pass
+        resp_data = {"decision": decision}
+        if item.get("message"):
+            resp_data["message"] = item["message"]
+        answers.append((request_id, resp_data))
+        results.append({"id": request_id, "ok": True})
+
+    # Settings first: the rules are in place by the time a hook sees its answer
+    for settings_file, patterns in additions.items():
+        add_allow_patterns(settings_file, patterns)
+    for request_id, resp_data in answers:
+        write_response(request_id, resp_data)
+    return results
+
+
+def write_response(request_id, resp_data):
+    """Answer a request: write its .response.json and wake a hook waiting on the decision socket."""
+    response_file = os.path.join(QUEUE_DIR, f"{request_id}.response.json")
+    with open(response_file, "w") as f:
+        json.dump(resp_data, f)
+    pending_index().update(response_file)
+    if decision_server:
+        decision_server.resolve(request_id, resp_data)
+
+
+# ── Decision socket ──
+# Hooks submit requests on QUEUE_DIR/decisions.sock and block on the
+# connection until the user decides (see decision_socket.py).  The request
+# is still written to the queue dir, so the UI, old hooks and a hook whose
+# connection breaks all keep working from the files.
+
+decision_server = None
+
+
+def _submit_decision_request(request):
+    """DecisionServer submit callback: auto-allow tiers, dedup, then queue the request."""
+    sid = str(request.get("session_id", ""))
+    tool_name = request.get("tool_name", "")
+    verdict = evaluate_permission(tool_name, request.get("tool_input"), request.get("project_dir", ""), sid)
+    if verdict["decision"] == "allow":
+        return None, {"decision": "allow"}
+    request.update((field, verdict[field]) for field in permission_rules.REQUEST_FIELDS)
+    # Claude Code may invoke the permission hook twice for the same tool call —
+    # the second hook waits on the first one's request.
+    for existing in pending_index().pending():
+        if (str(existing.get("session_id", "")) == sid
+                and existing.get("tool_name") == tool_name
+                and existing.get("tool_input") == request.get("tool_input")):
+            return str(existing.get("id", "")), None
+    request_id = str(request.get("id", ""))
+    request_file = os.path.join(QUEUE_DIR, f"{request_id}.request.json")
+    if not request_id or os.path.basename(request_file) != f"{request_id}.request.json":
+        raise ValueError("Invalid request id")
+    tmp_file = request_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(request, f)
+    os.replace(tmp_file, request_file)
+    pending_index().update(request_file)
+    bump_pending_version()
+    update_session_state(sid)
+    return request_id, None
+
+
+def _read_decision(request_id):
+    """DecisionServer check callback: the request's response file, if written (e.g. by the Feishu channel)."""
+    try:
+        with open(os.path.join(QUEUE_DIR, f"{request_id}.response.json")) as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return None
+
+
+def _abandon_decision_request(request_id):
+    """DecisionServer abandon callback: the hook went away, drop its request."""
+    data = pending_index().get(request_id) or {}
+    pending_index().remove(request_id, response=False)
+    bump_pending_version()
+    update_session_state(str(data.get("session_id", "")))
+
+
+def start_decision_server():
+    global decision_server
+    if not decision_socket.supported():
+        return
+    server = decision_socket.DecisionServer(
+        decision_socket.socket_path(QUEUE_DIR),
+        _submit_decision_request, _read_decision, _abandon_decision_request)
+    server.start()
+    decision_server = server
+    print(f"[*] Decision socket: {server.path}")
+
+
+# ── Compression ──
+# JSON bodies of at least COMPRESS_MIN_BYTES are gzip/deflate-encoded when the
+# client accepts it; the page is compressed once, here, at startup.
+
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_LEVEL = 6
+
+_COMPRESSORS = {
+    "gzip": lambda body: gzip.compress(body, COMPRESS_LEVEL, mtime=0),
+    "deflate": lambda body: zlib.compress(body, COMPRESS_LEVEL),  # HTTP "deflate" is zlib-wrapped
+}
+
+
+def _accepted_encoding(accept_encoding):
+    """Pick gzip or deflate from an Accept-Encoding header value, or None for identity."""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for name in ("gzip", "deflate"):
+        q = accepted.get(name, accepted.get("*", 0.0))
+        if q > 0:
+            return name
+    return None
+
+
+# Incremental compressors for streamed bodies
+_STREAM_COMPRESSORS = {
+    "gzip": lambda: zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31),
+    "deflate": lambda: zlib.compressobj(COMPRESS_LEVEL),
+}
+
+
+def _compress_stream(pieces, encoding):
+    compressor = _STREAM_COMPRESSORS[encoding]()
+    for piece in pieces:
+        yield compressor.compress(piece)
+    yield compressor.flush()
+
 
+def _precompress(body):
+    """{encoding or None: bytes} for a body served many times."""
+    bodies = {None: body}
+    for name, compress in _COMPRESSORS.items():
+        bodies[name] = compress(body)
+    return bodies
 
 
+_PAGE_BODIES = _precompress(HTML_PAGE.encode())
+_PAGE_ETAG = f'W/"page-{hashlib.sha1(_PAGE_BODIES[None]).hexdigest()[:16]}"'
+
 
 # ── HTTP Handler ──
 
-class WebUIHandler(BaseHTTPRequestHandler):
+# POST routes that are forwarded to the owning machine for remote sessions
+_PROXIED_POSTS = ("/api/respond", "/api/respond-batch", "/api/session-allow", "/api/send-prompt")
+
+
+def route_pool(command, target):
+    """Worker pool for a request: "stream" for event streams and long-polls,
+    "slow" for anything that may wait on a remote server, else "fast"."""
+    parsed = urlparse(target)
+    path = parsed.path
+    qs = parse_qs(parsed.query)
+    if path == "/api/events" or qs.get("wait"):
+        return "stream"
+    if command == "POST":
+        return "slow" if remote_servers and path in _PROXIED_POSTS else "fast"
+    if path == "/api/sessions":
+        return "slow" if remote_servers and qs.get("local_only", [""])[0] != "1" else "fast"
+    if path == "/api/pending":
+        return "slow" if remote_servers else "fast"
+    if path.startswith("/api/session/"):
+        return "slow" if _get_remote_url_for_session(path.split("/")[3]) else "fast"
+    if path.startswith("/api/image"):
+        machine = qs.get("machine", [""])[0]
+        return "slow" if machine and machine != server_name else "fast"
+    return "fast"
+
+
+class WebUIHandler(PooledRequestHandler):
+    # Persistent connections: every response carries a Content-Length (or
+    # closes the connection), and idle connections are dropped after timeout.
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+
+    def request_pool(self):
+        return route_pool(self.command, self.path)
+
     def log_message(self, format, *args):
         pass
 
@@ -542,49 +1464,48 @@ class WebUIHandler(BaseHTTPRequestHandler):
         path = parsed.path
 
         if path == "/":
-            self._respond_html(HTML_PAGE)
+            self._respond_page()
 
-        elif path == "/api/sessions":
-            # Update all session states from transcripts
-            with sessions_lock:
-                sids = list(sessions.keys())
-            for sid in sids:
-                update_session_state(sid)
-
-            result = []
-            with sessions_lock:
-                for sid, s in sessions.items():
-                    can_prompt = bool(s.get("terminal_id"))
-                    entry = {
-                        "session_id": sid,
-                        "cwd": s["cwd"],
-                        "state": s["derived_state"],
-                        "last_summary": s["last_summary"],
-                        "last_user_prompt": s["last_user_prompt"],
-                        "last_activity": s["last_activity"],
-                        "registered_at": s["registered_at"],
-                        "prompt_capable": can_prompt,
-                        "slug": s.get("slug", ""),
-                        "custom_title": s.get("custom_title", ""),
-                    }
-                    # Attach pending request if in permission_prompt state
-                    if s["derived_state"] == "permission_prompt":
-                        pr = _find_pending_request(sid)
-                        if pr:
-                            entry["pending_request"] = pr
-                    result.append(entry)
-
-            # Federation: tag local sessions and merge remote sessions
-            for entry in result:
-                entry["machine"] = server_name
-                session_machine_map[entry["session_id"]] = None
+        elif path == "/api/events":
+            # Without the watcher nothing would publish — clients keep polling instead
+            if not _transcript_watcher_running():
+                self.send_error(503, "Event stream unavailable")
+                return
+            self._serve_events()
 
+        elif path == "/api/sessions":
             qs = parse_qs(parsed.query)
+            wait = self._long_poll_params(qs)
+            if wait is False:
+                return
+            # The transcript watcher keeps derived state current; without it,
+            # update all session states from transcripts before answering.
+            watching = _transcript_watcher_running()
+            if not watching:
+                refresh_all_sessions()
+            if wait:
+                wait_for_version("state", *wait, refresh=None if watching else refresh_all_sessions)
+
             local_only = qs.get("local_only", [""])[0] == "1"
+            federated = bool(remote_servers) and not local_only
+            compact = qs.get("view", [""])[0] == "compact"
 
-            if remote_servers and not local_only:
+            with sessions_lock:
+                version = state_version
+                local_tag = f"{_BOOT_ID}.s{version}" + (".c" if compact else "")
+                if not federated and self._not_modified(_combined_etag(local_tag, [])):
+                    return
+                fragments = [_session_json(sid, s, compact) for sid, s in sessions.items()]
+                for sid in sessions:
+                    session_machine_map[sid] = None
+
+            # Federation: merge remote sessions, tagged with their machine
+            result = []
+            remote_etags = []
+            if federated:
                 remote_results = fetch_remote_sessions()
-                for remote, remote_sessions in remote_results:
+                for remote, remote_sessions, remote_etag in remote_results:
+                    remote_etags.append(remote_etag)
                     if remote_sessions is None:
                         continue
                     for rs in remote_sessions:
@@ -595,8 +1516,83 @@ class WebUIHandler(BaseHTTPRequestHandler):
                         session_machine_map[rs["session_id"]] = remote["url"]
                         result.append(rs)
 
+            etag = _combined_etag(local_tag, remote_etags)
+            if federated and self._not_modified(etag):
+                return
             remote_names = [r["name"] for r in remote_servers]
-            self._respond_json({"sessions": result, "name": server_name, "remote_names": remote_names})
+            fragments.extend(json.dumps(_compact_snapshot(rs) if compact else rs).encode() for rs in result)
+            # Assembled from the per-session fragments rather than dumped whole
+            rest = json.dumps({"name": server_name, "remote_names": remote_names, "version": version})
+            body = b'{"sessions": [' + b", ".join(fragments) + b"], " + rest[1:].encode()
+            self._respond_json_body(body, etag=etag)
+
+        elif path.startswith("/api/session/") and path.count("/") == 3:
+            # /api/session/<id> — one session's state, pending request and transcript cursor
+            sid = path.split("/")[3]
+
+            remote_url = _get_remote_url_for_session(sid)
+            if remote_url:
+                try:
+                    status, resp_body, ct = proxy_to_remote(
+                        remote_url, f"/api/session/{_get_original_session_id(sid)}")
+                except urllib.error.HTTPError as e:
+                    self.send_error(e.code, "Remote session lookup failed")
+                    return
+                except Exception as e:
+                    self.send_error(502, f"Remote proxy failed: {e}")
+                    return
+                entry = json.loads(resp_body)
+                entry["_remote_session_id"] = entry.get("session_id")
+                entry["session_id"] = sid
+                entry["machine"] = next((r["name"] for r in remote_servers if r["url"] == remote_url), "")
+                self._respond_json(entry)
+                return
+
+            if not _transcript_watcher_running():
+                update_session_state(sid)
+            with sessions_lock:
+                s = sessions.get(sid)
+                if not s:
+                    self.send_error(404, "Session not found")
+                    return
+                etag = f'W/"{_BOOT_ID}.d{s.get("version", 0)}"'
+                if self._not_modified(etag):
+                    return
+                entry = _session_snapshot(sid, s)
+                entry["transcript_cursor"] = _transcript_cursor(s)
+            entry["machine"] = server_name
+            self._respond_json(entry, etag=etag)
+
+        elif path.startswith("/api/session/") and path.endswith("/request") and path.count("/") == 4:
+            # /api/session/<id>/request — the full pending request behind a compact card
+            sid = path.split("/")[3]
+
+            remote_url = _get_remote_url_for_session(sid)
+            if remote_url:
+                try:
+                    status, resp_body, ct = proxy_to_remote(
+                        remote_url, f"/api/session/{_get_original_session_id(sid)}/request")
+                except urllib.error.HTTPError as e:
+                    self.send_error(e.code, "Remote request lookup failed")
+                    return
+                except Exception as e:
+                    self.send_error(502, f"Remote proxy failed: {e}")
+                    return
+                self._respond_bytes(status, resp_body, ct)
+                return
+
+            if not _transcript_watcher_running():
+                update_session_state(sid)
+            with sessions_lock:
+                s = sessions.get(sid)
+                if not s:
+                    self.send_error(404, "Session not found")
+                    return
+                etag = f'W/"{_BOOT_ID}.r{s.get("version", 0)}"'
+                if self._not_modified(etag):
+                    return
+                request = s.get("pending_request") if s["derived_state"] == "permission_prompt" else None
+            self._respond_json({"session_id": sid, "request": request}, etag=etag)
 
         elif path.startswith("/api/session/") and path.endswith("/transcript"):
             # /api/session/<id>/transcript?limit=50&after=0
@@ -611,29 +1607,49 @@ class WebUIHandler(BaseHTTPRequestHandler):
                     proxy_path = f"/api/session/{original_sid}/transcript"
                     if parsed.query:
                         proxy_path += "?" + parsed.query
-                    status, resp_body, ct = proxy_to_remote(remote_url, proxy_path)
-                    self.send_response(status)
-                    self.send_header("Content-Type", ct)
-                    self.end_headers()
-                    self.wfile.write(resp_body)
+                    # Passed through, so the remote's (compressed) body is relayed as is
+                    headers = {k: self.headers[k] for k in ("If-None-Match", "Accept-Encoding") if self.headers.get(k)}
+                    resp = open_remote(remote_url, proxy_path, headers=headers)
+                    self._relay_remote(resp)
+                except urllib.error.HTTPError as e:
+                    if e.code == 304:
+                        self._send_not_modified(e.headers.get("ETag"))
+                    else:
+                        self.send_error(502, f"Remote proxy failed: {e}")
                 except Exception as e:
                     self.send_error(502, f"Remote proxy failed: {e}")
                 return
 
             params = parse_qs(parsed.query)
-            limit = int(params.get("limit", [50])[0])
+            try:
+                limit = int(params.get("limit", [50])[0])
+                after = int(params["after"][0]) if params.get("after", [""])[0] else None
+                before = int(params["before"][0]) if params.get("before", [""])[0] else None
+            except ValueError:
+                self.send_error(400, "Invalid limit, after or before")
+                return
 
             with sessions_lock:
                 s = sessions.get(sid)
-                if not s:
-                    self.send_error(404, "Session not found")
-                    return
-                entries = list(s["transcript_entries"])
+                # Same cursor (and backfill progress) = same answer for the same query
+                etag = f'W/"{_BOOT_ID}.t{_transcript_cursor(s)}-{s.get("transcript_backfill", 0)}"' if s else None
+            if self._not_modified(etag):
+                return
+            stream = limit > STREAM_MIN_ENTRIES
+            page = _transcript_page(sid, after=after, before=before, limit=limit, stream=stream)
+            if page is None:
+                self.send_error(404, "Session not found")
+                return
+            if stream:
+                # Big pages are encoded and sent entry by entry instead of as one string
+                self._respond_json_stream(page, "entries", etag=etag)
+            else:
+                self._respond_json(page, etag=etag)
 
-            # Filter to user/assistant only, take last N
-            filtered = [e for e in entries if e.get("type") in ("user", "assistant")]
-            filtered = filtered[-limit:]
-            self._respond_json({"entries": filtered})
+        elif path == "/api/server-stats":
+            # Worker pool queue depths (PooledHTTPServer or the asyncio engine)
+            stats = getattr(self.server, "stats", None)
+            self._respond_json(stats() if stats else {})
 
         elif path == "/api/check-auto-allow":
             params = parse_qs(parsed.query)
@@ -643,45 +1659,37 @@ class WebUIHandler(BaseHTTPRequestHandler):
             self._respond_json({"auto_allow": result})
 
         elif path == "/api/pending":
-            # Legacy endpoint — scan .request.json files
-            requests = []
-            for fpath in sorted(glob.glob(os.path.join(QUEUE_DIR, "*.request.json"))):
-                try:
-                    with open(fpath) as f:
-                        data = json.load(f)
-                    resp_path = fpath.replace(".request.json", ".response.json")
-                    if os.path.exists(resp_path):
-                        continue
-                    pid = data.get("pid")
-                    if pid:
-                        try:
-                            if not is_process_alive(int(pid)):
-                                os.remove(fpath)
-                                continue
-                        except (ValueError, TypeError):
-                            os.remove(fpath)
-                            continue
-                    requests.append(data)
-                except (json.JSONDecodeError, IOError):
-                    continue
+            # Legacy endpoint — every pending request, from the index.  The watcher bumps
+            # pending_version on every queue dir change, so an unchanged
+            # version means the same answer (remote peers are revalidated).
+            wait = self._long_poll_params(parse_qs(parsed.query))
+            if wait is False:
+                return
+            watching = _transcript_watcher_running()
+            if wait:
+                wait_for_version("pending", *wait, refresh=None if watching else poll_pending_version)
+            version = pending_version
+            local_tag = f"{_BOOT_ID}.p{version}" if watching else None
+            if not remote_servers and self._not_modified(_combined_etag(local_tag, [])):
+                return
+            remote_etags = []
+            # Copies: remote requests are tagged below, the index's own stay as they are
+            requests = [dict(r) for r in pending_index().pending()]
 
             # Federation: aggregate remote pending requests
             if remote_servers:
-                for remote in remote_servers:
-                    try:
-                        url = remote["url"].rstrip("/") + "/api/pending"
-                        req = urllib.request.Request(url)
-                        resp = urllib.request.urlopen(req, timeout=3)
-                        data = json.loads(resp.read())
-                        for r in data.get("requests", []):
-                            r["machine"] = remote["name"]
-                            if "session_id" in r:
-                                r["session_id"] = remote["name"] + ":" + str(r["session_id"])
-                            requests.append(r)
-                    except Exception:
-                        pass
-
-            self._respond_json({"requests": requests})
+                for remote, remote_requests, etag in fetch_remote_pending():
+                    remote_etags.append(etag)
+                    for r in remote_requests or []:
+                        r["machine"] = remote["name"]
+                        if "session_id" in r:
+                            r["session_id"] = remote["name"] + ":" + str(r["session_id"])
+                        requests.append(r)
+
+            etag = _combined_etag(local_tag, remote_etags)
+            if remote_servers and self._not_modified(etag):
+                return
+            self._respond_json({"requests": requests, "version": version}, etag=etag)
 
         elif path.startswith("/api/image"):
             params = parse_qs(parsed.query)
@@ -691,14 +1699,11 @@ class WebUIHandler(BaseHTTPRequestHandler):
                 remote_url = next((r["url"] for r in remote_servers if r["name"] == machine), None)
                 if remote_url:
                     try:
-                        proxy_path = "/api/image?" + parsed.query
-                        status, resp_body, ct = proxy_to_remote(remote_url, proxy_path)
-                        self.send_response(status)
-                        self.send_header("Content-Type", ct)
-                        self.end_headers()
-                        self.wfile.write(resp_body)
+                        resp = open_remote(remote_url, "/api/image?" + parsed.query)
                     except Exception:
                         self.send_error(502, "Remote image proxy failed")
+                        return
+                    self._relay_remote(resp)
                     return
             # Existing local logic continues...
             img_path = params.get("path", [""])[0]
@@ -708,11 +1713,8 @@ class WebUIHandler(BaseHTTPRequestHandler):
             ext = os.path.splitext(img_path)[1].lower()
             ct = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg",
                   ".gif": "image/gif", ".webp": "image/webp"}.get(ext, "application/octet-stream")
-            self.send_response(200)
-            self.send_header("Content-Type", ct)
-            self.end_headers()
             with open(img_path, "rb") as f:
-                self.wfile.write(f.read())
+                self._respond_bytes(200, f.read(), ct)
 
         else:
             self.send_error(404)
@@ -734,6 +1736,7 @@ class WebUIHandler(BaseHTTPRequestHandler):
             tmux_socket = body.get("tmux_socket", "")
             cwd = body.get("cwd", "")
 
+            evict = []
             with sessions_lock:
                 # Evict other sessions on the same terminal (new session_id on same pane/tab)
                 if source in ("startup", "resume", "clear") and terminal_id:
@@ -746,28 +1749,15 @@ class WebUIHandler(BaseHTTPRequestHandler):
                     if evict:
                         print(f"[~] Evicted session(s) on terminal {terminal_id}: {evict}")
 
-                if source == "startup" or sid not in sessions:
-                    sessions[sid] = {
-                        "transcript_path": transcript_path,
-                        "terminal_id": terminal_id,
-                        "tmux_socket": tmux_socket,
-                        "cwd": cwd,
-                        "registered_at": time.time(),
-                        "transcript_offset": 0,
-                        "transcript_entries": [],
-                        "derived_state": "idle",
-                        "last_activity": time.time(),
-                        "last_summary": "",
-                        "last_user_prompt": "",
-                        "slug": "",
-                        "custom_title": "",
-                    }
+                added = source == "startup" or sid not in sessions
+                if added:
+                    sessions[sid] = _new_session(transcript_path, terminal_id, tmux_socket, cwd)
+                    sessions[sid]["version"] = bump_state_version()
                 else:
                     # resume/clear/compact — update path and reset offset
                     s = sessions[sid]
                     s["transcript_path"] = transcript_path
-                    s["transcript_offset"] = 0
-                    s["transcript_entries"] = []
+                    _reset_transcript_locked(s)
                     s["last_activity"] = time.time()
                     if terminal_id:
                         s["terminal_id"] = terminal_id
@@ -775,6 +1765,7 @@ class WebUIHandler(BaseHTTPRequestHandler):
                         s["tmux_socket"] = tmux_socket
                     if cwd:
                         s["cwd"] = cwd
+                    s["version"] = bump_state_version()  # terminal/cwd may have changed
 
                 if source == "clear":
                     # Clear auto-allow rules
@@ -782,20 +1773,13 @@ class WebUIHandler(BaseHTTPRequestHandler):
                     for k in keys_to_remove:
                         del session_auto_allow[k]
                     # Clean up request files for this session
-                    for fpath in glob.glob(os.path.join(QUEUE_DIR, "*.request.json")):
-                        try:
-                            with open(fpath) as f:
-                                data = json.load(f)
-                            if str(data.get("session_id", "")) == sid:
-                                resp_path = fpath.replace(".request.json", ".response.json")
-                                for p in (fpath, resp_path):
-                                    try:
-                                        os.remove(p)
-                                    except OSError:
-                                        pass
-                        except (json.JSONDecodeError, IOError):
-                            continue
+                    index = pending_index()
+                    for request_id in index.session_request_ids(sid):
+                        index.remove(request_id)
 
+            _publish_sessions_removed(evict)
+            if added:
+                _publish_session_added(sid)
             pane_info = f"terminal={terminal_id}" if terminal_id else "no-terminal"
             print(f"[*] Session registered: {sid} source={source} {pane_info}")
             self._respond_json({"ok": True})
@@ -808,35 +1792,24 @@ class WebUIHandler(BaseHTTPRequestHandler):
                 return
 
             with sessions_lock:
-                sessions.pop(sid, None)
+                if sessions.pop(sid, None) is not None:
+                    bump_state_version()
                 # Clear auto-allow
                 keys_to_remove = [k for k in session_auto_allow if k[0] == sid]
                 for k in keys_to_remove:
                     del session_auto_allow[k]
 
             # Clean up request files
-            for fpath in glob.glob(os.path.join(QUEUE_DIR, "*.request.json")):
-                try:
-                    with open(fpath) as f:
-                        data = json.load(f)
-                    if str(data.get("session_id", "")) == sid:
-                        resp_path = fpath.replace(".request.json", ".response.json")
-                        for p in (fpath, resp_path):
-                            try:
-                                os.remove(p)
-                            except OSError:
-                                pass
-                except (json.JSONDecodeError, IOError):
-                    continue
+            index = pending_index()
+            for request_id in index.session_request_ids(sid):
+                index.remove(request_id)
 
+            _publish_sessions_removed([sid])
             print(f"[*] Session deregistered: {sid}")
             self._respond_json({"ok": True})
 
         elif path == "/api/respond":
             body = self._read_json()
-            request_id = body.get("id", "")
-            decision = body.get("decision", "deny")
-            message = body.get("message", "")
 
             # Federation: check if this should be proxied
             sid = str(body.get("session_id", ""))
@@ -849,45 +1822,53 @@ class WebUIHandler(BaseHTTPRequestHandler):
                         remote_url, "/api/respond", method="POST",
                         body=json.dumps(proxy_body).encode()
                     )
-                    self.send_response(status)
-                    self.send_header("Content-Type", ct)
-                    self.end_headers()
-                    self.wfile.write(resp_body)
+                    self._respond_bytes(status, resp_body, ct)
                 except Exception as e:
                     self.send_error(502, f"Remote proxy failed: {e}")
                 return
 
-            request_file = os.path.join(QUEUE_DIR, f"{request_id}.request.json")
-            if not os.path.exists(request_file):
+            if not respond_to_requests([body])[0]["ok"]:
                 self.send_error(404, "Request not found")
                 return
-
-            # "always" → write to settings.local.json
-            if decision == "always":
-                try:
-                    with open(request_file) as f:
-                        req_data = json.load(f)
-                    settings_file = req_data.get("settings_file", "")
-                    allow_patterns = body.get("allow_patterns") or []
-                    if not allow_patterns:
-                        allow_pattern = body.get("allow_pattern") or req_data.get("allow_pattern", "")
-                        if allow_pattern:
-                            allow_patterns = [allow_pattern]
-                    if settings_file:
-                        for pattern in allow_patterns:
-                            self._add_to_settings(settings_file, pattern)
-                except (json.JSONDecodeError, IOError):
-                    pass
-
-            response_file = os.path.join(QUEUE_DIR, f"{request_id}.response.json")
-            resp_data = {"decision": decision}
-            if message:
-                resp_data["message"] = message
-            with open(response_file, "w") as f:
-                json.dump(resp_data, f)
-
             self._respond_json({"ok": True})
 
+        elif path == "/api/respond-batch":
+            # {"items": [{id, decision, message?, allow_patterns?, session_id?}, ...]} —
+            # answers many requests in one round trip, remote ones forwarded per peer
+            body = self._read_json()
+            items = body.get("items")
+            if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+                self.send_error(400, "Missing items")
+                return
+            local = []
+            by_remote = {}
+            for i, item in enumerate(items):
+                sid = str(item.get("session_id", ""))
+                remote_url = _get_remote_url_for_session(sid) if sid else None
+                if remote_url:
+                    by_remote.setdefault(remote_url, []).append(i)
+                else:
+                    local.append(i)
+            results = [None] * len(items)
+            for i, result in zip(local, respond_to_requests([items[i] for i in local])):
+                results[i] = result
+            remote_results = _remote_executor.map(
+                forward_respond_batch, by_remote, [[items[i] for i in idx] for idx in by_remote.values()])
+            for indices, batch_results in zip(by_remote.values(), remote_results):
+                for i, result in zip(indices, batch_results):
+                    results[i] = result
+            self._respond_json({"ok": all(r["ok"] for r in results), "results": results})
+
+        elif path == "/api/evaluate":
+            # Auto-allow tiers for a hook without the decision socket
+            body = self._read_json()
+            tool_name = body.get("tool_name", "")
+            if not tool_name:
+                self.send_error(400, "Missing tool_name")
+                return
+            self._respond_json(evaluate_permission(
+                tool_name, body.get("tool_input"), body.get("cwd", ""), body.get("session_id", "")))
+
         elif path == "/api/session-allow":
             body = self._read_json()
             sid = str(body.get("session_id", ""))
@@ -903,10 +1884,7 @@ class WebUIHandler(BaseHTTPRequestHandler):
                         remote_url, "/api/session-allow", method="POST",
                         body=json.dumps(proxy_body).encode()
                     )
-                    self.send_response(status)
-                    self.send_header("Content-Type", ct)
-                    self.end_headers()
-                    self.wfile.write(resp_body)
+                    self._respond_bytes(status, resp_body, ct)
                 except Exception as e:
                     self.send_error(502, f"Remote proxy failed: {e}")
                 return
@@ -915,11 +1893,9 @@ class WebUIHandler(BaseHTTPRequestHandler):
                 session_auto_allow[(sid, tool_name)] = True
                 print(f"[+] Session auto-allow: {tool_name} for session {sid}")
             if request_id:
-                resp_file = os.path.join(QUEUE_DIR, f"{request_id}.response.json")
                 req_file = os.path.join(QUEUE_DIR, f"{request_id}.request.json")
                 if os.path.exists(req_file):
-                    with open(resp_file, "w") as f:
-                        json.dump({"decision": "allow"}, f)
+                    write_response(request_id, {"decision": "allow"})
             self._respond_json({"ok": True})
 
         elif path == "/api/send-prompt":
@@ -939,10 +1915,7 @@ class WebUIHandler(BaseHTTPRequestHandler):
                         remote_url, "/api/send-prompt", method="POST",
                         body=json.dumps(proxy_body).encode()
                     )
-                    self.send_response(status)
-                    self.send_header("Content-Type", ct)
-                    self.end_headers()
-                    self.wfile.write(resp_body)
+                    self._respond_bytes(status, resp_body, ct)
                 except Exception as e:
                     self.send_error(502, f"Remote proxy failed: {e}")
                 return
@@ -992,8 +1965,10 @@ class WebUIHandler(BaseHTTPRequestHandler):
             if "multipart/form-data" not in content_type:
                 self.send_error(400, "Expected multipart/form-data")
                 return
+            # Read exactly Content-Length bytes so a kept-alive connection stays in sync
+            length = int(self.headers.get("Content-Length", 0))
             form = cgi.FieldStorage(
-                fp=self.rfile,
+                fp=io.BytesIO(self.rfile.read(length)),
                 headers=self.headers,
                 environ={"REQUEST_METHOD": "POST", "CONTENT_TYPE": content_type}
             )
@@ -1031,54 +2006,220 @@ class WebUIHandler(BaseHTTPRequestHandler):
                 self.send_error(400, "Missing session_id")
                 return
             with sessions_lock:
-                sessions.pop(sid, None)
+                if sessions.pop(sid, None) is not None:
+                    bump_state_version()
             keys_to_remove = [k for k in session_auto_allow if k[0] == sid]
             for k in keys_to_remove:
                 del session_auto_allow[k]
+            _publish_sessions_removed([sid])
             print(f"[*] Session end (legacy): session={sid}")
             self._respond_json({"ok": True})
 
         else:
             self.send_error(404)
 
+    def _serve_events(self):
+        """Stream published events as Server-Sent Events until the client goes away."""
+        q = subscribe_events()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("X-Accel-Buffering", "no")
+            # No length — the stream ends when the connection does
+            self.send_header("Connection", "close")
+            self.close_connection = True
+            self.end_headers()
+            self.wfile.write(b"retry: 3000\n\n")
+            self.wfile.flush()
+            while True:
+                try:
+                    kind, data = q.get(timeout=EVENT_KEEPALIVE)
+                except queue.Empty:
+                    self.wfile.write(b": keepalive\n\n")
+                else:
+                    self.wfile.write(f"event: {kind}\ndata: {json.dumps(data)}\n\n".encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+        finally:
+            unsubscribe_events(q)
+
     def _read_json(self):
         length = int(self.headers.get("Content-Length", 0))
         return json.loads(self.rfile.read(length))
 
-    def _respond_json(self, data):
+    def _respond_json(self, data, etag=None):
+        self._respond_json_body(json.dumps(data).encode(), etag=etag)
+
+    def _respond_json_body(self, body, etag=None):
+        """Send an already-serialized JSON body."""
+        encoding = None
+        if len(body) >= COMPRESS_MIN_BYTES:
+            encoding = _accepted_encoding(self.headers.get("Accept-Encoding"))
+            if encoding:
+                body = _COMPRESSORS[encoding](body)
+        self._send_json_headers(etag)
+        self._send_body_headers(body, encoding)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _respond_json_stream(self, data, key, etag=None):
+        """Send data as JSON with data[key], an iterable, encoded one item at a time.
+
+        The body goes out chunked (compressed on the fly if accepted), so only
+        one item and one chunk are in memory at any time.  HTTP/1.0 clients
+        get it unframed, ended by closing the connection.
+        """
+        items = data[key]
+        rest = json.dumps({k: v for k, v in data.items() if k != key})
+
+        def pieces():
+            yield b'{"' + key.encode() + b'": ['
+            for i, item in enumerate(items):
+                yield (b", " if i else b"") + json.dumps(item).encode()
+            yield b"], " + rest[1:].encode()
+
+        encoding = _accepted_encoding(self.headers.get("Accept-Encoding"))
+        self._send_json_headers(etag)
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Vary", "Accept-Encoding")
+        self._send_stream_framing()
+        self.end_headers()
+        self._write_chunks(_compress_stream(pieces(), encoding) if encoding else pieces())
+
+    def _relay_remote(self, resp):
+        """Relay an open remote response (see open_remote()) in chunks instead of buffering it."""
+        with resp:
+            self.send_response(resp.status)
+            for name in ("Content-Type", "ETag", "Cache-Control", "Content-Encoding", "Vary"):
+                if resp.headers.get(name):
+                    self.send_header(name, resp.headers[name])
+            length = resp.headers.get("Content-Length")
+            if length is None:
+                self._send_stream_framing()
+            else:
+                self.send_header("Content-Length", length)
+            self.end_headers()
+            chunks = iter(lambda: resp.read(STREAM_CHUNK_BYTES), b"")
+            try:
+                if length is None:
+                    self._write_chunks(chunks)
+                else:
+                    for chunk in chunks:
+                        self.wfile.write(chunk)
+            except (OSError, http.client.HTTPException) as e:
+                # Headers are out — all that's left is to cut the response short
+                print(f"[!] Remote relay failed: {e}")
+                self.close_connection = True
+
+    def _send_stream_framing(self):
+        """Header for a body of unknown length: chunked, or ended by closing for HTTP/1.0 clients."""
+        self._chunked = self.request_version != "HTTP/1.0"
+        if self._chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            # HTTP/1.0 has no chunked encoding — the body ends where the connection does
+            self.send_header("Connection", "close")
+
+    def _write_chunks(self, pieces):
+        """Send byte strings as the body _send_stream_framing() announced, coalesced into STREAM_CHUNK_BYTES chunks."""
+        buffered = []
+        size = 0
+        for piece in pieces:
+            if not piece:
+                continue
+            buffered.append(piece)
+            size += len(piece)
+            if size >= STREAM_CHUNK_BYTES:
+                self._write_chunk(b"".join(buffered))
+                buffered = []
+                size = 0
+        if buffered:
+            self._write_chunk(b"".join(buffered))
+        if self._chunked:
+            self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data):
+        if self._chunked:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        else:
+            self.wfile.write(data)
+
+    def _send_json_headers(self, etag):
         self.send_response(200)
         self.send_header("Content-Type", "application/json")
-        self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
+        if etag:
+            # Cacheable, but always revalidated against the current version
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        else:
+            self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
+
+    def _respond_bytes(self, status, body, content_type, etag=None):
+        """Send a complete non-JSON body (images, relayed remote responses)."""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.send_header("Content-Length", str(len(body)))
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.wfile.write(body)
 
-    def _respond_html(self, html):
+    def _send_body_headers(self, body, encoding):
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Content-Length", str(len(body)))
+
+    def _respond_page(self):
+        """Serve HTML_PAGE from its precompressed copies, revalidated by ETag."""
+        if self._not_modified(_PAGE_ETAG):
+            return
+        encoding = _accepted_encoding(self.headers.get("Accept-Encoding"))
+        body = _PAGE_BODIES[encoding]
         self.send_response(200)
         self.send_header("Content-Type", "text/html; charset=utf-8")
-        self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
+        self.send_header("ETag", _PAGE_ETAG)
+        self.send_header("Cache-Control", "no-cache")
+        self._send_body_headers(body, encoding)
         self.end_headers()
-        self.wfile.write(html.encode())
+        self.wfile.write(body)
+
+    def _long_poll_params(self, qs):
+        """Parse ?wait=<version>&timeout=<seconds> of a long-poll request.
 
-    def _add_to_settings(self, settings_file, pattern):
-        """Add an allow pattern to settings.local.json."""
+        Returns (version, timeout), None if wait isn't given, or False after
+        answering 400 to invalid values.
+        """
+        if not qs.get("wait", [""])[0]:
+            return None
         try:
-            if os.path.exists(settings_file):
-                with open(settings_file) as f:
-                    settings = json.load(f)
-            else:
-                settings = {"permissions": {"allow": []}}
-            if "permissions" not in settings:
-                settings["permissions"] = {"allow": []}
-            if "allow" not in settings["permissions"]:
-                settings["permissions"]["allow"] = []
-            if pattern not in settings["permissions"]["allow"]:
-                settings["permissions"]["allow"].append(pattern)
-                with open(settings_file, "w") as f:
-                    json.dump(settings, f, indent=2)
-                    f.write("\n")
-                print(f"[+] Added to allowlist: {pattern}")
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"[!] Failed to update settings: {e}")
+            after = int(qs["wait"][0])
+            timeout = float(qs.get("timeout", [LONG_POLL_DEFAULT])[0])
+        except ValueError:
+            self.send_error(400, "Invalid wait or timeout")
+            return False
+        return after, max(0.0, min(timeout, LONG_POLL_MAX))
+
+    def _not_modified(self, etag):
+        """Answer 304 if the client's If-None-Match has this ETag. Returns True if it did."""
+        if not etag:
+            return False
+        tags = [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]
+        if etag not in tags and "*" not in tags:
+            return False
+        self._send_not_modified(etag)
+        return True
+
+    def _send_not_modified(self, etag):
+        self.send_response(304)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
 
 
 def _restore_sessions_from_terminal_mappings():
@@ -1093,7 +2234,6 @@ def _restore_sessions_from_terminal_mappings():
     if not os.path.isdir(terminals_dir):
         return
 
-    now = time.time()
     for fname in os.listdir(terminals_dir):
         if not fname.endswith(".json"):
             continue
@@ -1132,21 +2272,9 @@ def _restore_sessions_from_terminal_mappings():
         with sessions_lock:
             if session_id in sessions:
                 continue
-            sessions[session_id] = {
-                "transcript_path": transcript_path,
-                "terminal_id": terminal_id,
-                "tmux_socket": "",
-                "cwd": mapping.get("cwd", ""),
-                "registered_at": now,
-                "transcript_offset": 0,
-                "transcript_entries": [],
-                "derived_state": "idle",
-                "last_activity": now,
-                "last_summary": "",
-                "last_user_prompt": "",
-                "slug": "",
-                "custom_title": "",
-            }
+            sessions[session_id] = _new_session(transcript_path, terminal_id, "", mapping.get("cwd", ""))
+            sessions[session_id]["version"] = bump_state_version()
+        _publish_session_added(session_id)
         print(f"[*] Restored session from terminal mapping: {session_id} terminal={terminal_id}")
 
 
@@ -1257,33 +2385,31 @@ def scan_existing_sessions():
                 with sessions_lock:
                     if session_id in sessions:
                         continue
-                    sessions[session_id] = {
-                        "transcript_path": transcript_path,
-                        "terminal_id": pane_id,
-                        "tmux_socket": tmux_socket,
-                        "cwd": cwd,
-                        "registered_at": time.time(),
-                        "transcript_offset": 0,
-                        "transcript_entries": [],
-                        "derived_state": "idle",
-                        "last_activity": time.time(),
-                        "last_summary": "",
-                        "last_user_prompt": "",
-                        "slug": "",
-                        "custom_title": "",
-                    }
+                    sessions[session_id] = _new_session(transcript_path, pane_id, tmux_socket, cwd)
+                    sessions[session_id]["version"] = bump_state_version()
+                _publish_session_added(session_id)
                 print(f"[*] Auto-discovered session: {session_id} terminal={pane_id} cwd={cwd}")
 
 
 def main():
+    global server_name, remote_servers, TRANSCRIPT_WINDOW
     parser = argparse.ArgumentParser(description="Claude Code WebUI Server")
     parser.add_argument("--remotes", help="Path to remotes.json for federation (must be explicitly specified)")
     parser.add_argument("--name", default="local", help="Display name for this machine in the page title (default: local)")
     parser.add_argument("--lan", action="store_true", help="Listen on 0.0.0.0 instead of 127.0.0.1 (allow LAN access)")
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads",
+                        help="Serving engine: worker-pool threads, or asyncio for many idle "
+                             "event-stream/long-poll clients (default: threads)")
+    parser.add_argument("--workers", type=int, default=HTTP_POOLS["fast"][0],
+                        help=f"Worker threads for local requests (default: {HTTP_POOLS['fast'][0]})")
+    parser.add_argument("--slow-workers", type=int, default=HTTP_POOLS["slow"][0],
+                        help=f"Worker threads for requests proxied to remotes (default: {HTTP_POOLS['slow'][0]})")
+    parser.add_argument("--transcript-window", type=int, default=TRANSCRIPT_WINDOW,
+                        help=f"Transcript entries kept in memory per session (default: {TRANSCRIPT_WINDOW})")
     args = parser.parse_args()
 
-    global server_name, remote_servers
     server_name = args.name
+    TRANSCRIPT_WINDOW = max(args.transcript_window, 1)
 
     # Load remotes config
     remotes_path = args.remotes
@@ -1299,14 +2425,30 @@ def main():
 
     os.makedirs(QUEUE_DIR, exist_ok=True)
 
+    try:
+        start_checkpoints()
+    except Exception as e:
+        print(f"[!] Checkpoints disabled: {e}")
+
     # Scan for existing sessions before starting
     try:
         scan_existing_sessions()
     except Exception as e:
         print(f"[!] Session scan failed: {e}")
 
-    # Background threads
-    threading.Thread(target=zombie_cleanup_loop, daemon=True).start()
+    # Background threads (the asyncio engine runs zombie cleanup on its loop)
+    if args.engine == "threads":
+        threading.Thread(target=zombie_cleanup_loop, daemon=True).start()
+    start_remote_followers()
+    threading.Thread(target=transcript_backfill_loop, daemon=True).start()
+    try:
+        start_transcript_watcher()
+    except Exception as e:
+        print(f"[!] Transcript watcher failed to start: {e}")
+    try:
+        start_decision_server()
+    except Exception as e:
+        print(f"[!] Decision socket disabled: {e}")
 
     if _has_feishu:
         try:
@@ -1315,18 +2457,32 @@ def main():
             print(f"[feishu] Failed to start: {e}")
 
     bind_addr = "0.0.0.0" if args.lan else "127.0.0.1"
-    class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
-        daemon_threads = True
-    server = ThreadedHTTPServer((bind_addr, PORT), WebUIHandler)
-    print(f"Claude Code WebUI Server running on http://{bind_addr}:{PORT}")
+    pools = dict(HTTP_POOLS)
+    pools["fast"] = (args.workers, pools["fast"][1])
+    pools["slow"] = (args.slow_workers, pools["slow"][1])
+    if args.engine == "threads":
+        server = PooledHTTPServer((bind_addr, PORT), WebUIHandler, pools, idle_timeout=KEEPALIVE_TIMEOUT)
+    print(f"Claude Code WebUI Server running on http://{bind_addr}:{PORT} ({args.engine} engine)")
     print(f"Watching: {QUEUE_DIR}")
     print("Transcript-driven architecture | Tmux-only prompt delivery")
     print("Press Ctrl+C to stop")
+    # entr -r and systemd stop the server with SIGTERM — shut down cleanly so checkpoints get saved
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     try:
-        server.serve_forever()
+        if args.engine == "asyncio":
+            import async_server
+            # This module runs as __main__ — hand the engine the module itself
+            async_server.run(sys.modules[__name__], bind_addr, PORT, pools, idle_timeout=KEEPALIVE_TIMEOUT)
+        else:
+            server.serve_forever()
     except KeyboardInterrupt:
         print("\nShutting down...")
-        server.server_close()
+        if args.engine == "threads":
+            server.server_close()
+    finally:
+        if decision_server:
+            decision_server.stop()
+        save_checkpoints()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,68 @@
+"""Tests for async_server.py — the asyncio serving engine.
+
+Route behaviour is covered by test_server_http.py, which runs against every engine.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import async_server
+import server
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "QUEUE_DIR", str(tmp_path))
+    monkeypatch.setattr(server, "sessions", {})
+    monkeypatch.setattr(server, "_transcript_watcher_running", lambda: True)
+
+
+async def _with_engine(fn):
+    engine = async_server.AsyncWebUIServer(server, {"fast": (2, 4), "slow": (1, 1)})
+    await engine.start("127.0.0.1", 0)
+    try:
+        return await fn(engine)
+    finally:
+        await engine.close()
+
+
+class TestZombieCleanup:
+    def test_checks_terminals_concurrently_and_removes_dead(self, registry, monkeypatch):
+        server.sessions["alive"] = server._new_session("", "%1", "/tmp/sock", "/a")
+        server.sessions["dead"] = server._new_session("", "%2", "/tmp/sock", "/b")
+        running = []
+
+        async def fake_alive(terminal_id, tmux_socket=""):
+            running.append(terminal_id)
+            await asyncio.sleep(0.05)
+            assert len(running) == 2  # both checks are in flight together
+            return terminal_id == "%1"
+
+        monkeypatch.setattr(async_server, "is_terminal_alive_async", fake_alive)
+        asyncio.run(_with_engine(lambda engine: engine.check_sessions()))
+        assert set(server.sessions) == {"alive"}
+
+
+class TestLongPoll:
+    def test_long_poll_holds_no_thread(self, registry):
+        async def scenario(engine):
+            port = engine.server_address[1]
+            version = server.state_version
+            loop = asyncio.get_running_loop()
+            url = f"http://127.0.0.1:{port}/api/sessions?wait={version}&timeout=10"
+            polls = [loop.run_in_executor(None, lambda: json.loads(urllib.request.urlopen(url, timeout=10).read()))
+                     for _ in range(3)]
+            while engine.stats()["long_polls"] < 3:
+                await asyncio.sleep(0.01)
+            assert all(p["in_flight"] == 0 for p in engine.stats()["pools"].values())
+            await loop.run_in_executor(None, server.bump_state_version)
+            return await asyncio.gather(*polls)
+
+        results = asyncio.run(_with_engine(scenario))
+        assert all(r["version"] > 0 for r in results)
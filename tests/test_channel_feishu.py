@@ -0,0 +1,50 @@
+"""Tests for channel_feishu.py — transcript sync into a session topic."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import channel_feishu
+
+
+@pytest.fixture
+def topic(monkeypatch):
+    sent = []
+    pages = []
+    monkeypatch.setattr(channel_feishu, "_server_get", lambda path: pages.pop(0))
+    monkeypatch.setattr(channel_feishu, "_format_transcript_entry", lambda e: [(f"entry {e['_seq']}", None)])
+    monkeypatch.setattr(channel_feishu, "_reply_post", lambda root, text: sent.append(text))
+    monkeypatch.setattr(channel_feishu, "_reply_markdown_card", lambda root, text: sent.append(text))
+    return {"root_message_id": "m1", "sent_seq": None}, pages, sent
+
+
+def page(seqs, cursor, reset=False):
+    return {"entries": [{"_seq": seq} for seq in seqs], "cursor": cursor, "reset": reset}
+
+
+class TestSyncTranscript:
+    def test_reset_page_skips_entries_already_sent(self, topic):
+        thread, pages, sent = topic
+        pages += [page([10, 20], 30, reset=True), page([30], 40), page([20, 30, 40, 50], 60, reset=True)]
+        for _ in range(3):
+            channel_feishu._sync_transcript("s1", thread)
+        assert sent == ["entry 10", "entry 20", "entry 30", "entry 40", "entry 50"]
+        assert (thread["sent_seq"], thread["cursor"]) == (50, 60)
+
+    def test_seqs_going_backwards_resends_the_tail(self, topic):
+        thread, pages, sent = topic
+        pages += [page([10, 20], 30, reset=True), page([0, 5], 8, reset=True)]
+        channel_feishu._sync_transcript("s1", thread)
+        channel_feishu._sync_transcript("s1", thread)
+        assert sent == ["entry 10", "entry 20", "entry 0", "entry 5"]
+        assert thread["sent_seq"] == 5
+
+    def test_legacy_thread_counts_sent_entries_once(self, topic):
+        thread, pages, sent = topic
+        thread["sent_index"] = 2
+        pages += [page([10, 20, 30], 40, reset=True)]
+        channel_feishu._sync_transcript("s1", thread)
+        assert sent == ["entry 30"]
+        assert "sent_index" not in thread and thread["sent_seq"] == 30
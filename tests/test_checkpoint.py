@@ -0,0 +1,74 @@
+"""Tests for checkpoint.py — persisted transcript parsing progress."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from checkpoint import CheckpointStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = CheckpointStore(str(tmp_path / "checkpoints.sqlite3"))
+    yield s
+    s.close()
+
+
+def _save(store, path, offset):
+    return store.save(str(path), offset, 7, 0, {"count": 2}, b"\x01\x02", "slug", "title")
+
+
+def _load(store, path):
+    with open(path, "rb") as f:
+        return store.load(str(path), f)
+
+
+class TestCheckpointStore:
+    def test_round_trip(self, store, tmp_path):
+        path = tmp_path / "t.jsonl"
+        path.write_text('{"a": 1}\n{"b": 2}\n')
+        assert _save(store, path, 18)
+        cp = _load(store, path)
+        assert cp == {"offset": 18, "seq_base": 7, "backfill": 0, "state": {"count": 2},
+                      "index": b"\x01\x02", "slug": "slug", "custom_title": "title"}
+
+    def test_appended_file_still_matches(self, store, tmp_path):
+        path = tmp_path / "t.jsonl"
+        path.write_text('{"a": 1}\n')
+        _save(store, path, 9)
+        with open(path, "a") as f:
+            f.write('{"b": 2}\n')
+        assert _load(store, path)["offset"] == 9
+
+    def test_truncated_file_is_rejected(self, store, tmp_path):
+        path = tmp_path / "t.jsonl"
+        path.write_text('{"a": 1}\n{"b": 2}\n')
+        _save(store, path, 18)
+        with open(path, "r+") as f:
+            f.truncate(9)
+        assert _load(store, path) is None
+
+    def test_rewritten_head_is_rejected(self, store, tmp_path):
+        path = tmp_path / "t.jsonl"
+        path.write_text('{"a": 1}\n')
+        _save(store, path, 9)
+        with open(path, "r+") as f:
+            f.write('{"z": 1}\n{"b": 2}\n')
+        assert _load(store, path) is None
+
+    def test_missing_file_is_not_saved(self, store, tmp_path):
+        assert not _save(store, tmp_path / "gone.jsonl", 10)
+
+    def test_prune_drops_vanished_transcripts(self, store, tmp_path):
+        kept = tmp_path / "kept.jsonl"
+        gone = tmp_path / "gone.jsonl"
+        for p in (kept, gone):
+            p.write_text('{"a": 1}\n')
+            _save(store, p, 9)
+        gone.unlink()
+        store.prune(set())
+        assert _load(store, kept) is not None
+        rows = store._conn.execute("SELECT path FROM transcripts").fetchall()
+        assert rows == [(str(kept),)]
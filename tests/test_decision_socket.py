@@ -0,0 +1,171 @@
+"""Tests for decision_socket.py and the server's decision socket callbacks."""
+
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import decision_socket
+import server
+from decision_socket import Connection, DecisionServer
+
+pytestmark = pytest.mark.skipif(not decision_socket.supported(), reason="needs Unix domain sockets")
+
+
+class FakeBackend:
+    def __init__(self, answer=None):
+        self.answer = answer
+        self.decisions = {}
+        self.abandoned = []
+
+    def submit(self, request):
+        if request.get("id") == "bad":
+            raise ValueError("Invalid request id")
+        return request["id"], self.answer
+
+    def check(self, request_id):
+        return self.decisions.get(request_id)
+
+    def abandon(self, request_id):
+        self.abandoned.append(request_id)
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = FakeBackend()
+    backend.server = DecisionServer(decision_socket.socket_path(str(tmp_path)),
+                                    backend.submit, backend.check, backend.abandon, recheck=0.05)
+    backend.server.start()
+    yield backend
+    backend.server.stop()
+
+
+def wait_until(predicate, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+class TestDecisionServer:
+    def test_immediate_answer(self, backend):
+        backend.answer = {"decision": "allow"}
+        conn = Connection(backend.server.path)
+        assert conn.submit({"id": "r1"}) == {"decision": "allow"}
+        conn.close()
+
+    def test_queued_request_waits_for_resolve(self, backend):
+        conn = Connection(backend.server.path)
+        assert conn.submit({"id": "r1"}) == {"queued": "r1"}
+        wait_until(lambda: backend.server.waiting() == ["r1"])
+        threading.Timer(0.1, backend.server.resolve, ("r1", {"decision": "deny", "message": "no"})).start()
+        assert conn.wait(5) == {"decision": "deny", "message": "no"}
+        conn.close()
+        wait_until(lambda: backend.server.waiting() == [])
+        assert backend.abandoned == []
+
+    def test_decision_found_by_check(self, backend):
+        conn = Connection(backend.server.path)
+        conn.submit({"id": "r1"})
+        backend.decisions["r1"] = {"decision": "allow"}
+        assert conn.wait(5) == {"decision": "allow"}
+        conn.close()
+
+    def test_wait_times_out(self, backend):
+        conn = Connection(backend.server.path)
+        conn.submit({"id": "r1"})
+        assert conn.wait(0.1) is None
+        conn.close()
+
+    def test_hung_up_hook_abandons_request_once_no_one_waits(self, backend):
+        first, second = Connection(backend.server.path), Connection(backend.server.path)
+        first.submit({"id": "r1"})
+        second.submit({"id": "r1"})  # a duplicate hook joined to the same request
+        first.close()
+        time.sleep(0.2)
+        assert backend.abandoned == []
+        second.close()
+        wait_until(lambda: backend.abandoned == ["r1"])
+
+    def test_rejected_request(self, backend):
+        conn = Connection(backend.server.path)
+        assert conn.submit({"id": "bad"}) == {"error": "Invalid request id"}
+        conn.close()
+
+    def test_stale_socket_is_replaced_live_one_is_not(self, tmp_path):
+        backend = FakeBackend({"decision": "allow"})
+        path = decision_socket.socket_path(str(tmp_path))
+        first = DecisionServer(path, backend.submit, backend.check, backend.abandon)
+        first.start()
+        with pytest.raises(OSError):
+            DecisionServer(path, backend.submit, backend.check, backend.abandon).start()
+        first._sock.close()  # dies without unlinking its socket
+        second = DecisionServer(path, backend.submit, backend.check, backend.abandon)
+        second.start()
+        conn = Connection(path)
+        assert conn.submit({"id": "r1"}) == {"decision": "allow"}
+        conn.close()
+        second.stop()
+        assert not os.path.exists(path)
+
+
+class TestServerDecisionSocket:
+    @pytest.fixture
+    def registry(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(server, "QUEUE_DIR", str(tmp_path))
+        monkeypatch.setattr(server, "sessions", {})
+        monkeypatch.setattr(server, "session_auto_allow", {})
+        monkeypatch.setattr(server, "_transcript_watcher_running", lambda: False)
+        monkeypatch.setattr(server, "decision_server", None)
+        server.start_decision_server()
+        yield tmp_path
+        server.decision_server.stop()
+
+    def request(self, request_id, sid="s1", command="make"):
+        return {"id": request_id, "session_id": sid, "tool_name": "Bash",
+                "tool_input": {"command": command}, "pid": os.getpid()}
+
+    def test_session_rule_answers_at_once(self, registry):
+        server.session_auto_allow[("s1", "Bash")] = True
+        conn = Connection(server.decision_server.path)
+        assert conn.submit(self.request("r1")) == {"decision": "allow"}
+        conn.close()
+        assert not (registry / "r1.request.json").exists()
+
+    def test_rules_are_evaluated_by_the_server(self, registry, tmp_settings_file, tmp_path):
+        tmp_settings_file(["Bash(make:*)"])
+        conn = Connection(server.decision_server.path)
+        assert conn.submit(dict(self.request("r1"), project_dir=str(tmp_path))) == {"decision": "allow"}
+        conn.close()
+        assert not (registry / "r1.request.json").exists()
+
+    def test_request_is_queued_and_answered_by_respond(self, registry):
+        conn = Connection(server.decision_server.path)
+        assert conn.submit(self.request("r1")) == {"queued": "r1"}
+        queued = json.loads((registry / "r1.request.json").read_text())
+        assert (queued["id"], queued["detail"], queued["allow_pattern"]) == ("r1", "make", "Bash(make:*)")
+        assert server._find_pending_request("s1")["id"] == "r1"
+        wait_until(lambda: server.decision_server.waiting() == ["r1"])
+        server.respond_to_requests([{"id": "r1", "decision": "deny", "message": "no"}])
+        assert conn.wait(5) == {"decision": "deny", "message": "no"}
+        conn.close()
+
+    def test_duplicate_request_joins_pending_one(self, registry):
+        first, second = Connection(server.decision_server.path), Connection(server.decision_server.path)
+        assert first.submit(self.request("r1")) == {"queued": "r1"}
+        assert second.submit(self.request("r2")) == {"queued": "r1"}
+        assert not (registry / "r2.request.json").exists()
+        wait_until(lambda: server.decision_server.waiting() == ["r1"])
+        server.respond_to_requests([{"id": "r1", "decision": "allow"}])
+        assert first.wait(5) == second.wait(5) == {"decision": "allow"}
+        first.close()
+        second.close()
+
+    def test_invalid_request_id_is_rejected(self, registry):
+        conn = Connection(server.decision_server.path)
+        assert conn.submit(self.request("../r1")) == {"error": "Invalid request id"}
+        conn.close()
@@ -0,0 +1,105 @@
+"""Tests for file_watcher.py — inotify and polling change notification."""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import file_watcher
+
+
+def _collector():
+    seen = []
+    cond = threading.Condition()
+
+    def on_change(path):
+        with cond:
+            seen.append(path)
+            cond.notify_all()
+
+    def wait_for(path, timeout=3):
+        deadline = time.monotonic() + timeout
+        with cond:
+            while path not in seen:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                cond.wait(remaining)
+            return True
+
+    return seen, on_change, wait_for
+
+
+MODES = [False]
+if file_watcher.inotify_supported():
+    MODES.append(True)
+
+
+@pytest.mark.parametrize("use_inotify", MODES)
+class TestFileWatcher:
+    def test_reports_new_tracked_path_immediately(self, tmp_path, use_inotify):
+        target = tmp_path / "a.jsonl"
+        target.write_text("")
+        seen, on_change, wait_for = _collector()
+        w = file_watcher.FileWatcher(lambda: [str(target)], on_change,
+                                     poll_interval=0.05, reconcile_interval=60,
+                                     use_inotify=use_inotify)
+        w.start()
+        try:
+            assert wait_for(str(target))
+        finally:
+            w.stop()
+
+    def test_reports_appends(self, tmp_path, use_inotify):
+        target = tmp_path / "a.jsonl"
+        other = tmp_path / "b.jsonl"
+        target.write_text("")
+        seen, on_change, wait_for = _collector()
+        w = file_watcher.FileWatcher(lambda: [str(target)], on_change,
+                                     poll_interval=0.05, reconcile_interval=60,
+                                     use_inotify=use_inotify)
+        w.start()
+        try:
+            assert wait_for(str(target))
+            seen.clear()
+            time.sleep(0.1)
+            other.write_text("untracked\n")
+            with open(target, "a") as f:
+                f.write("line\n")
+            assert wait_for(str(target))
+            assert str(other) not in seen
+        finally:
+            w.stop()
+
+    def test_watch_dir_reports_any_entry(self, tmp_path, use_inotify):
+        queue = tmp_path / "queue"
+        queue.mkdir()
+        seen, on_change, wait_for = _collector()
+        w = file_watcher.FileWatcher(lambda: [], on_change, watch_dirs=[str(queue)],
+                                     poll_interval=0.05, reconcile_interval=60,
+                                     use_inotify=use_inotify)
+        w.start()
+        try:
+            time.sleep(0.1)
+            req = queue / "r1.request.json"
+            req.write_text("{}")
+            assert wait_for(str(req))
+            seen.clear()
+            req.unlink()
+            assert wait_for(str(req))
+        finally:
+            w.stop()
+
+    def test_reconcile_tick(self, tmp_path, use_inotify):
+        seen, on_change, wait_for = _collector()
+        w = file_watcher.FileWatcher(lambda: [], on_change,
+                                     poll_interval=0.05, reconcile_interval=0.1,
+                                     use_inotify=use_inotify)
+        w.start()
+        try:
+            assert wait_for(None)
+        finally:
+            w.stop()
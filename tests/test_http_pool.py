@@ -0,0 +1,116 @@
+"""Tests for http_pool.py — worker-pool HTTP serving."""
+
+import http.client
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_pool
+
+
+class _Handler(http_pool.PooledRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = 5
+    release = threading.Event()
+
+    def request_pool(self):
+        return "slow" if self.path.startswith("/slow") else "fast"
+
+    def do_GET(self):
+        if self.path.startswith("/slow"):
+            self.release.wait(5)
+        body = f"{self.path} {threading.current_thread().name}".encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def pooled():
+    _Handler.release = threading.Event()
+    httpd = http_pool.PooledHTTPServer(("127.0.0.1", 0), _Handler,
+                                       {"fast": (2, 4), "slow": (1, 1)}, idle_timeout=0.5)
+    threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    yield httpd
+    _Handler.release.set()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _conn(httpd):
+    return http.client.HTTPConnection(*httpd.server_address, timeout=5)
+
+
+def _get(conn, path):
+    conn.request("GET", path)
+    resp = conn.getresponse()
+    return resp.status, resp.read().decode()
+
+
+def _wait_for(predicate, timeout=3):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestPooledHTTPServer:
+    def test_routes_run_in_their_pool(self, pooled):
+        conn = _conn(pooled)
+        _Handler.release.set()
+        status, body = _get(conn, "/a")
+        assert status == 200 and body.startswith("/a http-fast-")
+        status, body = _get(conn, "/slow")
+        assert body.startswith("/slow http-slow-")
+        # The same connection goes back to the fast pool for the next request
+        status, body = _get(conn, "/b")
+        assert body.startswith("/b http-fast-")
+        conn.close()
+
+    def test_fast_routes_unaffected_by_stuck_slow_pool(self, pooled):
+        stuck = [_conn(pooled) for _ in range(2)]
+        # one slow request runs, the other fills the slow queue
+        stuck[0].request("GET", "/slow")
+        assert _wait_for(lambda: pooled.stats()["pools"]["slow"]["busy"] == 1)
+        stuck[1].request("GET", "/slow")
+        assert _wait_for(lambda: pooled.stats()["pools"]["slow"]["queued"] == 1)
+
+        start = time.monotonic()
+        for i in range(5):
+            assert _get(_conn(pooled), f"/fast{i}")[0] == 200
+        assert time.monotonic() - start < 2
+
+        # Slow pool full: the next slow request is turned away instead of piling up
+        assert _get(_conn(pooled), "/slow")[0] == 503
+        assert pooled.stats()["pools"]["slow"]["rejected"] == 1
+
+        _Handler.release.set()
+        for conn in stuck:
+            assert conn.getresponse().status == 200
+
+    def test_idle_connections_do_not_hold_workers(self, pooled):
+        conns = [_conn(pooled) for _ in range(4)]
+        for conn in conns:
+            assert _get(conn, "/x")[0] == 200
+        # 4 open connections, 2 fast workers — all parked, none busy
+        assert _wait_for(lambda: pooled.stats()["idle_connections"] == 4)
+        assert _wait_for(lambda: pooled.stats()["pools"]["fast"]["busy"] == 0)
+        for conn in conns:
+            assert _get(conn, "/y")[0] == 200
+
+    def test_idle_timeout_closes_connection(self, pooled):
+        conn = _conn(pooled)
+        assert _get(conn, "/x")[0] == 200
+        assert _wait_for(lambda: pooled.stats()["idle_connections"] == 1)
+        assert _wait_for(lambda: pooled.stats()["idle_connections"] == 0)
+        assert conn.sock.recv(1) == b""
@@ -0,0 +1,135 @@
+"""Tests for pending_index.py — the in-memory pending-request index."""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pending_index
+from pending_index import PendingRequestIndex
+
+
+@pytest.fixture
+def queue_dir(tmp_path):
+    return tmp_path
+
+
+def write_request(queue_dir, request_id, sid, **extra):
+    path = os.path.join(queue_dir, f"{request_id}.request.json")
+    data = dict({"id": request_id, "session_id": sid, "tool_name": "Bash", "pid": os.getpid()}, **extra)
+    with open(path, "w") as f:
+        json.dump(data, f)
+    return path
+
+
+def write_response(queue_dir, request_id):
+    path = os.path.join(queue_dir, f"{request_id}.response.json")
+    with open(path, "w") as f:
+        json.dump({"decision": "allow"}, f)
+    return path
+
+
+def dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", ""])
+    proc.wait()
+    return proc.pid
+
+
+class TestPendingRequestIndex:
+    def test_lookups_by_session_and_id(self, queue_dir):
+        write_request(queue_dir, "r1", "s1")
+        write_request(queue_dir, "r2", "s2")
+        index = PendingRequestIndex(str(queue_dir))
+        index.reconcile()
+        assert index.pending_for_session("s1")["id"] == "r1"
+        assert index.pending_for_session("s3") is None
+        assert index.get("r2")["session_id"] == "s2"
+        assert [r["id"] for r in index.pending()] == ["r1", "r2"]
+
+    def test_response_file_answers_request(self, queue_dir):
+        write_request(queue_dir, "r1", "s1")
+        index = PendingRequestIndex(str(queue_dir))
+        index.reconcile()
+        index.update(write_response(queue_dir, "r1"))
+        assert index.pending_for_session("s1") is None
+        assert index.session_request_ids("s1") == ["r1"]  # answered, but still on disk
+
+        os.remove(os.path.join(queue_dir, "r1.response.json"))
+        index.update(os.path.join(queue_dir, "r1.response.json"))
+        assert index.pending_for_session("s1")["id"] == "r1"
+
+    def test_update_tracks_created_and_deleted_files(self, queue_dir):
+        index = PendingRequestIndex(str(queue_dir))
+        index.reconcile()
+        path = write_request(queue_dir, "r1", "s1")
+        index.update(path)
+        assert index.pending_for_session("s1")["id"] == "r1"
+        os.remove(path)
+        index.update(path)
+        assert index.pending_for_session("s1") is None
+        assert index.session_request_ids("s1") == []
+
+    def test_reconcile_only_parses_changed_files(self, queue_dir, monkeypatch):
+        write_request(queue_dir, "r1", "s1")
+        write_request(queue_dir, "r2", "s1")
+        index = PendingRequestIndex(str(queue_dir))
+        index.reconcile()
+        loads = []
+        real_load = pending_index.json.load
+        monkeypatch.setattr(pending_index.json, "load", lambda f: loads.append(f.name) or real_load(f))
+
+        index.reconcile()
+        assert loads == []
+        write_request(queue_dir, "r2", "s2")
+        os.remove(os.path.join(queue_dir, "r1.request.json"))
+        index.reconcile()
+        assert [os.path.basename(p) for p in loads] == ["r2.request.json"]
+        assert index.pending_for_session("s1") is None
+        assert index.pending_for_session("s2")["id"] == "r2"
+
+    def test_unparsable_file_is_retried_once_rewritten(self, queue_dir):
+        path = os.path.join(queue_dir, "r1.request.json")
+        with open(path, "w") as f:
+            f.write('{"id": "r1", ')
+        index = PendingRequestIndex(str(queue_dir))
+        index.reconcile()
+        assert index.pending() == []
+        write_request(queue_dir, "r1", "s1", detail="now complete")
+        index.update(path)
+        assert index.pending_for_session("s1")["detail"] == "now complete"
+
+    def test_orphaned_request_is_removed(self, queue_dir):
+        path = write_request(queue_dir, "r1", "s1", pid=dead_pid())
+        write_request(queue_dir, "r2", "s1")
+        index = PendingRequestIndex(str(queue_dir))
+        index.reconcile()
+        assert index.pending_for_session("s1")["id"] == "r2"
+        assert not os.path.exists(path)
+        assert index.get("r1") is None
+
+    def test_remove_deletes_both_files(self, queue_dir):
+        write_request(queue_dir, "r1", "s1")
+        write_response(queue_dir, "r1")
+        index = PendingRequestIndex(str(queue_dir))
+        index.reconcile()
+        index.remove("r1")
+        assert os.listdir(queue_dir) == []
+        assert index.session_request_ids("s1") == []
+
+    def test_reconcile_reports_changes(self, queue_dir):
+        index = PendingRequestIndex(str(queue_dir))
+        assert index.reconcile() is False
+        write_request(queue_dir, "r1", "s1")
+        assert index.reconcile() is True
+        assert index.reconcile() is False
+        write_response(queue_dir, "r1")
+        assert index.reconcile() is True
+        assert index.reconcile() is False
+        index.remove("r1")
+        write_request(queue_dir, "r2", "s1", pid=dead_pid())
+        assert index.reconcile() is True  # the orphan was found and removed
+        assert os.listdir(queue_dir) == []
+        assert index.reconcile() is False
@@ -1,8 +1,11 @@
-"""Tests for hook-permission-request.py — auto-allow logic, pattern matching, smart rules."""
+"""Tests for permission_rules.py and hook-permission-request.py — auto-allow logic, pattern matching, smart rules."""
 
+import fnmatch
 import json
 import os
 import sys
+import threading
+import time
 
 import importlib.util
 
@@ -21,6 +24,7 @@ def _import_hook(name):
 
 
 hook = _import_hook("hook-permission-request")
+import permission_rules as rules
 
 
 # ── build_detail ──
@@ -28,35 +32,35 @@ hook = _import_hook("hook-permission-request")
 
 class TestBuildDetail:
     def test_bash_simple_command(self):
-        detail, detail_sub, pattern, patterns = hook.build_detail(
+        detail, detail_sub, pattern, patterns = rules.build_detail(
             "Bash", {"command": "git status"}
         )
         assert detail == "git status"
         assert "Bash(git status:*)" in patterns
 
     def test_bash_compound_command(self):
-        detail, detail_sub, pattern, patterns = hook.build_detail(
+        detail, detail_sub, pattern, patterns = rules.build_detail(
             "Bash", {"command": "git add . && git commit -m 'test'"}
         )
         assert "Bash(git add:*)" in patterns
         assert "Bash(git commit:*)" in patterns
 
     def test_bash_pipe(self):
-        _, _, _, patterns = hook.build_detail(
+        _, _, _, patterns = rules.build_detail(
             "Bash", {"command": "cat foo.txt | grep bar"}
         )
         assert "Bash(cat foo.txt:*)" in patterns
         assert "Bash(grep bar:*)" in patterns
 
     def test_write_tool(self):
-        detail, _, pattern, _ = hook.build_detail(
+        detail, _, pattern, _ = rules.build_detail(
             "Write", {"file_path": "/tmp/test.txt"}
         )
         assert detail == "/tmp/test.txt"
         assert pattern == "Write(/tmp/test.txt)"
 
     def test_edit_tool(self):
-        detail, detail_sub, pattern, _ = hook.build_detail(
+        detail, detail_sub, pattern, _ = rules.build_detail(
             "Edit", {"file_path": "/tmp/test.txt", "old_string": "line1\nline2\nline3"}
         )
         assert detail == "/tmp/test.txt"
@@ -64,7 +68,7 @@ class TestBuildDetail:
         assert pattern == "Edit(/tmp/test.txt)"
 
     def test_webfetch_tool(self):
-        detail, detail_sub, pattern, _ = hook.build_detail(
+        detail, detail_sub, pattern, _ = rules.build_detail(
             "WebFetch", {"url": "https://example.com", "prompt": "read it"}
         )
         assert detail == "https://example.com"
@@ -72,21 +76,21 @@ class TestBuildDetail:
         assert pattern == "WebFetch"
 
     def test_websearch_tool(self):
-        detail, _, pattern, _ = hook.build_detail(
+        detail, _, pattern, _ = rules.build_detail(
             "WebSearch", {"query": "python testing"}
         )
         assert detail == "python testing"
         assert pattern == "WebSearch"
 
     def test_unknown_tool(self):
-        detail, _, pattern, _ = hook.build_detail(
+        detail, _, pattern, _ = rules.build_detail(
             "CustomTool", {"key1": "val1", "key2": "val2"}
         )
         assert "key1: val1" in detail
         assert pattern == "CustomTool"
 
     def test_ask_user_question(self):
-        detail, _, pattern, _ = hook.build_detail(
+        detail, _, pattern, _ = rules.build_detail(
             "AskUserQuestion",
             {"questions": [{"question": "Continue?", "options": [{"label": "Yes", "description": "proceed"}]}]},
         )
@@ -95,7 +99,7 @@ class TestBuildDetail:
         assert pattern == "AskUserQuestion"
 
     def test_exit_plan_mode(self):
-        detail, detail_sub, pattern, _ = hook.build_detail(
+        detail, detail_sub, pattern, _ = rules.build_detail(
             "ExitPlanMode",
             {"plan": "My plan", "allowedPrompts": [{"tool": "Bash", "prompt": "ls"}]},
         )
@@ -104,33 +108,37 @@ class TestBuildDetail:
         assert pattern == "ExitPlanMode"
 
 
-# ── _match_allow_pattern ──
+# ── Allow pattern matching ──
+
+
+def _allows(tool_name, detail, pattern):
+    return rules.AllowRules([pattern]).matches(tool_name, detail)
 
 
 class TestMatchAllowPattern:
     def test_exact_tool_name(self):
-        assert hook._match_allow_pattern("Read", "anything", "Read") is True
+        assert _allows("Read", "anything", "Read") is True
 
     def test_tool_name_mismatch(self):
-        assert hook._match_allow_pattern("Read", "anything", "Write") is False
+        assert _allows("Read", "anything", "Write") is False
 
     def test_glob_with_colon_star(self):
-        assert hook._match_allow_pattern("Bash", "git status", "Bash(git status:*)") is True
+        assert _allows("Bash", "git status", "Bash(git status:*)") is True
 
     def test_glob_prefix_match(self):
-        assert hook._match_allow_pattern("Bash", "git commit -m 'test'", "Bash(git commit:*)") is True
+        assert _allows("Bash", "git commit -m 'test'", "Bash(git commit:*)") is True
 
     def test_glob_no_match(self):
-        assert hook._match_allow_pattern("Bash", "rm -rf /", "Bash(git:*)") is False
+        assert _allows("Bash", "rm -rf /", "Bash(git:*)") is False
 
     def test_write_path_pattern(self):
-        assert hook._match_allow_pattern("Write", "/home/user/proj/foo.py", "Write(/home/user/proj/*)") is True
+        assert _allows("Write", "/home/user/proj/foo.py", "Write(/home/user/proj/*)") is True
 
     def test_write_path_outside(self):
-        assert hook._match_allow_pattern("Write", "/etc/passwd", "Write(/home/user/proj/*)") is False
+        assert _allows("Write", "/etc/passwd", "Write(/home/user/proj/*)") is False
 
     def test_empty_pattern(self):
-        assert hook._match_allow_pattern("Bash", "ls", "") is False
+        assert _allows("Bash", "ls", "") is False
 
 
 # ── _is_readonly_bash ──
@@ -138,70 +146,70 @@ class TestMatchAllowPattern:
 
 class TestIsReadonlyBash:
     def test_simple_readonly(self):
-        assert hook._is_readonly_bash("ls -la") is True
+        assert rules._is_readonly_bash("ls -la") is True
 
     def test_cat_file(self):
-        assert hook._is_readonly_bash("cat foo.txt") is True
+        assert rules._is_readonly_bash("cat foo.txt") is True
 
     def test_grep_search(self):
-        assert hook._is_readonly_bash("grep -r 'pattern' .") is True
+        assert rules._is_readonly_bash("grep -r 'pattern' .") is True
 
     def test_git_log(self):
-        assert hook._is_readonly_bash("git log --oneline") is True
+        assert rules._is_readonly_bash("git log --oneline") is True
 
     def test_git_status(self):
-        assert hook._is_readonly_bash("git status") is True
+        assert rules._is_readonly_bash("git status") is True
 
     def test_git_diff(self):
-        assert hook._is_readonly_bash("git diff HEAD") is True
+        assert rules._is_readonly_bash("git diff HEAD") is True
 
     def test_dangerous_rm(self):
-        assert hook._is_readonly_bash("rm -rf /tmp/foo") is False
+        assert rules._is_readonly_bash("rm -rf /tmp/foo") is False
 
     def test_dangerous_curl(self):
-        assert hook._is_readonly_bash("curl https://example.com") is False
+        assert rules._is_readonly_bash("curl https://example.com") is False
 
     def test_dangerous_sudo(self):
-        assert hook._is_readonly_bash("sudo apt install foo") is False
+        assert rules._is_readonly_bash("sudo apt install foo") is False
 
     def test_compound_all_readonly(self):
-        assert hook._is_readonly_bash("ls -la && cat foo.txt | grep bar") is True
+        assert rules._is_readonly_bash("ls -la && cat foo.txt | grep bar") is True
 
     def test_compound_with_dangerous(self):
-        assert hook._is_readonly_bash("ls -la && rm foo.txt") is False
+        assert rules._is_readonly_bash("ls -la && rm foo.txt") is False
 
     def test_pipe_all_readonly(self):
-        assert hook._is_readonly_bash("cat file | head -20 | wc -l") is True
+        assert rules._is_readonly_bash("cat file | head -20 | wc -l") is True
 
     def test_git_push_not_readonly(self):
-        assert hook._is_readonly_bash("git push origin main") is False
+        assert rules._is_readonly_bash("git push origin main") is False
 
     def test_git_commit_not_readonly(self):
-        assert hook._is_readonly_bash("git commit -m 'msg'") is False
+        assert rules._is_readonly_bash("git commit -m 'msg'") is False
 
     def test_sed_inplace_not_readonly(self):
-        assert hook._is_readonly_bash("sed -i 's/foo/bar/' file.txt") is False
+        assert rules._is_readonly_bash("sed -i 's/foo/bar/' file.txt") is False
 
     def test_sed_without_inplace_is_readonly(self):
-        assert hook._is_readonly_bash("sed 's/foo/bar/' file.txt") is True
+        assert rules._is_readonly_bash("sed 's/foo/bar/' file.txt") is True
 
     def test_empty_command(self):
-        assert hook._is_readonly_bash("") is True
+        assert rules._is_readonly_bash("") is True
 
     def test_unknown_command_not_readonly(self):
-        assert hook._is_readonly_bash("my-custom-script.sh") is False
+        assert rules._is_readonly_bash("my-custom-script.sh") is False
 
     def test_semicolon_separator(self):
-        assert hook._is_readonly_bash("ls; cat foo") is True
+        assert rules._is_readonly_bash("ls; cat foo") is True
 
     def test_or_separator(self):
-        assert hook._is_readonly_bash("cat foo || echo fallback") is True
+        assert rules._is_readonly_bash("cat foo || echo fallback") is True
 
     def test_echo_is_readonly(self):
-        assert hook._is_readonly_bash("echo hello") is True
+        assert rules._is_readonly_bash("echo hello") is True
 
     def test_python_is_readonly(self):
-        assert hook._is_readonly_bash("python3 --version") is True
+        assert rules._is_readonly_bash("python3 --version") is True
 
 
 # ── _is_project_file ──
@@ -212,29 +220,84 @@ class TestIsProjectFile:
         project = str(tmp_path / "project")
         os.makedirs(project)
         filepath = os.path.join(project, "src", "main.py")
-        assert hook._is_project_file(filepath, project) is True
+        assert rules._is_project_file(filepath, project) is True
 
     def test_file_is_project_root(self, tmp_path):
         project = str(tmp_path / "project")
         os.makedirs(project)
-        assert hook._is_project_file(project, project) is True
+        assert rules._is_project_file(project, project) is True
 
     def test_file_outside_project(self, tmp_path):
         project = str(tmp_path / "project")
         os.makedirs(project)
-        assert hook._is_project_file("/etc/passwd", project) is False
+        assert rules._is_project_file("/etc/passwd", project) is False
 
     def test_empty_path(self):
-        assert hook._is_project_file("", "/home/user") is False
+        assert rules._is_project_file("", "/home/user") is False
 
     def test_empty_project(self):
-        assert hook._is_project_file("/home/user/file.py", "") is False
+        assert rules._is_project_file("/home/user/file.py", "") is False
 
     def test_path_traversal(self, tmp_path):
         project = str(tmp_path / "project")
         os.makedirs(project)
         outside = os.path.join(project, "..", "secret.txt")
-        assert hook._is_project_file(outside, project) is False
+        assert rules._is_project_file(outside, project) is False
+
+
+# ── AllowRules ──
+
+
+class TestAllowRules:
+    PATTERNS = [
+        "Read", "WebSearch", "Bash(git status:*)", "Bash(git commit:*)", "Bash(npm run build)",
+        "Bash(make*test)", "Bash(ls -l?)", "Bash(cat [ab].txt)", "Bash(echo [x)", "Bash()",
+        "Write(/home/user/proj/*)", "Edit(/home/user/*/notes.md)", "mcp__acp__Bash(git:*)", "Bash(oops",
+        "Read(*.py)", "Glob(/home/user/*)", "Write(/home/user/proj/a.py)",
+    ]
+    DETAILS = [
+        "", "git status", "git status --short", "git commit -m 'x'", "git", "npm run build",
+        "npm run build:prod", "make test", "make unit-test", "make", "ls -la", "ls -l", "cat a.txt",
+        "cat c.txt", "echo [x", "oops", "/home/user/proj/a.py", "/home/user/other/notes.md",
+        "/home/user/proj/sub/dir/notes.md", "anything\nwith newline",
+    ]
+
+    @staticmethod
+    def fnmatch_allows(tool_name, detail, pattern):
+        """Reference: one pattern checked on its own with plain fnmatch."""
+        if pattern == tool_name:
+            return True
+        prefix = f"{tool_name}("
+        if pattern.startswith(prefix) and pattern.endswith(")"):
+            return fnmatch.fnmatch(detail, pattern[len(prefix):-1].replace(":*", "*"))
+        return False
+
+    def test_matches_like_plain_fnmatch(self):
+        compiled = rules.AllowRules(self.PATTERNS)
+        for tool in ("Bash", "mcp__acp__Bash", "Read", "Write", "Edit", "WebSearch", "Glob"):
+            for detail in self.DETAILS:
+                expected = any(self.fnmatch_allows(tool, detail, p) for p in self.PATTERNS)
+                assert compiled.matches(tool, detail) is expected, (tool, detail)
+
+    def test_each_pattern_alone_matches_like_plain_fnmatch(self):
+        for pattern in self.PATTERNS:
+            compiled = rules.AllowRules([pattern])
+            for tool in ("Bash", "mcp__acp__Bash", "Read", "Write", "Edit", "Glob"):
+                for detail in self.DETAILS:
+                    expected = self.fnmatch_allows(tool, detail, pattern)
+                    assert compiled.matches(tool, detail) is expected, (pattern, tool, detail)
+
+    def test_large_allow_list(self):
+        patterns = [f"Bash(tool{i} sub{i}:*)" for i in range(500)] + ["Bash(*deploy*)"]
+        compiled = rules.AllowRules(patterns)
+        assert compiled.matches("Bash", "tool499 sub499 --flag")
+        assert compiled.matches("Bash", "ci deploy prod")
+        assert not compiled.matches("Bash", "tool499 sub498")
+
+    def test_empty(self):
+        assert not rules.AllowRules([])
+        assert not rules.AllowRules(["", None, 3])
+        assert rules.AllowRules(["Bash(ls:*)"])
 
 
 # ── check_auto_allow ──
@@ -243,39 +306,51 @@ class TestIsProjectFile:
 class TestCheckAutoAllow:
     def test_matching_pattern(self, tmp_settings_file):
         settings = tmp_settings_file(["Bash(git commit:*)"])
-        assert hook.check_auto_allow("Bash", "git commit -m 'test'", settings) is True
+        assert rules.check_auto_allow("Bash", "git commit -m 'test'", settings) is True
 
     def test_no_matching_pattern(self, tmp_settings_file):
         settings = tmp_settings_file(["Bash(git commit:*)"])
-        assert hook.check_auto_allow("Bash", "rm -rf /", settings) is False
+        assert rules.check_auto_allow("Bash", "rm -rf /", settings) is False
 
     def test_blanket_tool_allow(self, tmp_settings_file):
         settings = tmp_settings_file(["Read"])
-        assert hook.check_auto_allow("Read", "/any/path", settings) is True
+        assert rules.check_auto_allow("Read", "/any/path", settings) is True
 
     def test_missing_settings_file(self):
-        assert hook.check_auto_allow("Read", "x", "/nonexistent/settings.json") is False
+        assert rules.check_auto_allow("Read", "x", "/nonexistent/settings.json") is False
 
     def test_empty_allow_list(self, tmp_settings_file):
         settings = tmp_settings_file([])
-        assert hook.check_auto_allow("Read", "x", settings) is False
+        assert rules.check_auto_allow("Read", "x", settings) is False
 
     def test_compound_bash_all_allowed(self, tmp_settings_file):
         settings = tmp_settings_file(["Bash(git:*)", "Bash(echo:*)"])
-        assert hook.check_auto_allow("Bash", "git status && echo done", settings) is True
+        assert rules.check_auto_allow("Bash", "git status && echo done", settings) is True
 
     def test_compound_bash_partial_not_allowed(self, tmp_settings_file):
         settings = tmp_settings_file(["Bash(git:*)"])
-        assert hook.check_auto_allow("Bash", "git status && rm foo", settings) is False
+        assert rules.check_auto_allow("Bash", "git status && rm foo", settings) is False
 
     def test_write_path_pattern(self, tmp_settings_file):
         settings = tmp_settings_file(["Write(/home/user/proj/*)"])
-        assert hook.check_auto_allow("Write", "/home/user/proj/src/main.py", settings) is True
+        assert rules.check_auto_allow("Write", "/home/user/proj/src/main.py", settings) is True
 
     def test_invalid_json(self, tmp_path):
         bad = tmp_path / "bad.json"
         bad.write_text("not json")
-        assert hook.check_auto_allow("Read", "x", str(bad)) is False
+        assert rules.check_auto_allow("Read", "x", str(bad)) is False
+
+    def test_settings_compiled_once_per_change(self, tmp_settings_file, monkeypatch):
+        settings = tmp_settings_file(["Bash(git:*)"])
+        loads = []
+        real_load = rules.json.load
+        monkeypatch.setattr(rules.json, "load", lambda f: loads.append(f.name) or real_load(f))
+        assert rules.check_auto_allow("Bash", "git status", settings) is True
+        assert rules.check_auto_allow("Bash", "git log", settings) is True
+        assert len(loads) == 1
+        tmp_settings_file(["Bash(make:*)", "Read"])
+        assert rules.check_auto_allow("Bash", "git status", settings) is False
+        assert len(loads) == 2
 
 
 # ── check_smart_auto_approve ──
@@ -283,35 +358,200 @@ class TestCheckAutoAllow:
 
 class TestCheckSmartAutoApprove:
     def test_readonly_tool(self):
-        assert hook.check_smart_auto_approve("Read", {}, "/any") is True
-        assert hook.check_smart_auto_approve("Glob", {}, "/any") is True
-        assert hook.check_smart_auto_approve("Grep", {}, "/any") is True
+        assert rules.check_smart_auto_approve("Read", {}, "/any") is True
+        assert rules.check_smart_auto_approve("Glob", {}, "/any") is True
+        assert rules.check_smart_auto_approve("Grep", {}, "/any") is True
 
     def test_readonly_bash(self):
-        assert hook.check_smart_auto_approve("Bash", {"command": "ls -la"}, "/any") is True
+        assert rules.check_smart_auto_approve("Bash", {"command": "ls -la"}, "/any") is True
 
     def test_dangerous_bash(self):
-        assert hook.check_smart_auto_approve("Bash", {"command": "rm foo"}, "/any") is False
+        assert rules.check_smart_auto_approve("Bash", {"command": "rm foo"}, "/any") is False
 
     def test_write_inside_project(self, tmp_path):
         project = str(tmp_path)
         filepath = os.path.join(project, "src", "main.py")
-        assert hook.check_smart_auto_approve("Write", {"file_path": filepath}, project) is True
+        assert rules.check_smart_auto_approve("Write", {"file_path": filepath}, project) is True
 
     def test_write_outside_project(self, tmp_path):
         project = str(tmp_path)
-        assert hook.check_smart_auto_approve("Write", {"file_path": "/etc/passwd"}, project) is False
+        assert rules.check_smart_auto_approve("Write", {"file_path": "/etc/passwd"}, project) is False
 
     def test_edit_inside_project(self, tmp_path):
         project = str(tmp_path)
         filepath = os.path.join(project, "foo.py")
-        assert hook.check_smart_auto_approve("Edit", {"file_path": filepath}, project) is True
+        assert rules.check_smart_auto_approve("Edit", {"file_path": filepath}, project) is True
 
     def test_unknown_tool(self):
-        assert hook.check_smart_auto_approve("CustomTool", {}, "/any") is False
+        assert rules.check_smart_auto_approve("CustomTool", {}, "/any") is False
 
     def test_bash_empty_command(self):
-        assert hook.check_smart_auto_approve("Bash", {"command": ""}, "/any") is False
+        assert rules.check_smart_auto_approve("Bash", {"command": ""}, "/any") is False
 
     def test_bash_string_input(self):
-        assert hook.check_smart_auto_approve("Bash", "not a dict", "/any") is False
+        assert rules.check_smart_auto_approve("Bash", "not a dict", "/any") is False
+
+
+# ── evaluate ──
+
+
+class TestEvaluate:
+    def test_tiers(self, tmp_settings_file, tmp_path):
+        tmp_settings_file(["Bash(make:*)"])
+        project = str(tmp_path)
+        assert rules.evaluate("Bash", {"command": "make test"}, project)["tier"] == "settings"
+        assert rules.evaluate("Bash", {"command": "ls"}, project)["tier"] == "smart"
+        assert rules.evaluate("Bash", {"command": "tmux send-keys -t %1 x"}, project)["tier"] == "tmux"
+
+    def test_ask_carries_request_fields(self, tmp_settings_file, tmp_path):
+        settings = tmp_settings_file([])
+        verdict = rules.evaluate("Bash", {"command": "rm -rf build && make"}, str(tmp_path))
+        assert verdict["decision"] == "ask" and verdict["tier"] is None
+        assert verdict["detail"] == "rm -rf build && make"
+        assert verdict["allow_patterns"] == ["Bash(rm build:*)", "Bash(make:*)"]
+        assert verdict["settings_file"] == settings
+        assert set(rules.REQUEST_FIELDS) <= set(verdict)
+
+    def test_without_project_dir(self):
+        verdict = rules.evaluate("Write", {"file_path": "/tmp/x"}, "")
+        assert verdict["decision"] == "ask" and verdict["settings_file"] == ""
+
+
+# ── evaluate_on_server ──
+
+
+class TestEvaluateOnServer:
+    @pytest.fixture
+    def status(self, monkeypatch):
+        """Serve /api/evaluate with the status code the test sets."""
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+        answer = {"code": 200}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                body = json.dumps({"decision": "allow", "tier": "session"}).encode()
+                self.send_response(answer["code"])
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        httpd = HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        monkeypatch.setattr(hook, "SERVER", f"http://127.0.0.1:{httpd.server_address[1]}")
+        yield answer
+        httpd.shutdown()
+        httpd.server_close()
+
+    def test_server_verdict(self, status, tmp_path):
+        verdict = hook.evaluate_on_server("Bash", {"command": "rm x"}, str(tmp_path), "s1")
+        assert verdict == {"decision": "allow", "tier": "session"}
+
+    def test_server_without_endpoint_evaluates_locally(self, status, tmp_settings_file, tmp_path):
+        tmp_settings_file(["Bash(make:*)"])
+        status["code"] = 404
+        verdict = hook.evaluate_on_server("Bash", {"command": "make test"}, str(tmp_path), "s1")
+        assert (verdict["decision"], verdict["tier"]) == ("allow", "settings")
+
+    def test_server_error_counts_as_offline(self, status, tmp_settings_file, tmp_path):
+        tmp_settings_file(["Bash(make:*)"])
+        status["code"] = 500
+        assert hook.evaluate_on_server("Bash", {"command": "make test"}, str(tmp_path), "s1") is None
+
+
+# ── wait_for_response ──
+
+
+class TestWaitForResponse:
+    @pytest.fixture
+    def queue(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(hook, "QUEUE_DIR", str(tmp_path))
+        return tmp_path
+
+    def _answer_later(self, path, delay, content='{"decision": "allow"}'):
+        def write():
+            time.sleep(delay)
+            with open(path, "w") as f:
+                f.write(content)
+        t = threading.Thread(target=write)
+        t.start()
+        return t
+
+    @pytest.mark.parametrize("inotify", [True, False])
+    def test_returns_once_response_is_written(self, queue, monkeypatch, inotify):
+        if not inotify:
+            monkeypatch.setattr(hook, "_open_queue_watch", lambda: None)
+        elif not sys.platform.startswith("linux"):
+            pytest.skip("inotify is Linux-only")
+        monkeypatch.setattr(hook, "POLL_INTERVAL", 0.05)
+        monkeypatch.setattr(hook, "WATCH_RECHECK", 10)  # an inotify wait must not fall back to the recheck
+        path = str(queue / "r1.response.json")
+        writer = self._answer_later(path, 0.2)
+        start = time.monotonic()
+        assert hook.wait_for_response(path, timeout=5) == {"decision": "allow"}
+        assert time.monotonic() - start < 1
+        writer.join()
+
+    def test_partial_response_is_not_read(self, queue):
+        path = queue / "r1.response.json"
+        path.write_text('{"decision": ')
+        writer = self._answer_later(str(path), 0.1, '{"decision": "deny", "message": "no"}')
+        assert hook.wait_for_response(str(path), timeout=5) == {"decision": "deny", "message": "no"}
+        writer.join()
+
+    def test_timeout_is_in_seconds(self, queue, monkeypatch):
+        monkeypatch.setattr(hook, "_open_queue_watch", lambda: None)
+        monkeypatch.setattr(hook, "POLL_INTERVAL", 0.05)
+        start = time.monotonic()
+        assert hook.wait_for_response(str(queue / "r1.response.json"), timeout=0.3) is None
+        assert 0.3 <= time.monotonic() - start < 1
+
+
+# ── submit_to_server ──
+
+
+@pytest.mark.skipif(not hook.decision_socket.supported(), reason="needs Unix domain sockets")
+class TestSubmitToServer:
+    @pytest.fixture
+    def queue(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(hook, "QUEUE_DIR", str(tmp_path))
+        return tmp_path
+
+    def _serve(self, queue, submit):
+        server = hook.decision_socket.DecisionServer(
+            hook.decision_socket.socket_path(str(queue)), submit, lambda rid: None, lambda rid: None)
+        server.start()
+        return server
+
+    def test_decision_is_passed_to_respond(self, queue):
+        server = self._serve(queue, lambda request: (request["id"], None))
+        answers = []
+        threading.Timer(0.2, server.resolve, ("r1", {"decision": "allow"})).start()
+        assert hook.submit_to_server({"id": "r1"}, lambda resp, message: answers.append(resp)) == "r1"
+        assert answers == [{"decision": "allow"}]
+        server.stop()
+
+    def test_connection_lost_after_queuing_returns_queued_id(self, queue):
+        import socket
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(hook.decision_socket.socket_path(str(queue)))
+        listener.listen(1)
+
+        def queue_then_crash():
+            conn, _ = listener.accept()
+            conn.makefile("rb").readline()
+            conn.sendall(b'{"queued": "r0"}\n')
+            conn.close()
+        t = threading.Thread(target=queue_then_crash)
+        t.start()
+        answers = []
+        assert hook.submit_to_server({"id": "r1"}, lambda resp, message: answers.append(resp)) == "r0"
+        assert answers == []
+        t.join()
+        listener.close()
+
+    def test_without_server_falls_back(self, queue):
+        assert hook.submit_to_server({"id": "r1"}, lambda resp, message: pytest.fail("no answer expected")) is None
@@ -1,5 +1,6 @@
 """Tests for platform_utils.py — path encoding, directory helpers, process checks."""
 
+import asyncio
 import os
 import sys
 import unittest.mock as mock
@@ -70,3 +71,29 @@ class TestIsProcessAlive:
     def test_parent_process_is_alive(self):
         # Parent process should be alive
         assert platform_utils.is_process_alive(os.getppid()) is True
+
+
+class TestIsTerminalAliveAsync:
+    def _fake_commands(self, monkeypatch, outputs):
+        async def fake_run(cmd, timeout=3):
+            return outputs[cmd[0]] if cmd[0] != "ps" else outputs["ps"][cmd[2]]
+        monkeypatch.setattr(platform_utils, "_run_async", fake_run)
+
+    @mock.patch.object(platform_utils, "IS_WINDOWS", False)
+    def test_pane_with_claude_child(self, monkeypatch):
+        self._fake_commands(monkeypatch, {
+            "tmux": "%1 100\n%2 200\n",
+            "pgrep": "201\n202\n",
+            "ps": {"201": "bash\n", "202": "/usr/bin/claude\n"},
+        })
+        assert asyncio.run(platform_utils.is_terminal_alive_async("%2", "/tmp/tmux-0/default,1,0"))
+
+    @mock.patch.object(platform_utils, "IS_WINDOWS", False)
+    def test_unknown_pane(self, monkeypatch):
+        self._fake_commands(monkeypatch, {"tmux": "%1 100\n", "pgrep": "", "ps": {}})
+        assert not asyncio.run(platform_utils.is_terminal_alive_async("%9", "/tmp/tmux-0/default"))
+
+    @mock.patch.object(platform_utils, "IS_WINDOWS", False)
+    def test_missing_tmux(self):
+        assert not asyncio.run(platform_utils.is_terminal_alive_async("%1", "/nonexistent/socket"))
+        assert not asyncio.run(platform_utils.is_terminal_alive_async("%1", ""))
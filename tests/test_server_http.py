@@ -0,0 +1,551 @@
+"""End-to-end tests for server.py HTTP endpoints on a real socket."""
+
+import asyncio
+import gzip
+import http.client
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import urllib.request
+import zlib
+from http.server import HTTPServer
+from socketserver import ThreadingMixIn
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import async_server
+import server
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture(params=["threads", "pool", "asyncio"])
+def base_url(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "QUEUE_DIR", str(tmp_path / "queue"))
+    os.makedirs(server.QUEUE_DIR)
+    monkeypatch.setattr(server, "sessions", {})
+    if request.param == "asyncio":
+        engine = async_server.AsyncWebUIServer(server, {"fast": (2, 8), "slow": (2, 8)})
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        asyncio.run_coroutine_threadsafe(engine.start("127.0.0.1", 0), loop).result()
+        yield f"http://127.0.0.1:{engine.server_address[1]}"
+        asyncio.run_coroutine_threadsafe(engine.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        return
+    if request.param == "pool":
+        httpd = server.PooledHTTPServer(("127.0.0.1", 0), server.WebUIHandler,
+                                        {"fast": (2, 8), "slow": (2, 8), "stream": (4, 4)})
+    else:
+        httpd = _Server(("127.0.0.1", 0), server.WebUIHandler)
+    threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def watcher_running(monkeypatch):
+    monkeypatch.setattr(server, "_transcript_watcher_running", lambda: True)
+
+
+def _read_event(resp):
+    """Read one SSE event (skipping comments) as (kind, data)."""
+    kind = data = None
+    while True:
+        line = resp.readline().decode().rstrip("\n")
+        if line.startswith("event: "):
+            kind = line[7:]
+        elif line.startswith("data: "):
+            data = json.loads(line[6:])
+        elif not line and kind:
+            return kind, data
+
+
+class TestEventStream:
+    def test_unavailable_without_watcher(self, base_url):
+        with pytest.raises(urllib.error.HTTPError) as exc:
+            urllib.request.urlopen(base_url + "/api/events", timeout=5)
+        assert exc.value.code == 503
+
+    def test_streams_published_events(self, base_url, watcher_running):
+        resp = urllib.request.urlopen(base_url + "/api/events", timeout=5)
+        assert resp.headers["Content-Type"] == "text/event-stream"
+        # Both engines subscribe before sending the response head
+        server.publish_event("session_removed", {"session_id": "s1"})
+        assert _read_event(resp) == ("session_removed", {"session_id": "s1"})
+        resp.close()
+
+
+class TestSessionDetail:
+    def test_local_session(self, base_url, tmp_path):
+        transcript = tmp_path / "t.jsonl"
+        transcript.write_text(json.dumps({"type": "user", "message": {"content": "hello"}}) + "\n")
+        server.sessions["s1"] = server._new_session(str(transcript), "%1", "", "/work/proj")
+        server.sessions["s2"] = server._new_session("", "", "", "/other")
+
+        with urllib.request.urlopen(base_url + "/api/session/s1", timeout=5) as resp:
+            data = json.loads(resp.read())
+        assert data["session_id"] == "s1"
+        assert data["state"] == "busy"
+        assert data["last_user_prompt"] == "hello"
+        assert data["transcript_cursor"] == server.sessions["s1"]["transcript_offset"]
+        assert data["prompt_capable"] is True
+        # Only the requested session was refreshed
+        assert server.sessions["s2"]["transcript_state"].count == 0
+
+    def test_unknown_session(self, base_url):
+        with pytest.raises(urllib.error.HTTPError) as exc:
+            urllib.request.urlopen(base_url + "/api/session/nope", timeout=5)
+        assert exc.value.code == 404
+
+    def test_remote_session_is_proxied(self, base_url, monkeypatch):
+        calls = []
+
+        def fake_proxy(url, path, *args, **kwargs):
+            calls.append((url, path))
+            return 200, json.dumps({"session_id": "abc", "state": "idle"}).encode(), "application/json"
+
+        monkeypatch.setattr(server, "proxy_to_remote", fake_proxy)
+        monkeypatch.setattr(server, "remote_servers", [{"name": "box", "url": "http://box:19836"}])
+        monkeypatch.setitem(server.session_machine_map, "box:abc", "http://box:19836")
+
+        with urllib.request.urlopen(base_url + "/api/session/box:abc", timeout=5) as resp:
+            data = json.loads(resp.read())
+        assert calls == [("http://box:19836", "/api/session/abc")]
+        assert data == {"session_id": "box:abc", "_remote_session_id": "abc", "state": "idle", "machine": "box"}
+
+
+def _get(url, etag=None):
+    """GET url, optionally revalidating. Returns (status, etag, body or None)."""
+    req = urllib.request.Request(url)
+    if etag:
+        req.add_header("If-None-Match", etag)
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status, resp.headers.get("ETag"), json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        if e.code != 304:
+            raise
+        return 304, e.headers.get("ETag"), None
+
+
+class TestConditionalGet:
+    def _session(self, tmp_path):
+        transcript = tmp_path / "t.jsonl"
+        transcript.write_text(json.dumps({"type": "user", "message": {"content": "hello"}}) + "\n")
+        server.sessions["s1"] = server._new_session(str(transcript), "%1", "", "/work/proj")
+        return transcript
+
+    def test_sessions_not_modified_until_state_changes(self, base_url, watcher_running):
+        status, etag, body = _get(base_url + "/api/sessions")
+        assert status == 200 and etag and body["sessions"] == []
+        assert _get(base_url + "/api/sessions", etag) == (304, etag, None)
+
+        server.sessions["s1"] = server._new_session("", "%1", "", "/work/proj")
+        server.remove_zombie_sessions([("s1", server.sessions["s1"])])
+        status, new_etag, _ = _get(base_url + "/api/sessions", etag)
+        assert status == 200 and new_etag != etag
+
+    def test_sessions_polling_mode_tracks_transcript(self, base_url, tmp_path):
+        transcript = self._session(tmp_path)
+        status, etag, _ = _get(base_url + "/api/sessions")
+        assert status == 200
+        assert _get(base_url + "/api/sessions", etag)[0] == 304
+
+        with open(transcript, "a") as f:
+            f.write(json.dumps({"type": "assistant", "message": {
+                "content": [{"type": "text", "text": "hi"}], "stop_reason": "end_turn"}}) + "\n")
+        status, _, body = _get(base_url + "/api/sessions", etag)
+        assert status == 200
+        assert body["sessions"][0]["state"] == "idle"
+
+    def test_pending_only_validated_with_watcher(self, base_url, watcher_running, monkeypatch):
+        status, etag, _ = _get(base_url + "/api/pending")
+        assert status == 200 and etag
+        assert _get(base_url + "/api/pending", etag)[0] == 304
+        server.bump_pending_version()
+        assert _get(base_url + "/api/pending", etag)[0] == 200
+
+        monkeypatch.setattr(server, "_transcript_watcher_running", lambda: False)
+        assert _get(base_url + "/api/pending")[1] is None
+
+    def test_detail_and_transcript(self, base_url, tmp_path):
+        transcript = self._session(tmp_path)
+        status, detail_etag, _ = _get(base_url + "/api/session/s1")
+        assert status == 200
+        assert _get(base_url + "/api/session/s1", detail_etag)[0] == 304
+        status, t_etag, body = _get(base_url + "/api/session/s1/transcript")
+        assert status == 200 and len(body["entries"]) == 1
+        assert _get(base_url + "/api/session/s1/transcript", t_etag)[0] == 304
+
+        with open(transcript, "a") as f:
+            f.write(json.dumps({"type": "user", "message": {"content": "again"}}) + "\n")
+        assert _get(base_url + "/api/session/s1", detail_etag)[0] == 200
+        status, _, body = _get(base_url + "/api/session/s1/transcript", t_etag)
+        assert status == 200 and len(body["entries"]) == 2
+
+    def test_transcript_tag_does_not_survive_restart(self, base_url, tmp_path, monkeypatch):
+        # Cursors restart at 0 with the server, so the same cursor may name other content
+        self._session(tmp_path)
+        status, t_etag, _ = _get(base_url + "/api/session/s1/transcript")
+        assert status == 200 and server._BOOT_ID in t_etag
+        monkeypatch.setattr(server, "_BOOT_ID", "restarted")
+        assert _get(base_url + "/api/session/s1/transcript", t_etag)[0] == 200
+
+
+class TestCompactView:
+    def _prompting_session(self):
+        s = server.sessions["s1"] = server._new_session("", "%1", "", "/work/proj")
+        s["last_summary"] = "x" * 5000
+        s["last_user_prompt"] = "write the file"
+        s["derived_state"] = "permission_prompt"
+        s["pending_request"] = {"id": "req-1", "tool_name": "Write", "detail": "/work/proj/big.txt " + "y" * 200,
+                                "tool_input": {"file_path": "/work/proj/big.txt", "content": "z" * 50000}}
+        return s
+
+    def test_compact_sessions_carry_previews_only(self, base_url, watcher_running):
+        s = self._prompting_session()
+        _, full_etag, full = _get(base_url + "/api/sessions")
+        status, etag, compact = _get(base_url + "/api/sessions?view=compact")
+        assert status == 200 and etag != full_etag
+        entry = compact["sessions"][0]
+        assert entry["last_user_prompt"] == "write the file"
+        assert len(entry["last_summary"]) == server.COMPACT_SUMMARY_CHARS + 1  # plus the ellipsis
+        assert entry["pending_request"] == {"id": "req-1", "tool_name": "Write",
+                                            "detail": s["pending_request"]["detail"][:80] + "…"}
+        assert full["sessions"][0]["pending_request"] == s["pending_request"]
+        assert _get(base_url + "/api/sessions?view=compact", etag)[0] == 304
+
+    def test_request_endpoint_returns_full_request(self, base_url, watcher_running):
+        s = self._prompting_session()
+        status, etag, body = _get(base_url + "/api/session/s1/request")
+        assert status == 200 and body == {"session_id": "s1", "request": s["pending_request"]}
+        assert _get(base_url + "/api/session/s1/request", etag)[0] == 304
+
+        s["derived_state"] = "idle"
+        s["pending_request"] = None
+        s["version"] = server.bump_state_version()
+        assert _get(base_url + "/api/session/s1/request", etag)[2]["request"] is None
+        with pytest.raises(urllib.error.HTTPError) as e:
+            _get(base_url + "/api/session/nope/request")
+        assert e.value.code == 404
+
+
+def _post(url, body):
+    req = urllib.request.Request(url, data=json.dumps(body).encode(), method="POST",
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=5) as resp:
+        return json.loads(resp.read())
+
+
+class TestRespondBatch:
+    def _request(self, request_id, settings_file, **extra):
+        path = os.path.join(server.QUEUE_DIR, f"{request_id}.request.json")
+        with open(path, "w") as f:
+            json.dump(dict({"id": request_id, "settings_file": str(settings_file)}, **extra), f)
+
+    def _response(self, request_id):
+        with open(os.path.join(server.QUEUE_DIR, f"{request_id}.response.json")) as f:
+            return json.load(f)
+
+    def test_answers_all_and_writes_each_settings_file_once(self, base_url, tmp_path, monkeypatch):
+        settings = tmp_path / "settings.local.json"
+        self._request("r1", settings, allow_pattern="Bash(git status:*)")
+        self._request("r2", settings, allow_pattern="Bash(ls:*)")
+        self._request("r3", settings)
+        writes = []
+        real_add = server.add_allow_patterns
+        monkeypatch.setattr(server, "add_allow_patterns",
+                            lambda path, patterns: writes.append(path) or real_add(path, patterns))
+
+        body = _post(base_url + "/api/respond-batch", {"items": [
+            {"id": "r1", "decision": "always"},
+            {"id": "r2", "decision": "always", "allow_patterns": ["Bash(ls:*)", "Bash(git status:*)"]},
+            {"id": "r3", "decision": "deny", "message": "no"},
+            {"id": "missing", "decision": "allow"},
+        ]})
+        assert body["ok"] is False
+        assert [r["ok"] for r in body["results"]] == [True, True, True, False]
+        assert body["results"][3] == {"id": "missing", "ok": False, "error": "Request not found"}
+        assert writes == [str(settings)]
+        assert json.loads(settings.read_text())["permissions"]["allow"] == ["Bash(git status:*)", "Bash(ls:*)"]
+        assert self._response("r1") == {"decision": "always"}
+        assert self._response("r3") == {"decision": "deny", "message": "no"}
+
+    def test_remote_items_are_forwarded_per_peer(self, base_url, tmp_path, monkeypatch):
+        self._request("local-1", tmp_path / "s.json")
+        calls = []
+
+        def fake_proxy(url, path, method="GET", body=None, **kwargs):
+            items = json.loads(body)["items"]
+            calls.append((url, path, items))
+            return 200, json.dumps({"results": [{"id": i["id"], "ok": True} for i in items]}).encode(), \
+                "application/json"
+
+        monkeypatch.setattr(server, "proxy_to_remote", fake_proxy)
+        monkeypatch.setitem(server.session_machine_map, "box:abc", "http://box:19836")
+        body = _post(base_url + "/api/respond-batch", {"items": [
+            {"id": "remote-1", "decision": "allow", "session_id": "box:abc"},
+            {"id": "local-1", "decision": "allow", "session_id": "s1"},
+            {"id": "remote-2", "decision": "deny", "session_id": "box:abc"},
+        ]})
+        assert body == {"ok": True, "results": [{"id": "remote-1", "ok": True}, {"id": "local-1", "ok": True},
+                                                {"id": "remote-2", "ok": True}]}
+        assert calls == [("http://box:19836", "/api/respond-batch", [
+            {"id": "remote-1", "decision": "allow"}, {"id": "remote-2", "decision": "deny"}])]
+        assert self._response("local-1") == {"decision": "allow"}
+
+    def test_rejects_malformed_batch(self, base_url):
+        with pytest.raises(urllib.error.HTTPError) as e:
+            _post(base_url + "/api/respond-batch", {"items": "r1"})
+        assert e.value.code == 400
+
+
+class TestEvaluate:
+    def test_runs_rules_then_session_rules(self, base_url, tmp_settings_file, tmp_path, monkeypatch):
+        monkeypatch.setattr(server, "session_auto_allow", {("s1", "Bash"): True})
+        tmp_settings_file(["Bash(make:*)"])
+        call = {"tool_name": "Bash", "cwd": str(tmp_path), "session_id": "s2"}
+        verdict = _post(base_url + "/api/evaluate", dict(call, tool_input={"command": "make"}))
+        assert (verdict["decision"], verdict["tier"]) == ("allow", "settings")
+
+        verdict = _post(base_url + "/api/evaluate", dict(call, tool_input={"command": "rm -rf build"}))
+        assert (verdict["decision"], verdict["tier"]) == ("ask", None)
+        assert verdict["allow_patterns"] == ["Bash(rm build:*)"]
+
+        verdict = _post(base_url + "/api/evaluate", dict(call, tool_input={"command": "rm -rf build"}, session_id="s1"))
+        assert (verdict["decision"], verdict["tier"]) == ("allow", "session")
+
+
+class TestLongPoll:
+    def test_returns_when_version_moves(self, base_url, watcher_running):
+        _, _, body = _get(base_url + "/api/sessions")
+        version = body["version"]
+        server.sessions["x"] = server._new_session("", "%1", "", "/work/proj")
+        threading.Timer(0.2, server.remove_zombie_sessions, ([("x", server.sessions["x"])],)).start()
+        start = time.monotonic()
+        _, _, body = _get(base_url + f"/api/sessions?wait={version}&timeout=10")
+        assert body["version"] > version
+        assert time.monotonic() - start < 5
+
+    def test_times_out_unchanged(self, base_url, watcher_running):
+        version = _get(base_url + "/api/pending")[2]["version"]
+        start = time.monotonic()
+        status, _, body = _get(base_url + f"/api/pending?wait={version}&timeout=0.3")
+        assert status == 200 and body["version"] == version
+        assert time.monotonic() - start >= 0.3
+
+    def test_pending_not_woken_by_reconcile_without_change(self, base_url, watcher_running):
+        version = _get(base_url + "/api/pending")[2]["version"]
+        ticks = [threading.Timer(delay, server._on_watched_file_change, (None,)) for delay in (0.1, 0.3)]
+        for tick in ticks:
+            tick.start()
+        start = time.monotonic()
+        _, _, body = _get(base_url + f"/api/pending?wait={version}&timeout=0.8")
+        assert body["version"] == version and body["requests"] == []
+        assert time.monotonic() - start >= 0.8
+
+    def test_stale_version_returns_at_once(self, base_url, watcher_running):
+        version = _get(base_url + "/api/sessions")[2]["version"]
+        start = time.monotonic()
+        _get(base_url + f"/api/sessions?wait={version + 1000}&timeout=10")
+        assert time.monotonic() - start < 5
+
+    def test_pending_without_watcher_sees_queue_files(self, base_url, monkeypatch):
+        monkeypatch.setattr(server, "_pending_listing", None)
+        server.poll_pending_version()  # baseline listing
+        version = _get(base_url + "/api/pending")[2]["version"]
+
+        def add_request():
+            tmp = os.path.join(server.QUEUE_DIR, "r1.tmp")
+            with open(tmp, "w") as f:
+                json.dump({"id": "r1", "session_id": "s1"}, f)
+            os.rename(tmp, os.path.join(server.QUEUE_DIR, "r1.request.json"))
+
+        threading.Timer(0.2, add_request).start()
+        _, _, body = _get(base_url + f"/api/pending?wait={version}&timeout=10")
+        assert body["version"] > version
+        assert [r["id"] for r in body["requests"]] == ["r1"]
+
+    def test_invalid_wait(self, base_url):
+        with pytest.raises(urllib.error.HTTPError) as exc:
+            urllib.request.urlopen(base_url + "/api/sessions?wait=abc", timeout=5)
+        assert exc.value.code == 400
+
+
+class TestCompression:
+    def test_accepted_encoding(self):
+        assert server._accepted_encoding("gzip, deflate, br") == "gzip"
+        assert server._accepted_encoding("deflate") == "deflate"
+        assert server._accepted_encoding("gzip;q=0, deflate;q=0.5") == "deflate"
+        assert server._accepted_encoding("identity") is None
+        assert server._accepted_encoding(None) is None
+
+    def _fetch(self, url, encoding):
+        req = urllib.request.Request(url, headers={"Accept-Encoding": encoding} if encoding else {})
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.headers, resp.read()
+
+    def test_page_is_precompressed(self, base_url):
+        headers, body = self._fetch(base_url + "/", "gzip")
+        assert headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(body).decode() == server.HTML_PAGE
+        assert int(headers["Content-Length"]) == len(body) < len(server.HTML_PAGE.encode()) // 3
+
+        headers, body = self._fetch(base_url + "/", None)
+        assert headers["Content-Encoding"] is None
+        assert body.decode() == server.HTML_PAGE
+        assert _get(base_url + "/", headers["ETag"])[0] == 304
+
+    def test_large_json_is_compressed(self, base_url, tmp_path):
+        transcript = tmp_path / "t.jsonl"
+        transcript.write_text("".join(
+            json.dumps({"type": "user", "message": {"content": f"prompt {i} " * 20}}) + "\n" for i in range(50)))
+        server.sessions["s1"] = server._new_session(str(transcript), "", "", "/work")
+        server.update_session_state("s1")
+        url = base_url + "/api/session/s1/transcript?limit=50"
+
+        headers, body = self._fetch(url, "deflate")
+        assert headers["Content-Encoding"] == "deflate"
+        assert len(json.loads(zlib.decompress(body))["entries"]) == 50
+        headers, body = self._fetch(url, None)
+        assert headers["Content-Encoding"] is None
+        assert len(json.loads(body)["entries"]) == 50
+
+    def test_small_json_is_not_compressed(self, base_url):
+        headers, body = self._fetch(base_url + "/api/pending", "gzip")
+        assert headers["Content-Encoding"] is None
+        assert json.loads(body)["requests"] == []
+
+
+class TestStreaming:
+    @pytest.fixture
+    def transcript_session(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(server, "STREAM_MIN_ENTRIES", 10)
+        monkeypatch.setattr(server, "STREAM_CHUNK_BYTES", 512)
+        monkeypatch.setattr(server, "TRANSCRIPT_WINDOW", 5)  # most of the page is paged in from disk
+        transcript = tmp_path / "t.jsonl"
+        transcript.write_text("".join(
+            json.dumps({"type": "user", "message": {"content": f"prompt {i} " * 20}}) + "\n" for i in range(40)))
+        server.sessions["s1"] = server._new_session(str(transcript), "", "", "/work")
+        server.update_session_state("s1")
+
+    def _raw_get(self, base_url, path, encoding=None):
+        conn = http.client.HTTPConnection(base_url.split("//")[1], timeout=5)
+        conn.request("GET", path, headers={"Accept-Encoding": encoding} if encoding else {})
+        resp = conn.getresponse()
+        body = resp.read()
+        conn.close()
+        return resp, body
+
+    @pytest.mark.parametrize("encoding", [None, "gzip", "deflate"])
+    def test_large_transcript_page_is_chunked(self, base_url, transcript_session, encoding):
+        _, expected = self._raw_get(base_url, "/api/session/s1/transcript?limit=10")
+        resp, body = self._raw_get(base_url, "/api/session/s1/transcript?limit=100", encoding)
+        assert resp.status == 200
+        assert resp.getheader("Transfer-Encoding") == "chunked"
+        assert resp.getheader("Content-Length") is None
+        assert resp.getheader("ETag")
+        if encoding:
+            assert resp.getheader("Content-Encoding") == encoding
+            body = zlib.decompress(body, 31 if encoding == "gzip" else 15)
+        page = json.loads(body)
+        assert [e["message"]["content"] for e in page["entries"]] == \
+            [f"prompt {i} " * 20 for i in range(40)]
+        assert page["cursor"] == json.loads(expected)["cursor"] and page["has_more"] is False
+
+    @pytest.mark.parametrize("path", ["/api/session/s1/transcript?limit=100", "/api/session/box:s1/transcript?limit=100"])
+    def test_http10_client_gets_unframed_body(self, base_url, transcript_session, monkeypatch, path):
+        # This server doubles as the remote for box:s1, so the second case covers the relay
+        monkeypatch.setitem(server.session_machine_map, "box:s1", base_url)
+        sock = socket.create_connection(tuple(base_url.split("//")[1].split(":")), timeout=5)
+        sock.sendall(f"GET {path} HTTP/1.0\r\n\r\n".encode())
+        resp = http.client.HTTPResponse(sock)
+        resp.begin()
+        assert resp.status == 200
+        assert resp.getheader("Transfer-Encoding") is None
+        assert resp.getheader("Connection") == "close"
+        assert len(json.loads(resp.read())["entries"]) == 40
+        assert sock.recv(1) == b""  # the server closed the connection
+        sock.close()
+
+    def test_keep_alive_after_chunked_response(self, base_url, transcript_session):
+        conn = http.client.HTTPConnection(base_url.split("//")[1], timeout=5)
+        for _ in range(2):
+            conn.request("GET", "/api/session/s1/transcript?limit=100")
+            resp = conn.getresponse()
+            assert len(json.loads(resp.read())["entries"]) == 40
+        conn.close()
+
+    def test_remote_transcript_is_relayed(self, base_url, transcript_session, monkeypatch):
+        # This server doubles as the remote: box:s1 is its own local s1
+        monkeypatch.setitem(server.session_machine_map, "box:s1", base_url)
+        resp, body = self._raw_get(base_url, "/api/session/box:s1/transcript?limit=100", "gzip")
+        assert resp.status == 200
+        assert resp.getheader("Content-Encoding") == "gzip"  # relayed without re-encoding
+        assert resp.getheader("Transfer-Encoding") == "chunked"
+        assert len(json.loads(gzip.decompress(body))["entries"]) == 40
+
+        _, small = self._raw_get(base_url, "/api/session/box:s1/transcript?limit=3")
+        assert len(json.loads(small)["entries"]) == 3
+
+
+class TestKeepAlive:
+    def _conn(self, base_url):
+        host, port = base_url.rsplit("/", 1)[1].split(":")
+        return http.client.HTTPConnection(host, int(port), timeout=5)
+
+    def test_requests_share_one_connection(self, base_url):
+        conn = self._conn(base_url)
+        conn.request("GET", "/api/pending")
+        resp = conn.getresponse()
+        assert resp.version == 11
+        assert json.loads(resp.read())["requests"] == []
+        sock = conn.sock
+        conn.request("GET", "/")
+        resp = conn.getresponse()
+        assert resp.read().decode() == server.HTML_PAGE
+        conn.request("POST", "/api/session-end", body=json.dumps({"session_id": "nope"}),
+                     headers={"Content-Type": "application/json"})
+        assert json.loads(conn.getresponse().read()) == {"ok": True}
+        assert conn.sock is sock
+        conn.close()
+
+    def test_error_closes_with_framed_body(self, base_url):
+        conn = self._conn(base_url)
+        conn.request("GET", "/api/nope")
+        resp = conn.getresponse()
+        assert resp.status == 404
+        assert len(resp.read()) == int(resp.headers["Content-Length"])
+        assert resp.headers["Connection"] == "close"
+        conn.close()
+
+    def test_upload_keeps_connection_in_sync(self, base_url, tmp_path, monkeypatch):
+        monkeypatch.setattr(server, "IMAGE_DIR", str(tmp_path / "images"))
+        boundary = "XyZ"
+        body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"a.png\"\r\n"
+                f"Content-Type: image/png\r\n\r\nPNGDATA\r\n--{boundary}--\r\n").encode()
+        conn = self._conn(base_url)
+        conn.request("POST", "/api/upload-image", body=body,
+                     headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+        path = json.loads(conn.getresponse().read())["path"]
+        with open(path, "rb") as f:
+            assert f.read() == b"PNGDATA"
+        conn.request("GET", "/api/image?path=" + path)
+        assert conn.getresponse().read() == b"PNGDATA"
+        conn.close()
+
+
+class TestAccessLog:
+    def test_requests_are_not_logged(self, base_url, capfd):
+        capfd.readouterr()
+        _get(base_url + "/api/sessions")
+        _get(base_url + "/api/pending")
+        assert "GET /api/" not in capfd.readouterr().err
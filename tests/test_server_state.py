@@ -13,6 +13,7 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, PROJECT_ROOT)
 
 import server
+from transcript import TranscriptState
 
 
 # ── Helpers ──
@@ -267,70 +268,69 @@ class TestDeriveStatePermissionPrompt:
         assert state == "permission_prompt"
 
 
-# ── _has_tool_result ──
+# ── TranscriptState tool resolution ──
 
 
-class TestHasToolResult:
+class TestToolResultResolution:
     def test_found(self):
-        entries = [
+        ts = TranscriptState.from_entries([
+            make_assistant_entry("", tool_uses=[make_tool_use("Read", {}, "tu-1")]),
             make_user_entry("", tool_results=[make_tool_result("tu-1", "ok")]),
-        ]
-        assert server._has_tool_result(entries, "tu-1") is True
+        ])
+        assert ts.is_resolved("tu-1") is True
 
     def test_not_found(self):
-        entries = [
-            make_user_entry("", tool_results=[make_tool_result("tu-1", "ok")]),
-        ]
-        assert server._has_tool_result(entries, "tu-other") is False
-
-    def test_empty_entries(self):
-        assert server._has_tool_result([], "tu-1") is False
-
-
-# ── _all_tool_uses_resolved ──
-
+        ts = TranscriptState.from_entries([
+            make_assistant_entry("", tool_uses=[make_tool_use("Read", {}, "tu-1")]),
+            make_user_entry("", tool_results=[make_tool_result("tu-other", "ok")]),
+        ])
+        assert ts.is_resolved("tu-1") is False
 
-class TestAllToolUsesResolved:
     def test_all_resolved(self):
-        tool_uses = [make_tool_use("Read", {}, "tu-1"), make_tool_use("Grep", {}, "tu-2")]
-        entries = [
+        ts = TranscriptState.from_entries([
+            make_assistant_entry("", tool_uses=[make_tool_use("Read", {}, "tu-1"), make_tool_use("Grep", {}, "tu-2")]),
             make_user_entry("", tool_results=[make_tool_result("tu-1"), make_tool_result("tu-2")]),
-        ]
-        assert server._all_tool_uses_resolved(entries, tool_uses) is True
+        ])
+        assert ts.open_tool_uses == set()
 
     def test_partial_resolved(self):
-        tool_uses = [make_tool_use("Read", {}, "tu-1"), make_tool_use("Grep", {}, "tu-2")]
-        entries = [
+        ts = TranscriptState.from_entries([
+            make_assistant_entry("", tool_uses=[make_tool_use("Read", {}, "tu-1"), make_tool_use("Grep", {}, "tu-2")]),
             make_user_entry("", tool_results=[make_tool_result("tu-1")]),
-        ]
-        assert server._all_tool_uses_resolved(entries, tool_uses) is False
-
-    def test_empty_tool_uses(self):
-        assert server._all_tool_uses_resolved([], []) is True
-
+        ])
+        assert ts.open_tool_uses == {"tu-2"}
 
-# ── _tool_use_resolved_in_transcript ──
+    def test_empty(self):
+        assert TranscriptState.from_entries([]).open_tool_uses == set()
 
 
-class TestToolUseResolvedInTranscript:
+class TestToolUseResolved:
     def test_resolved(self):
-        entries = [
+        ts = TranscriptState.from_entries([
             make_assistant_entry("", tool_uses=[make_tool_use("Bash", {}, "tu-1")]),
             make_user_entry("", tool_results=[make_tool_result("tu-1")]),
-        ]
-        assert server._tool_use_resolved_in_transcript(entries, "Bash", {}) is True
+        ])
+        assert ts.tool_use_resolved("Bash") is True
 
     def test_not_resolved(self):
-        entries = [
+        ts = TranscriptState.from_entries([
             make_assistant_entry("", tool_uses=[make_tool_use("Bash", {}, "tu-1")]),
-        ]
-        assert server._tool_use_resolved_in_transcript(entries, "Bash", {}) is False
+        ])
+        assert ts.tool_use_resolved("Bash") is False
 
     def test_no_matching_tool(self):
-        entries = [
+        ts = TranscriptState.from_entries([
             make_assistant_entry("", tool_uses=[make_tool_use("Read", {}, "tu-1")]),
-        ]
-        assert server._tool_use_resolved_in_transcript(entries, "Bash", {}) is False
+        ])
+        assert ts.tool_use_resolved("Bash") is False
+
+    def test_only_most_recent_use_counts(self):
+        ts = TranscriptState.from_entries([
+            make_assistant_entry("", tool_uses=[make_tool_use("Bash", {}, "tu-1")]),
+            make_user_entry("", tool_results=[make_tool_result("tu-1")]),
+            make_assistant_entry("", tool_uses=[make_tool_use("Bash", {}, "tu-2")]),
+        ])
+        assert ts.tool_use_resolved("Bash") is False
 
 
 # ── Transcript incremental parsing (update_session_state) ──
@@ -392,6 +392,93 @@ class TestUpdateSessionState:
         entries = server.sessions["s1"]["transcript_entries"]
         assert any("fresh" in json.dumps(e) for e in entries)
 
+    def test_incremental_read_feeds_state(self, tmp_path):
+        transcript = tmp_path / "transcript.jsonl"
+        transcript.write_text(json.dumps(make_user_entry("hello")) + "\n")
+
+        setup_session("s1", [])
+        server.sessions["s1"]["transcript_path"] = str(transcript)
+        server.update_session_state("s1")
+        assert server.sessions["s1"]["derived_state"] == "busy"
+
+        with open(str(transcript), "a") as f:
+            f.write(json.dumps(make_assistant_entry("reply", stop_reason="end_turn")) + "\n")
+        server.update_session_state("s1")
+
+        s = server.sessions["s1"]
+        ts = s["transcript_state"]
+        assert ts.count == 2
+        assert ts.last_assistant_pos == 1
+        assert s["derived_state"] == "idle"
+        assert s["last_summary"] == "reply"
+        assert s["last_user_prompt"] == "hello"
+
+    def test_new_prompt_clears_last_summary(self, tmp_path):
+        # The summary belongs to the displayed prompt: once a new prompt
+        # arrives, the previous turn's reply is no longer shown with it.
+        transcript = tmp_path / "transcript.jsonl"
+        transcript.write_text("\n".join(json.dumps(e) for e in [
+            make_user_entry("first"),
+            make_assistant_entry("first reply", stop_reason="end_turn"),
+        ]) + "\n")
+
+        setup_session("s1", [])
+        server.sessions["s1"]["transcript_path"] = str(transcript)
+        server.update_session_state("s1")
+        assert server.sessions["s1"]["last_summary"] == "first reply"
+
+        with open(str(transcript), "a") as f:
+            f.write(json.dumps(make_user_entry("second")) + "\n")
+        server.update_session_state("s1")
+        s = server.sessions["s1"]
+        assert s["last_user_prompt"] == "second"
+        assert s["last_summary"] == ""
+
+        with open(str(transcript), "a") as f:
+            f.write(json.dumps(make_assistant_entry("second reply", stop_reason="end_turn")) + "\n")
+        server.update_session_state("s1")
+        assert server.sessions["s1"]["last_summary"] == "second reply"
+
+    def test_truncation_resets_state(self, tmp_path):
+        transcript = tmp_path / "transcript.jsonl"
+        transcript.write_text("\n".join(
+            json.dumps(make_user_entry(f"msg {i}")) for i in range(10)
+        ) + "\n")
+
+        setup_session("s1", [])
+        server.sessions["s1"]["transcript_path"] = str(transcript)
+        server.update_session_state("s1")
+        assert server.sessions["s1"]["transcript_state"].count == 10
+
+        transcript.write_text(json.dumps(make_user_entry("fresh")) + "\n")
+        server.update_session_state("s1")
+        ts = server.sessions["s1"]["transcript_state"]
+        assert ts.count == 1
+        assert ts.user_prompt == "fresh"
+
+    def test_partial_line_kept_pending(self, tmp_path):
+        transcript = tmp_path / "transcript.jsonl"
+        line1 = json.dumps(make_user_entry("hello")) + "\n"
+        line2 = json.dumps(make_assistant_entry("reply", stop_reason="end_turn")) + "\n"
+        transcript.write_text(line1 + line2[:10])
+
+        setup_session("s1", [])
+        server.sessions["s1"]["transcript_path"] = str(transcript)
+        server.update_session_state("s1")
+        s = server.sessions["s1"]
+        assert len(s["transcript_entries"]) == 1
+        assert s["transcript_offset"] == len(line1)
+        assert s["transcript_pending"] == line2[:10].encode()
+
+        with open(str(transcript), "a") as f:
+            f.write(line2[10:])
+        server.update_session_state("s1")
+        assert len(s["transcript_entries"]) == 2
+        assert s["transcript_entries"][1]["_seq"] == len(line1)
+        assert s["transcript_offset"] == len(line1) + len(line2)
+        assert s["transcript_pending"] == b""
+        assert s["derived_state"] == "idle"
+
     def test_missing_transcript(self):
         setup_session("s1", [])
         server.sessions["s1"]["transcript_path"] = "/nonexistent/path.jsonl"
@@ -411,6 +498,372 @@ class TestUpdateSessionState:
         server.update_session_state("nonexistent")
 
 
+# ── Transcript watcher callback / snapshot ──
+
+
+class TestWatcherCallback:
+    def test_change_updates_matching_session_only(self, tmp_path):
+        t1 = tmp_path / "t1.jsonl"
+        t2 = tmp_path / "t2.jsonl"
+        t1.write_text(json.dumps(make_user_entry("one")) + "\n")
+        t2.write_text(json.dumps(make_user_entry("two")) + "\n")
+        setup_session("s1", [])
+        setup_session("s2", [])
+        server.sessions["s1"]["transcript_path"] = str(t1)
+        server.sessions["s2"]["transcript_path"] = str(t2)
+
+        server._on_watched_file_change(str(t1))
+
+        assert len(server.sessions["s1"]["transcript_entries"]) == 1
+        assert server.sessions["s2"]["transcript_entries"] == []
+
+    def test_reconcile_updates_all_sessions(self, tmp_path):
+        t1 = tmp_path / "t1.jsonl"
+        t1.write_text(json.dumps(make_user_entry("one")) + "\n")
+        setup_session("s1", [])
+        server.sessions["s1"]["transcript_path"] = str(t1)
+
+        server._on_watched_file_change(None)
+
+        assert server.sessions["s1"]["derived_state"] == "busy"
+
+    def test_reconcile_bumps_pending_version_only_on_change(self, monkeypatch):
+        monkeypatch.setattr(server, "_transcript_watcher_running", lambda: True)
+        server.pending_index()
+        version = server.pending_version
+        woke = []
+        waiter = threading.Thread(target=lambda: woke.append(server.wait_for_version("pending", version, 0.5)))
+        waiter.start()
+        server._on_watched_file_change(None)
+        server._on_watched_file_change(None)
+        waiter.join()
+        assert woke == [version]  # the long-poll timed out instead of waking
+
+        with open(os.path.join(server.QUEUE_DIR, "req-1.request.json"), "w") as f:
+            json.dump({"id": "req-1", "session_id": "s1", "pid": os.getpid()}, f)
+        server._on_watched_file_change(None)
+        assert server.pending_version > version
+
+    def test_snapshot_carries_pending_request(self, tmp_path):
+        transcript = tmp_path / "t.jsonl"
+        transcript.write_text("\n".join(json.dumps(e) for e in [
+            make_user_entry("deploy it"),
+            make_assistant_entry("Running.", tool_uses=[make_tool_use("Bash", {}, "tu-1")],
+                                 stop_reason="tool_use"),
+        ]) + "\n")
+        setup_session("s1", [])
+        server.sessions["s1"]["transcript_path"] = str(transcript)
+        req = {"id": "req-1", "tool_name": "Bash", "tool_input": {}, "session_id": "s1", "pid": os.getpid()}
+        with open(os.path.join(server.QUEUE_DIR, "req-1.request.json"), "w") as f:
+            json.dump(req, f)
+
+        server._on_watched_file_change(os.path.join(server.QUEUE_DIR, "req-1.request.json"))
+
+        snap = server._session_snapshot("s1", server.sessions["s1"])
+        assert snap["state"] == "permission_prompt"
+        assert snap["pending_request"]["id"] == "req-1"
+
+
+# ── Transcript delta (seq cursors) ──
+
+
+class TestTranscriptDelta:
+    def _load(self, tmp_path, texts):
+        transcript = tmp_path / "t.jsonl"
+        transcript.write_text("".join(json.dumps(make_user_entry(t)) + "\n" for t in texts))
+        setup_session("s1", [])
+        server.sessions["s1"]["transcript_path"] = str(transcript)
+        server.update_session_state("s1")
+        return transcript
+
+    def test_full_fetch_returns_cursor_and_reset(self, tmp_path):
+        self._load(tmp_path, ["a", "b"])
+        page = server._transcript_page("s1", limit=50)
+        entries = page["entries"]
+        assert len(entries) == 2
+        assert page["reset"] is True
+        assert page["has_more"] is False
+        assert page["cursor"] == server.sessions["s1"]["transcript_offset"]
+        assert entries[0]["_seq"] < entries[1]["_seq"] < page["cursor"]
+
+    def test_unknown_session(self):
+        assert server._transcript_page("nope") is None
+
+    def test_after_cursor_returns_only_new_entries(self, tmp_path):
+        transcript = self._load(tmp_path, ["a"])
+        cursor = server._transcript_page("s1")["cursor"]
+        page = server._transcript_page("s1", after=cursor)
+        assert (page["entries"], page["cursor"], page["reset"]) == ([], cursor, False)
+
+        with open(str(transcript), "a") as f:
+            f.write(json.dumps(make_assistant_entry("reply")) + "\n")
+        server.update_session_state("s1")
+        page = server._transcript_page("s1", after=cursor)
+        assert [e["type"] for e in page["entries"]] == ["assistant"]
+        assert page["entries"][0]["_seq"] == cursor
+        assert page["cursor"] > cursor
+        assert page["reset"] is False
+
+    def test_rewrite_invalidates_old_cursor(self, tmp_path):
+        transcript = self._load(tmp_path, [f"msg {i}" for i in range(5)])
+        cursor = server._transcript_page("s1")["cursor"]
+
+        transcript.write_text(json.dumps(make_user_entry("fresh")) + "\n")
+        server.update_session_state("s1")
+        page = server._transcript_page("s1", after=cursor)
+        assert page["reset"] is True
+        assert len(page["entries"]) == 1
+        assert page["entries"][0]["_seq"] > cursor
+        assert page["cursor"] > cursor
+
+    def test_too_many_new_entries_resets(self, tmp_path):
+        transcript = self._load(tmp_path, ["a"])
+        cursor = server._transcript_page("s1")["cursor"]
+        with open(str(transcript), "a") as f:
+            for i in range(5):
+                f.write(json.dumps(make_user_entry(f"more {i}")) + "\n")
+        server.update_session_state("s1")
+        page = server._transcript_page("s1", after=cursor, limit=3)
+        assert page["reset"] is True
+        assert len(page["entries"]) == 3
+
+    def test_seq_stable_across_reparse(self, tmp_path):
+        transcript = self._load(tmp_path, ["a", "b"])
+        seqs = [e["_seq"] for e in server.sessions["s1"]["transcript_entries"]]
+        setup_session("s2", [])
+        server.sessions["s2"]["transcript_path"] = str(transcript)
+        server.update_session_state("s2")
+        assert [e["_seq"] for e in server.sessions["s2"]["transcript_entries"]] == seqs
+
+
+class TestTranscriptWindow:
+    @pytest.fixture(autouse=True)
+    def small_window(self, monkeypatch):
+        monkeypatch.setattr(server, "TRANSCRIPT_WINDOW", 3)
+
+    def _load(self, tmp_path, n):
+        transcript = tmp_path / "t.jsonl"
+        transcript.write_text("".join(
+            json.dumps({"type": "progress"}) + "\n" + json.dumps(make_user_entry(f"msg {i}")) + "\n"
+            for i in range(n)))
+        setup_session("s1", [])
+        server.sessions["s1"]["transcript_path"] = str(transcript)
+        server.update_session_state("s1")
+        return server.sessions["s1"]
+
+    def _texts(self, page):
+        return [e["message"]["content"] for e in page["entries"]]
+
+    def test_keeps_only_tail_in_memory(self, tmp_path):
+        s = self._load(tmp_path, 5)
+        assert len(s["transcript_entries"]) == 3
+        assert len(s["transcript_index"]) == 5
+        assert s["transcript_state"].user_prompt == "msg 4"
+
+    def test_full_fetch_pages_in_older_entries(self, tmp_path):
+        s = self._load(tmp_path, 5)
+        page = server._transcript_page("s1", limit=4)
+        assert self._texts(page) == ["msg 1", "msg 2", "msg 3", "msg 4"]
+        assert page["has_more"] is True
+        # Paged-in entries carry the same seq they had when first parsed
+        assert [e["_seq"] for e in page["entries"]] == [p + s.get("transcript_seq_base", 0)
+                                                        for p in s["transcript_index"][1:]]
+
+    def test_before_pages_back(self, tmp_path):
+        self._load(tmp_path, 5)
+        first = server._transcript_page("s1", limit=2)
+        assert self._texts(first) == ["msg 3", "msg 4"]
+        older = server._transcript_page("s1", before=first["entries"][0]["_seq"], limit=2)
+        assert self._texts(older) == ["msg 1", "msg 2"]
+        assert older["reset"] is False
+        assert older["has_more"] is True
+        oldest = server._transcript_page("s1", before=older["entries"][0]["_seq"], limit=2)
+        assert self._texts(oldest) == ["msg 0"]
+        assert oldest["has_more"] is False
+
+
+class TestTailFirstLoad:
+    @pytest.fixture(autouse=True)
+    def small_tail_threshold(self, monkeypatch):
+        monkeypatch.setattr(server, "TAIL_LOAD_BYTES", 0)
+
+    def _load(self, tmp_path):
+        transcript = tmp_path / "t.jsonl"
+        entries = []
+        for i in range(5):
+            entries.append(make_user_entry(f"q{i}"))
+            entries.append(make_assistant_entry(f"a{i}"))
+        entries[0]["slug"] = "happy-slug"
+        entries.append(make_user_entry("current"))
+        transcript.write_text("".join(json.dumps(e) + "\n" for e in entries))
+        setup_session("s1", [])
+        server.sessions["s1"]["transcript_path"] = str(transcript)
+        server.sessions["s1"]["slug"] = ""
+        server.sessions["s1"]["custom_title"] = ""
+        server.update_session_state("s1")
+        return server.sessions["s1"]
+
+    def test_parses_only_current_turn(self, tmp_path):
+        s = self._load(tmp_path)
+        assert len(s["transcript_entries"]) == 1
+        assert s["transcript_backfill"] > 0
+        assert s["derived_state"] == "busy"
+        assert s["last_user_prompt"] == "current"
+
+    def test_backfill_indexes_history(self, tmp_path):
+        s = self._load(tmp_path)
+        server._backfill_transcript_index("s1")
+        assert s["transcript_backfill"] == 0
+        assert len(s["transcript_index"]) == 11
+        assert s["slug"] == "happy-slug"
+
+    def test_full_page_backfills_on_demand(self, tmp_path):
+        self._load(tmp_path)
+        page = server._transcript_page("s1", limit=4)
+        assert [e["type"] for e in page["entries"]] == ["assistant", "user", "assistant", "user"]
+        assert page["entries"][1]["message"]["content"] == "q4"
+        assert page["entries"][-1]["message"]["content"] == "current"
+        assert page["has_more"] is True
+        assert server.sessions["s1"]["transcript_backfill"] == 0
+
+
+class TestCheckpointResume:
+    @pytest.fixture(autouse=True)
+    def store(self, monkeypatch):
+        store = server.CheckpointStore(os.path.join(server.QUEUE_DIR, "checkpoints.sqlite3"))
+        monkeypatch.setattr(server, "checkpoint_store", store)
+        monkeypatch.setattr(server, "_checkpointed", {})
+        yield store
+        store.close()
+
+    def test_restart_resumes_from_checkpoint(self, tmp_path):
+        transcript = tmp_path / "t.jsonl"
+        first = json.dumps(dict(make_user_entry("hello"), slug="happy-slug")) + "\n"
+        transcript.write_text(first)
+        server.sessions["s1"] = server._new_session(str(transcript), "", "", "/tmp")
+        server.update_session_state("s1")
+        server.save_checkpoints()
+
+        # "Restart": forget everything in memory, then append a reply
+        server.sessions.clear()
+        server._checkpointed.clear()
+        with open(str(transcript), "a") as f:
+            f.write(json.dumps(make_assistant_entry("reply")) + "\n")
+        server.sessions["s1"] = server._new_session(str(transcript), "", "", "/tmp")
+        server.update_session_state("s1")
+
+        s = server.sessions["s1"]
+        # Only the appended line was parsed; the rest came from the checkpoint
+        assert [e["type"] for e in s["transcript_entries"]] == ["assistant"]
+        assert s["transcript_entries"][0]["_seq"] == len(first)
+        assert s["transcript_state"].count == 2
+        assert s["derived_state"] == "idle"
+        assert s["last_user_prompt"] == "hello"
+        assert s["slug"] == "happy-slug"
+        page = server._transcript_page("s1")
+        assert [e["type"] for e in page["entries"]] == ["user", "assistant"]
+
+    def test_unchanged_sessions_are_not_resaved(self, tmp_path, store, monkeypatch):
+        transcript = tmp_path / "t.jsonl"
+        transcript.write_text(json.dumps(make_user_entry("hello")) + "\n")
+        server.sessions["s1"] = server._new_session(str(transcript), "", "", "/tmp")
+        server.update_session_state("s1")
+        server.save_checkpoints()
+        saves = []
+        monkeypatch.setattr(store, "save", lambda *a: saves.append(a) or True)
+        server.save_checkpoints()
+        assert saves == []
+
+
+class TestEventPublishing:
+    @pytest.fixture
+    def events(self):
+        q = server.subscribe_events()
+        yield lambda: [q.get_nowait() for _ in range(q.qsize())]
+        server.unsubscribe_events(q)
+
+    def test_append_publishes_transcript_and_state(self, tmp_path, events):
+        transcript = tmp_path / "t.jsonl"
+        transcript.write_text(json.dumps(make_user_entry("hello")) + "\n")
+        setup_session("s1", [])
+        server.sessions["s1"]["transcript_path"] = str(transcript)
+        server.update_session_state("s1")
+
+        got = events()
+        assert [k for k, _ in got] == ["transcript_appended", "state_changed"]
+        assert got[0][1] == {"session_id": "s1", "cursor": server.sessions["s1"]["transcript_offset"]}
+        assert got[1][1]["state"] == "busy"
+
+        # Nothing changed — nothing published
+        server.update_session_state("s1")
+        assert events() == []
+
+    def test_new_pending_request_is_published(self, tmp_path, events):
+        transcript = tmp_path / "t.jsonl"
+        transcript.write_text("\n".join(json.dumps(e) for e in [
+            make_user_entry("deploy it"),
+            make_assistant_entry("Running.", tool_uses=[make_tool_use("Bash", {}, "tu-1")],
+                                 stop_reason="tool_use"),
+        ]) + "\n")
+        setup_session("s1", [])
+        server.sessions["s1"]["transcript_path"] = str(transcript)
+        req = {"id": "req-1", "tool_name": "Bash", "tool_input": {}, "session_id": "s1", "pid": os.getpid()}
+        with open(os.path.join(server.QUEUE_DIR, "req-1.request.json"), "w") as f:
+            json.dump(req, f)
+        version = server.state_version
+        server.update_session_state("s1")
+
+        got = dict(events())
+        assert set(got) == {"transcript_appended", "state_changed", "pending_request"}
+        assert got["state_changed"]["state"] == "permission_prompt"
+        assert got["pending_request"] == {"session_id": "s1", "request": req}
+        # One change, one bump — every extra one would wake the ?wait= long-polls again
+        assert server.state_version == version + 1
+
+    def test_session_removal_bumps_once(self, events):
+        setup_session("s1", [])
+        setup_session("s2", [])
+        version = server.state_version
+        server.remove_zombie_sessions([("s1", server.sessions["s1"]), ("s2", server.sessions["s2"])])
+        assert [k for k, _ in events()] == ["session_removed", "session_removed"]
+        assert server.state_version == version + 1
+
+    def test_slow_subscriber_gets_resync(self, monkeypatch):
+        monkeypatch.setattr(server, "EVENT_QUEUE_SIZE", 2)
+        q = server.subscribe_events()
+        try:
+            for i in range(3):
+                server.publish_event("state_changed", {"i": i})
+            assert [q.get_nowait() for _ in range(q.qsize())] == [("resync", {})]
+        finally:
+            server.unsubscribe_events(q)
+
+
+class TestSessionFragments:
+    def test_only_changed_sessions_are_reserialized(self, tmp_path, monkeypatch):
+        for sid in ("s1", "s2"):
+            transcript = tmp_path / f"{sid}.jsonl"
+            transcript.write_text(json.dumps(make_user_entry(f"hi {sid}")) + "\n")
+            server.sessions[sid] = server._new_session(str(transcript), "", "", "/tmp")
+            server.update_session_state(sid)
+        with server.sessions_lock:
+            first = {sid: server._session_json(sid, s) for sid, s in server.sessions.items()}
+        assert json.loads(first["s1"])["last_user_prompt"] == "hi s1"
+        assert json.loads(first["s1"])["machine"] == server.server_name
+
+        with open(tmp_path / "s2.jsonl", "a") as f:
+            f.write(json.dumps(make_assistant_entry("done")) + "\n")
+        server.update_session_state("s2")
+        dumps = []
+        real_dumps = json.dumps
+        monkeypatch.setattr(server.json, "dumps", lambda obj, **kw: dumps.append(obj) or real_dumps(obj, **kw))
+        with server.sessions_lock:
+            second = {sid: server._session_json(sid, s) for sid, s in server.sessions.items()}
+        assert second["s1"] is first["s1"]
+        assert json.loads(second["s2"])["last_summary"] == "done"
+        assert [d["session_id"] for d in dumps] == ["s2"]
+
+
 # ── User prompt extraction ──
 
 
@@ -0,0 +1,227 @@
+"""Tests for transcript.py — incremental transcript state."""
+
+import json
+import os
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+import transcript
+from transcript import TranscriptState
+
+
+def user(content):
+    return {"type": "user", "message": {"content": content}}
+
+
+def assistant(text="", tool_uses=(), stop_reason="end_turn"):
+    content = [{"type": "text", "text": text}] if text else []
+    content += [{"type": "tool_use", "name": name, "id": tid, "input": {}} for tid, name in tool_uses]
+    return {"type": "assistant", "message": {"content": content, "stop_reason": stop_reason}}
+
+
+def tool_result(tool_use_id):
+    return user([{"type": "tool_result", "tool_use_id": tool_use_id, "content": "ok"}])
+
+
+# ── TranscriptState ──
+
+
+class TestTranscriptState:
+    def test_empty(self):
+        ts = TranscriptState()
+        assert ts.count == 0
+        assert ts.last_user_pos is None
+        assert ts.last_assistant_pos is None
+        assert not ts.user_after_assistant()
+
+    def test_positions_and_prompt(self):
+        ts = TranscriptState.from_entries([
+            user("hello"),
+            assistant("hi there"),
+            {"type": "file-history-snapshot"},
+        ])
+        assert ts.count == 3
+        assert ts.last_user_pos == 0
+        assert ts.last_assistant_pos == 1
+        assert ts.user_prompt == "hello"
+        assert ts.summary == "hi there"
+        assert not ts.user_after_assistant()
+
+    def test_tracks_open_tool_uses(self):
+        ts = TranscriptState()
+        ts.feed(user("run it"))
+        ts.feed(assistant("running", tool_uses=[("tu-1", "Bash"), ("tu-2", "Read")], stop_reason="tool_use"))
+        assert ts.open_tool_uses == {"tu-1", "tu-2"}
+        ts.feed(tool_result("tu-1"))
+        assert ts.is_resolved("tu-1")
+        assert not ts.is_resolved("tu-2")
+        assert ts.tool_use_resolved("Bash")
+        assert not ts.tool_use_resolved("Read")
+        assert not ts.tool_use_resolved("Write")  # never used
+
+    def test_tool_result_is_not_a_prompt(self):
+        ts = TranscriptState.from_entries([
+            user("do it"),
+            assistant("ok", tool_uses=[("tu-1", "Bash")], stop_reason="tool_use"),
+            tool_result("tu-1"),
+        ])
+        assert ts.user_after_assistant()
+        assert ts.last_user_text == ""
+        assert ts.user_prompt == "do it"
+        assert ts.summary == "ok"
+
+    def test_new_prompt_clears_summary(self):
+        ts = TranscriptState.from_entries([user("q1"), assistant("a1"), user("q2")])
+        assert ts.summary == ""
+        assert ts.user_prompt == "q2"
+
+    def test_local_command_keeps_summary(self):
+        ts = TranscriptState.from_entries([
+            user("q1"),
+            assistant("a1"),
+            user("<command-name>/context</command-name><local-command-stdout>x</local-command-stdout>"),
+        ])
+        assert ts.last_user_text == ""
+        assert ts.summary == "a1"
+
+    def test_incremental_matches_batch(self):
+        entries = [
+            user("q1"),
+            assistant("a1", tool_uses=[("tu-1", "Edit")], stop_reason="tool_use"),
+            tool_result("tu-1"),
+            assistant("a2"),
+            user("q2"),
+        ]
+        batch = TranscriptState.from_entries(entries)
+        inc = TranscriptState()
+        inc.feed_all(entries[:2])
+        inc.feed_all(entries[2:])
+        assert vars(inc) == vars(batch)
+
+    def test_dict_round_trip(self):
+        ts = TranscriptState.from_entries([
+            user("q1"),
+            assistant("a1", tool_uses=[("tu-1", "Edit"), ("tu-2", "Bash")], stop_reason="tool_use"),
+            tool_result("tu-1"),
+        ])
+        d = json.loads(json.dumps(ts.to_dict()))
+        assert vars(TranscriptState.from_dict(d)) == vars(ts)
+
+
+# ── JSONL framing ──
+
+
+class TestParseJsonlChunk:
+    def test_positions_and_consumed(self):
+        data = b'{"a": 1}\n\n{"b": "\xc3\xa9"}\n'
+        entries, consumed = transcript.parse_jsonl_chunk(data)
+        assert entries == [(0, {"a": 1}), (10, {"b": "\u00e9"})]
+        assert consumed == len(data)
+
+    def test_incomplete_tail_is_left_pending(self):
+        data = b'{"a": 1}\n{"b": '
+        entries, consumed = transcript.parse_jsonl_chunk(data)
+        assert entries == [(0, {"a": 1})]
+        assert data[consumed:] == b'{"b": '
+
+    def test_unterminated_complete_line_is_consumed(self):
+        entries, consumed = transcript.parse_jsonl_chunk(b'{"a": 1}')
+        assert entries == [(0, {"a": 1})]
+        assert consumed == 8
+
+    def test_bad_line_mid_chunk_is_skipped(self):
+        data = b'not json\n{"a": 1}\n'
+        entries, consumed = transcript.parse_jsonl_chunk(data)
+        assert entries == [(9, {"a": 1})]
+        assert consumed == len(data)
+
+    def test_invalid_utf8_is_replaced(self):
+        entries, _ = transcript.parse_jsonl_chunk(b'{"a": "\xff"}\n')
+        assert entries == [(0, {"a": "\ufffd"})]
+
+
+class TestIterJsonlAt:
+    def test_rereads_lines_at_positions(self, tmp_path):
+        path = tmp_path / "t.jsonl"
+        path.write_bytes(b'{"a": 1}\nnot json\n{"b": 2}\n')
+        assert list(transcript.iter_jsonl_at(str(path), [18, 0, 9])) == [(18, {"b": 2}), (0, {"a": 1})]
+
+
+class TestFindTurnStart:
+    def _write(self, tmp_path, entries):
+        path = tmp_path / "t.jsonl"
+        lines = [json.dumps(e) + "\n" for e in entries]
+        path.write_text("".join(lines))
+        starts = [sum(len(l.encode()) for l in lines[:i]) for i in range(len(lines))]
+        return path, starts
+
+    def test_finds_last_real_prompt_across_blocks(self, tmp_path):
+        path, starts = self._write(tmp_path, [
+            user("old"),
+            assistant("a1"),
+            user("current"),
+            assistant("working", tool_uses=[("tu-1", "Bash")], stop_reason="tool_use"),
+            tool_result("tu-1"),
+            user("[Request interrupted by user]"),
+            user("<command-name>/context</command-name>"),
+        ])
+        with open(path, "rb") as f:
+            size = f.seek(0, 2)
+            assert transcript.find_turn_start(f, size, block_size=16) == starts[2]
+
+    def test_no_prompt_returns_zero(self, tmp_path):
+        path, _ = self._write(tmp_path, [assistant("a1"), tool_result("tu-1")])
+        with open(path, "rb") as f:
+            assert transcript.find_turn_start(f, f.seek(0, 2), block_size=8) == 0
+
+    def test_tail_state_matches_full_state(self, tmp_path):
+        entries = [
+            user("q1"),
+            assistant("a1"),
+            user("q2"),
+            assistant("a2", tool_uses=[("tu-1", "Edit")], stop_reason="tool_use"),
+        ]
+        path, starts = self._write(tmp_path, entries)
+        with open(path, "rb") as f:
+            start = transcript.find_turn_start(f, f.seek(0, 2), block_size=32)
+        tail = TranscriptState.from_entries(entries[starts.index(start):])
+        full = TranscriptState.from_entries(entries)
+        for attr in ("user_prompt", "summary", "last_user_text", "last_tool_uses", "last_stop_reason"):
+            assert getattr(tail, attr) == getattr(full, attr)
+        assert tail.open_tool_uses == full.open_tool_uses
+
+
+# ── Prompt cleaning ──
+
+
+class TestCleanUserPrompt:
+    def test_strips_system_tags_and_keeps_newlines(self):
+        entry = user("<system-reminder>x</system-reminder>line one\n\n\n\nline   two")
+        assert transcript.clean_user_prompt(entry) == "line one\n\nline two"
+
+    def test_extract_user_text_collapses_whitespace(self):
+        assert transcript.extract_user_text(user("a\n\n b")) == "a b"
+
+    def test_extract_user_text_tool_result(self):
+        assert transcript.extract_user_text(tool_result("tu-1")) == ""
+
+    def test_strips_every_system_tag_block(self):
+        entry = user("<command-name>/model</command-name><command-args>opus</command-args>"
+                     "<local-command-stdout>Set model</local-command-stdout>")
+        assert transcript.extract_user_text(entry) == ""
+        assert transcript.clean_user_prompt(entry) == ""
+
+    def test_result_is_memoized_by_uuid(self, monkeypatch):
+        calls = []
+        real_sub = transcript._TAG_RE.sub
+        monkeypatch.setattr(transcript, "_TAG_RE", type("R", (), {
+            "sub": staticmethod(lambda repl, text: calls.append(text) or real_sub(repl, text))}))
+        entry = dict(user("<b>hi</b> there"), uuid="memo-test-1")
+        assert transcript.extract_user_text(entry) == "hi there"
+        assert transcript.clean_user_prompt(entry) == "hi there"
+        assert transcript.extract_user_text(dict(entry)) == "hi there"
+        assert len(calls) == 1
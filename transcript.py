@@ -0,0 +1,300 @@
+"""
+Transcript helpers for Claude Code WebUI.
+
+Holds the incremental per-session state machine that the server feeds with
+newly parsed transcript entries, so deriving a session's state costs
+O(new entries) instead of rescanning the whole transcript on every poll, and
+the user-text normalisation shared by the server and the Feishu channel.
+"""
+
+import json
+import re
+import threading
+
+
+INTERRUPT_PREFIX = "[Request interrupted by user"
+
+# System/command tags injected by Claude Code into user messages
+_SYSTEM_TAGS = ("system-reminder", "local-command-caveat", "local-command-stdout",
+                "task-notification", "command-name", "command-message", "command-args")
+
+
+def _user_content_text(entry):
+    """Join the text parts of a user entry's content."""
+    content = entry.get("message", {}).get("content", "")
+    if isinstance(content, str):
+        return content
+    if not isinstance(content, list):
+        return ""
+    parts = []
+    for c in content:
+        if isinstance(c, dict):
+            if c.get("type") == "text":
+                parts.append(c.get("text", ""))
+        elif isinstance(c, str):
+            parts.append(c)
+    return " ".join(parts)
+
+
+# One pass strips every system/command tag block, then any remaining XML tag
+_TAG_RE = re.compile(r"<(%s)>.*?</\1>|<[^>]+>" % "|".join(map(re.escape, _SYSTEM_TAGS)), re.DOTALL)
+_SPACE_RE = re.compile(r"\s+")
+_INLINE_SPACE_RE = re.compile(r"[^\S\n]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+# uuid -> (extract_user_text, clean_user_prompt).  Transcript lines never change,
+# so each one is normalised once no matter how many times it is looked at.
+_NORMALIZED_CACHE_SIZE = 8192
+_normalized_cache = {}
+_normalized_lock = threading.Lock()
+
+
+def _normalize_user_entry(entry):
+    uid = entry.get("uuid")
+    if uid:
+        with _normalized_lock:
+            hit = _normalized_cache.get(uid)
+        if hit is not None:
+            return hit
+    text = _user_content_text(entry)
+    if not text or not text.strip():
+        result = ("", "")
+    else:
+        stripped = _TAG_RE.sub("", text)
+        content = entry.get("message", {}).get("content", "")
+        has_tool_result = isinstance(content, list) and any(
+            isinstance(c, dict) and c.get("type") == "tool_result" for c in content)
+        # tool_results are not user prompts
+        prompt_text = "" if has_tool_result else _SPACE_RE.sub(" ", stripped).strip()
+        display = _BLANK_LINES_RE.sub("\n\n", _INLINE_SPACE_RE.sub(" ", stripped)).strip()
+        result = (prompt_text, display)
+    if uid:
+        with _normalized_lock:
+            if len(_normalized_cache) >= _NORMALIZED_CACHE_SIZE:
+                del _normalized_cache[next(iter(_normalized_cache))]
+            _normalized_cache[uid] = result
+    return result
+
+
+def extract_user_text(entry):
+    """Extract meaningful user text from a transcript entry, stripping system/command tags.
+
+    Returns empty string for local commands (/context, /help etc.) that don't need a response.
+    """
+    return _normalize_user_entry(entry)[0]
+
+
+def clean_user_prompt(entry):
+    """Return the displayable prompt text of a user entry ("" if there is none).
+
+    Unlike extract_user_text, newlines are preserved for rendering.
+    """
+    return _normalize_user_entry(entry)[1]
+
+
+def parse_jsonl_chunk(data):
+    """Frame a chunk of JSONL bytes into entries without decoding it as a whole.
+
+    Newlines are located directly in the bytes and each complete line is handed
+    to json.loads as-is.  Returns (entries, consumed) where entries is a list of
+    (line_start, entry) pairs, line_start being the byte position of the line
+    within data, and consumed is how many bytes were fully processed — the
+    caller keeps data[consumed:] as the pending tail of an incomplete line.
+
+    Blank and unparseable complete lines are skipped.  An unterminated last
+    line is accepted if it already parses on its own.
+    """
+    entries = []
+    pos = 0
+    end = len(data)
+    while pos < end:
+        nl = data.find(b"\n", pos)
+        if nl < 0:
+            line_end = next_pos = end
+        else:
+            line_end, next_pos = nl, nl + 1
+        line = data[pos:line_end]
+        if line.strip():
+            try:
+                entries.append((pos, _loads_line(line)))
+            except ValueError:
+                if nl < 0:
+                    # Last line may be incomplete (still being written) — stop here
+                    break
+                # Mid-file bad line — skip it
+        pos = next_pos
+    return entries, pos
+
+
+def iter_jsonl_at(path, positions):
+    """Re-read the JSONL lines starting at the given byte positions of a file.
+
+    Yields (position, entry) for the lines that still parse, one line in
+    memory at a time; the file stays open until the generator is exhausted.
+    """
+    with open(path, "rb") as f:
+        for pos in positions:
+            f.seek(pos)
+            line = f.readline()
+            try:
+                entry = _loads_line(line)
+            except ValueError:
+                continue
+            yield pos, entry
+
+
+def find_turn_start(f, end, block_size=1 << 20):
+    """Find where to start parsing a transcript so the current turn is covered.
+
+    Reads the open binary file f backwards from byte `end` in blocks until it
+    reaches a line holding a real user prompt (extract_user_text() non-empty
+    and not an interrupt marker), and returns that line's start position, or 0 if there is none.  Feeding
+    TranscriptState from there yields the same last-turn state as feeding the
+    whole file.
+    """
+    pos = end
+    carry = b""  # partial first line of the previous block
+    while pos > 0:
+        read_start = max(0, pos - block_size)
+        f.seek(read_start)
+        chunk = f.read(pos - read_start) + carry
+        pos = read_start
+        if pos > 0:
+            nl = chunk.find(b"\n")
+            if nl < 0:
+                carry = chunk
+                continue
+            carry, chunk, line_base = chunk[:nl + 1], chunk[nl + 1:], pos + nl + 1
+        else:
+            line_base = 0
+        entries, _ = parse_jsonl_chunk(chunk)
+        for line_start, entry in reversed(entries):
+            if entry.get("type") != "user":
+                continue
+            text = extract_user_text(entry)
+            if text and not text.startswith(INTERRUPT_PREFIX):
+                return line_base + line_start
+    return 0
+
+
+def _loads_line(line):
+    try:
+        return json.loads(line)
+    except UnicodeDecodeError:
+        return json.loads(line.decode("utf-8", errors="replace"))
+
+
+class TranscriptState:
+    """Incrementally maintained summary of a session transcript.
+
+    feed() is called once per parsed entry, in transcript order.  Everything
+    _derive_state needs is kept here, so it never walks the entry list:
+
+      count               entries fed so far (positions below are 0-based)
+      last_user_pos       position of the last user entry (incl. tool_results)
+      last_user_text      extract_user_text() of that entry
+      last_assistant_pos  position of the last assistant entry
+      last_tool_uses      [(id, name)] of the last assistant entry's tool_use blocks
+      last_stop_reason    stop_reason of the last assistant entry
+      open_tool_uses      ids of tool_use blocks without a matching tool_result
+      last_tool_use_ids   {tool_name: id} of the most recent tool_use per tool
+      user_prompt         latest cleaned user prompt
+      summary             latest assistant text of the current turn
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.last_user_pos = None
+        self.last_user_text = ""
+        self.last_assistant_pos = None
+        self.last_tool_uses = []
+        self.last_stop_reason = ""
+        self.open_tool_uses = set()
+        self.last_tool_use_ids = {}
+        self.user_prompt = ""
+        self.summary = ""
+
+    @classmethod
+    def from_entries(cls, entries):
+        state = cls()
+        state.feed_all(entries)
+        return state
+
+    def feed_all(self, entries):
+        for entry in entries:
+            self.feed(entry)
+
+    def feed(self, entry):
+        etype = entry.get("type", "")
+        if etype == "user":
+            self._feed_user(entry)
+        elif etype == "assistant":
+            self._feed_assistant(entry)
+        self.count += 1
+
+    def _feed_user(self, entry):
+        self.last_user_pos = self.count
+        self.last_user_text = extract_user_text(entry)
+        if self.last_user_text:
+            # A new turn starts — the previous assistant summary is stale
+            self.summary = ""
+        content = entry.get("message", {}).get("content", "")
+        if isinstance(content, list):
+            for c in content:
+                if isinstance(c, dict) and c.get("type") == "tool_result":
+                    self.open_tool_uses.discard(c.get("tool_use_id"))
+        prompt = clean_user_prompt(entry)
+        if prompt:
+            self.user_prompt = prompt
+
+    def _feed_assistant(self, entry):
+        msg = entry.get("message", {})
+        content = msg.get("content", [])
+        if not isinstance(content, list):
+            content = []
+        self.last_assistant_pos = self.count
+        self.last_stop_reason = msg.get("stop_reason", "")
+        self.last_tool_uses = []
+        for c in content:
+            if not isinstance(c, dict):
+                continue
+            if c.get("type") == "tool_use":
+                tool_id = c.get("id", "")
+                self.last_tool_uses.append((tool_id, c.get("name", "")))
+                self.open_tool_uses.add(tool_id)
+                self.last_tool_use_ids[c.get("name")] = tool_id
+            elif c.get("type") == "text" and c.get("text", ""):
+                self.summary = c["text"]
+
+    def to_dict(self):
+        """JSON-serialisable copy of the state (see from_dict)."""
+        d = dict(vars(self))
+        d["last_tool_uses"] = [list(tu) for tu in self.last_tool_uses]
+        d["open_tool_uses"] = sorted(self.open_tool_uses)
+        d["last_tool_use_ids"] = dict(self.last_tool_use_ids)
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+        state = cls()
+        for key in vars(state):
+            if key in d:
+                setattr(state, key, d[key])
+        state.last_tool_uses = [tuple(tu) for tu in state.last_tool_uses]
+        state.open_tool_uses = set(state.open_tool_uses)
+        return state
+
+    def is_resolved(self, tool_id):
+        """True if the tool_use with this id has a tool_result."""
+        return tool_id not in self.open_tool_uses
+
+    def tool_use_resolved(self, tool_name):
+        """True if the most recent tool_use of this tool has a tool_result."""
+        tool_id = self.last_tool_use_ids.get(tool_name)
+        if tool_id is None:
+            return False
+        return self.is_resolved(tool_id)
+
+    def user_after_assistant(self):
+        return (self.last_user_pos is not None and self.last_assistant_pos is not None
+                and self.last_user_pos > self.last_assistant_pos)